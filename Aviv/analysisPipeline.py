@@ -0,0 +1,377 @@
+import argparse
+import hashlib
+import json
+import os
+import sys
+import time
+
+import numpy as np
+
+from vectorAnalysis import count_inversions, reorder_displacements, reorder_histogram, NULL_US
+
+# The result readers and the histogram live next to the runners that produce the results
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'Omri'))
+from columnarResults import to_epoch_us, load_columnar, columnar_trace_table, iter_records
+from latencyHistogram import LatencyHistogram
+
+# One command for the whole analysis, with every intermediate stage cached by the content of its input.
+#
+# ResultTraceTable.py, conflicts.py and traceResultsConflicts.py each read and parse the full result
+# file again. Here the result file is parsed once into per-op columns (seq, launched_at, coordinator,
+# memtable and completed_at as int64 microseconds, ordered by sequence number) and the aggregates
+# that cannot be recomputed cheaply from them are kept next to them:
+#   - total inversions for the coordinator and the memtable timestamps
+#   - latency histograms: coordinator -> memtable and launched_at -> completed_at
+# That state is saved in --cache-dir under the sha256 of the input (and of workload_commands.txt,
+# which gives sequence numbers to records without one), so analysing an unchanged file again only
+# costs hashing it.
+#
+# A streamed result.jsonl that has only grown since the last run (the bytes analysed last time are
+# unchanged) is not parsed again: only the new complete lines are, and they are merged into the
+# cached state. Inversions between the old and the new ops are counted with a binary search over the
+# old timestamps, so merging a tail costs about as much as the tail itself (plus a scan of the old
+# ops after every op that arrived out of sequence order). A torn last line is left for the next run.
+# The cheap summaries (adjacent inversions, displacements, reordered ops) are recomputed from the
+# cached columns.
+#
+# Outputs: analysisPipeline.json, and traceResult.json (the ResultTraceTable table) with --trace-table.
+
+COLUMNS = ("seq", "launched_at_us", "coordinator_us", "memtable_us", "completed_at_us")
+TIMESTAMPS = ("coordinator_us", "memtable_us")
+LATENCIES = {"coordinator_to_memtable": ("coordinator_us", "memtable_us"), "launched_to_completed": ("launched_at_us", "completed_at_us")}
+CHUNK_BYTES = 1 << 20
+
+
+def hash_bytes(filename, hasher, start=0, end=None):
+    # Adds bytes [start, end) of the file to hasher
+    with open(filename, 'rb') as file:
+        file.seek(start)
+        remaining = (os.path.getsize(filename) if end is None else end) - start
+        while remaining > 0:
+            chunk = file.read(min(CHUNK_BYTES, remaining))
+            if not chunk:
+                break
+            hasher.update(chunk)
+            remaining -= len(chunk)
+    return hasher
+
+
+def hash_complete_lines(filename, hasher, offset):
+    # Adds the bytes from offset up to the last newline to hasher; returns the end of the last complete line
+    end = offset
+    pending = b""
+    with open(filename, 'rb') as file:
+        file.seek(offset)
+        while True:
+            chunk = file.read(CHUNK_BYTES)
+            if not chunk:
+                break
+            data = pending + chunk
+            cut = data.rfind(b"\n") + 1
+            hasher.update(data[:cut])
+            end += cut
+            pending = data[cut:]
+    return end
+
+
+def iter_line_records(filename, start, end):
+    # The records of the complete lines in bytes [start, end) of a result.jsonl
+    with open(filename, 'rb') as file:
+        file.seek(start)
+        position = start
+        for line in file:
+            position += len(line)
+            if position > end:
+                break
+            if line.strip():
+                yield json.loads(line)
+
+
+def records_to_columns(records, command_sequence):
+    # {column: int64 array}; records without a sequence number are looked up by their query (-1 if unknown)
+    columns = {name: [] for name in COLUMNS}
+    for record in records:
+        seq = record.get("seq")
+        columns["seq"].append(seq if seq is not None else command_sequence().get(record.get("query"), -1))
+        columns["launched_at_us"].append(to_epoch_us(record.get("launched_at")))
+        columns["coordinator_us"].append(to_epoch_us(record.get("coordinator_timestamp")))
+        columns["memtable_us"].append(to_epoch_us(record.get("memtable_timestamp")))
+        columns["completed_at_us"].append(to_epoch_us(record.get("completed_at")))
+    return {name: np.array(values, dtype=np.int64) for name, values in columns.items()}
+
+
+def cross_inversions(old_seq, old_values, new_seq, new_values):
+    # Inverted pairs with one op on each side. Both sides are ordered by sequence number; an old op
+    # comes first unless its sequence number is larger (equal ones keep the old op first, like the
+    # stable merge). Ties in time are not inversions.
+    if not len(old_values) or not len(new_values):
+        return 0
+    sorted_old = np.sort(old_values)
+    # As if every old op came first: old ops with a later timestamp
+    total = int(np.sum(len(sorted_old) - np.searchsorted(sorted_old, new_values, side="right")))
+    # New ops that belong before some old ops: those old ops come after them instead
+    split = np.searchsorted(old_seq, new_seq, side="right")
+    for i in np.flatnonzero(split < len(old_seq)):
+        after = old_values[split[i]:]
+        total += int(np.count_nonzero(after < new_values[i]) - np.count_nonzero(after > new_values[i]))
+    return total
+
+
+class AnalysisState:
+    # The per-op columns ordered by sequence number plus the aggregates merged tail by tail
+    def __init__(self):
+        self.columns = {name: np.empty(0, dtype=np.int64) for name in COLUMNS}
+        self.inversions = {column: 0 for column in TIMESTAMPS}
+        self.histograms = {name: LatencyHistogram() for name in LATENCIES}
+
+    def ordered(self, column, columns=None):
+        # (seq, timestamps) of the ops with a sequence number and this timestamp, in sequence order
+        columns = self.columns if columns is None else columns
+        keep = (columns["seq"] > 0) & (columns[column] != NULL_US)
+        return columns["seq"][keep], columns[column][keep]
+
+    def add(self, new):
+        order = np.argsort(new["seq"], kind="stable")
+        new = {name: values[order] for name, values in new.items()}
+        for column in TIMESTAMPS:
+            old_seq, old_values = self.ordered(column)
+            new_seq, new_values = self.ordered(column, new)
+            self.inversions[column] += cross_inversions(old_seq, old_values, new_seq, new_values)
+            self.inversions[column] += count_inversions(new_values) if len(new_values) else 0
+
+        for name, (start, end) in LATENCIES.items():
+            both = (new[start] != NULL_US) & (new[end] != NULL_US)
+            values, counts = np.unique(new[end][both] - new[start][both], return_counts=True)
+            for value, count in zip(values.tolist(), counts.tolist()):
+                self.histograms[name].record(value, count)
+
+        # Old rows first, so equal sequence numbers keep their arrival order
+        merged = {name: np.concatenate([self.columns[name], new[name]]) for name in COLUMNS}
+        order = np.argsort(merged["seq"], kind="stable")
+        self.columns = {name: values[order] for name, values in merged.items()}
+
+    def save(self, filename):
+        arrays = dict(self.columns)
+        for column, count in self.inversions.items():
+            arrays[f"inversions_{column}"] = np.array([count], dtype=np.int64)
+        for name, histogram in self.histograms.items():
+            arrays[f"{name}_index"] = np.array(list(histogram.counts), dtype=np.int64)
+            arrays[f"{name}_count"] = np.array(list(histogram.counts.values()), dtype=np.int64)
+            arrays[f"{name}_stats"] = np.array([histogram.total, histogram.sum,
+                                                -1 if histogram.min is None else histogram.min,
+                                                -1 if histogram.max is None else histogram.max], dtype=np.int64)
+        with open(filename, 'wb') as file:
+            np.savez(file, **arrays)
+
+    @classmethod
+    def load(cls, filename):
+        state = cls()
+        with np.load(filename, allow_pickle=False) as arrays:
+            state.columns = {name: arrays[name] for name in COLUMNS}
+            state.inversions = {column: int(arrays[f"inversions_{column}"][0]) for column in TIMESTAMPS}
+            for name, histogram in state.histograms.items():
+                histogram.counts = dict(zip(arrays[f"{name}_index"].tolist(), arrays[f"{name}_count"].tolist()))
+                total, total_sum, minimum, maximum = arrays[f"{name}_stats"].tolist()
+                histogram.total, histogram.sum = total, total_sum
+                histogram.min = None if minimum < 0 else minimum
+                histogram.max = None if maximum < 0 else maximum
+        return state
+
+    def summary(self, column, num_commands=None):
+        seq, values = self.ordered(column)
+        displacements = reorder_displacements(values)
+        latest = np.maximum.accumulate(values) if len(values) else values
+        result = {
+            "rows": int(len(self.columns["seq"])),
+            "rows_with_timestamp": int(len(values)),
+            "timestamp": column,
+            "total_inversions": self.inversions[column],
+            "adjacent_inversions": int(np.count_nonzero(values[:-1] > values[1:])),
+            # Ops that an op with a smaller sequence number overtook
+            "reordered": int(np.count_nonzero(values[1:] < latest[:-1])),
+            "max_displacement": int(np.abs(displacements).max()) if len(values) else 0,
+            "reorder_histogram": reorder_histogram(displacements),
+            "latency": {name: histogram.to_dict() for name, histogram in self.histograms.items()}
+        }
+        if num_commands is not None:
+            captured = np.unique(self.columns["seq"][self.columns["seq"] > 0])
+            result["missing_sequences"] = int(num_commands - np.count_nonzero(captured <= num_commands))
+        return result
+
+
+class AnalysisCache:
+    # <key>.npz holds an AnalysisState, <key>.<timestamp column>.json its summary; index.json maps
+    # every analysed file to the key and the byte count of its last analysis
+    def __init__(self, cache_dir):
+        self.cache_dir = cache_dir
+        os.makedirs(cache_dir, exist_ok=True)
+        self.index_file = os.path.join(cache_dir, "index.json")
+        self.index = {}
+        if os.path.exists(self.index_file):
+            with open(self.index_file, 'r') as file:
+                self.index = json.load(file)
+
+    def path(self, key, suffix="npz"):
+        return os.path.join(self.cache_dir, f"{key}.{suffix}")
+
+    def has(self, key):
+        return os.path.exists(self.path(key))
+
+    def load_summary(self, key, column):
+        if not os.path.exists(self.path(key, f"{column}.json")):
+            return None
+        with open(self.path(key, f"{column}.json"), 'r') as file:
+            return json.load(file)
+
+    def save_summary(self, key, column, summary):
+        with open(self.path(key, f"{column}.json"), 'w') as file:
+            json.dump(summary, file)
+
+    def update(self, input_file, entry):
+        # Replaces the entry of input_file; the files of its previous key go unless another entry uses them
+        previous = self.index.get(os.path.abspath(input_file))
+        self.index[os.path.abspath(input_file)] = entry
+        if previous is not None and previous["key"] != entry["key"] and all(
+                other["key"] != previous["key"] for other in self.index.values()):
+            for name in os.listdir(self.cache_dir):
+                if name.startswith(previous["key"] + "."):
+                    os.remove(os.path.join(self.cache_dir, name))
+        with open(self.index_file, 'w') as file:
+            json.dump(self.index, file, indent=2)
+
+
+class StageTimer:
+    def __init__(self):
+        self.stages = {}
+
+    def run(self, stage, function, *args):
+        start = time.perf_counter()
+        result = function(*args)
+        self.stages[stage] = self.stages.get(stage, 0.0) + time.perf_counter() - start
+        return result
+
+
+def state_key(input_digest, commands_digest):
+    return hashlib.sha256(f"{input_digest}:{commands_digest}".encode()).hexdigest()
+
+
+def load_commands(commands_file):
+    with open(commands_file, 'r') as file:
+        return [command.strip() for command in file]
+
+
+def run_pipeline(input_file, column="coordinator_us", commands_file='workload_commands.txt', cache_dir='.analysisCache',
+                 trace_table_file=None):
+    # Returns (summary, stage timings in seconds, how the input was read)
+    timer = StageTimer()
+    cache = AnalysisCache(cache_dir)
+    has_commands = os.path.exists(commands_file)
+    commands_digest = timer.run("hash", lambda: hash_bytes(commands_file, hashlib.sha256()).hexdigest()) if has_commands else None
+    commands = []
+
+    def command_sequence():
+        # Only for records without a sequence number
+        if not commands and has_commands:
+            commands.extend(load_commands(commands_file))
+        return {command: i + 1 for i, command in enumerate(commands)}
+
+    entry = cache.index.get(os.path.abspath(input_file))
+    if entry is not None and entry.get("commands_sha256") != commands_digest:
+        entry = None
+    base, start = None, 0
+    if input_file.endswith('.jsonl'):
+        # Reuse the last analysis if the bytes it read are unchanged, and read only what was appended
+        hasher = hashlib.sha256()
+        if entry is not None and entry["consumed"] <= os.path.getsize(input_file) and cache.has(entry["key"]):
+            timer.run("hash", hash_bytes, input_file, hasher, 0, entry["consumed"])
+            if hasher.hexdigest() == entry["sha256"]:
+                base, start = entry["key"], entry["consumed"]
+            else:
+                hasher = hashlib.sha256()
+        end = timer.run("hash", hash_complete_lines, input_file, hasher, start)
+    else:
+        hasher = timer.run("hash", hash_bytes, input_file, hashlib.sha256())
+        end = os.path.getsize(input_file)
+    digest = hasher.hexdigest()
+    key = state_key(digest, commands_digest)
+
+    state = None
+    if cache.has(key):
+        mode = "cached"
+    elif base is not None:
+        mode = f"appended {end - start} bytes"
+        state = timer.run("load", AnalysisState.load, cache.path(base))
+        new = timer.run("parse", lambda: records_to_columns(iter_line_records(input_file, start, end), command_sequence))
+        timer.run("merge", state.add, new)
+        mode += f" ({len(new['seq'])} records)"
+    else:
+        mode = "full"
+        state = AnalysisState()
+        if input_file.endswith('.npz'):
+            columns = timer.run("parse", load_columnar, input_file)
+            new = {name: columns[name] for name in COLUMNS}
+        elif input_file.endswith('.jsonl'):
+            new = timer.run("parse", lambda: records_to_columns(iter_line_records(input_file, 0, end), command_sequence))
+        else:
+            new = timer.run("parse", lambda: records_to_columns(iter_records(input_file), command_sequence))
+        timer.run("merge", state.add, new)
+    if state is not None:
+        timer.run("save", state.save, cache.path(key))
+
+    summary = cache.load_summary(key, column)
+    if summary is None:
+        if state is None:
+            state = timer.run("load", AnalysisState.load, cache.path(key))
+        num_commands = len(command_sequence()) if has_commands else None
+        summary = timer.run("summary", state.summary, column, num_commands)
+        cache.save_summary(key, column, summary)
+
+    new_entry = {"consumed": end, "sha256": digest, "key": key, "commands_sha256": commands_digest}
+    if trace_table_file is not None:
+        # The table only changes with the state, so an up to date file is not written again
+        if entry is None or entry.get("trace_table") != [key, os.path.abspath(trace_table_file)] or not os.path.exists(trace_table_file):
+            if state is None:
+                state = timer.run("load", AnalysisState.load, cache.path(key))
+            timer.run("trace table", write_trace_table, state, load_commands(commands_file), trace_table_file)
+        new_entry["trace_table"] = [key, os.path.abspath(trace_table_file)]
+    cache.update(input_file, new_entry)
+    return summary, timer.stages, mode
+
+
+def write_trace_table(state, commands, output_file):
+    # Same layout as ResultTraceTable.process_trace_results, which only looks up the listed commands
+    known = state.columns["seq"] <= len(commands)
+    columns = {name: values[known] for name, values in state.columns.items()}
+    with open(output_file, 'w') as file:
+        json.dump({"traceResults": columnar_trace_table(columns, commands)}, file, ensure_ascii=False, indent=4, default=str)
+
+
+def print_summary(summary, stages, mode, elapsed):
+    print(f"Input: {mode}; {summary['rows']} rows, {summary['rows_with_timestamp']} with {summary['timestamp']}")
+    print(f"Total inversions: {summary['total_inversions']} (adjacent: {summary['adjacent_inversions']}),"
+          f" {summary['reordered']} reordered ops, max displacement: {summary['max_displacement']}")
+    if "missing_sequences" in summary:
+        print(f"Missing sequence numbers: {summary['missing_sequences']}")
+    for name, latency in summary["latency"].items():
+        if latency["count"]:
+            print(f"{name} us: p50={latency['p50_us']} p99={latency['p99_us']} max={latency['max_us']} ({latency['count']} ops)")
+    print("Stages: " + ", ".join(f"{stage} {seconds:.2f}s" for stage, seconds in stages.items()) + f"; total {elapsed:.2f}s")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Cached, incremental analysis of a result file")
+    parser.add_argument("input_file", nargs="?", default="result.jsonl", help="result.jsonl, result.json or result.npz")
+    parser.add_argument("timestamp", nargs="?", choices=["coordinator", "memtable"], default="coordinator")
+    parser.add_argument("--commands", default="workload_commands.txt")
+    parser.add_argument("--cache-dir", default=".analysisCache")
+    parser.add_argument("--trace-table", action="store_true", help="also write traceResult.json")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    summary, stages, mode = run_pipeline(args.input_file, args.timestamp + "_us", args.commands, args.cache_dir,
+                                         'traceResult.json' if args.trace_table else None)
+    print_summary(summary, stages, mode, time.perf_counter() - start)
+
+    with open('analysisPipeline.json', 'w') as file:
+        json.dump(summary, file, indent=2)
+    print("Results saved to analysisPipeline.json")
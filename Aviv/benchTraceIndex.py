@@ -0,0 +1,57 @@
+import sys
+import time
+
+from conflicts import extract_queries_and_timestamps, find_conflicts
+from traceIndex import build_trace_index
+
+# Benchmark for the indexed trace lookup.
+# Builds synthetic result.json data (same shape as the runners produce) with 1k to 1M traced
+# INSERT commands and times index building + extraction + conflict finding. With the index the
+# time per trace stays flat as the run grows, i.e. the whole step scales linearly.
+
+
+def make_synthetic_data(num_traces):
+    queries_and_times = []
+    traces = []
+    for i in range(1, num_traces + 1):
+        query = f"INSERT INTO simpletry.person (id, name, toTS) VALUES ('208306068', 'omri{i}', {{'{i}':toTimestamp(now())}});"
+        # Every 10th op reaches the memtable "too early" so there is something to find
+        microseconds = (i - 5) if i % 10 == 0 else i
+        timestamp = f"2024-07-24T16:{(microseconds // 60000000) % 60:02d}:{(microseconds // 1000000) % 60:02d}.{microseconds % 1000000:06d}"
+        queries_and_times.append([query, timestamp])
+        traces.append({
+            "query": query,
+            "launched_at": timestamp,
+            "coordinator_timestamp": timestamp,
+            "memtable_timestamp": timestamp,
+            "details": []
+        })
+    return {"queries_and_times": queries_and_times, "traces": traces}
+
+
+def run_benchmark(sizes, timestamp_line='memtable_timestamp'):
+    print(f"{'traces':>10} {'index (s)':>10} {'extract (s)':>12} {'conflicts (s)':>14} {'us/trace':>10}")
+    for size in sizes:
+        data = make_synthetic_data(size)
+
+        start = time.perf_counter()
+        trace_index = build_trace_index(data['traces'])
+        index_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        timestamps = extract_queries_and_timestamps(data, timestamp_line, trace_index)
+        extract_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        sum(1 for _ in find_conflicts(timestamps))
+        conflicts_time = time.perf_counter() - start
+
+        total = index_time + extract_time + conflicts_time
+        print(f"{size:>10} {index_time:>10.3f} {extract_time:>12.3f} {conflicts_time:>14.3f} {total / size * 1e6:>10.2f}")
+
+
+if __name__ == "__main__":
+    # Optional argument: largest run size to try (default 1M)
+    max_size = int(sys.argv[1]) if len(sys.argv) > 1 else 1000000
+    sizes = [size for size in (1000, 10000, 100000, 1000000) if size <= max_size]
+    run_benchmark(sizes)
@@ -1,94 +1,207 @@
+import argparse
 import json
+import os
 import re
 import sys
+
+# The trace index lives next to the runners that produce result.json
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'Omri'))
+from traceIndex import build_trace_index
+from inversions import iter_inversion_pairs, summarize_inversions
+from resultSink import iter_trace_timestamps
+from workloadMetadata import load_metadata
 #line for push
-def extract_queries_and_timestamps(data, timestamp_line):
+# Pattern to extract the name and toTS from the query
+insert_pattern = re.compile(r"INSERT INTO simpletry.person \(id, name, toTS\) VALUES \('[^']+', '([^']+)', \{'(\d+)':toTimestamp\(now\(\)\)\}\);")
+update_pattern = re.compile(r"UPDATE simpletry.person SET name = '([^']+)', toTS\['(\d+)'\] = toTimestamp\(now\(\)\) WHERE id = '[^']+';")
+
+def parse_query(query):
+    # Returns (name, toTS) or None
+    insert_match = insert_pattern.search(query)
+    update_match = update_pattern.search(query)
+    if insert_match:
+        return insert_match.group(1), int(insert_match.group(2))
+    if update_match:
+        return update_match.group(1), int(update_match.group(2))
+    print(f"Warning: No name or toTS found in query: {query}")
+    return None
+
+def extract_queries_and_timestamps(data, timestamp_line, trace_index=None):
     queries_and_times = data['queries_and_times']
     timestamps = []
-    
-    # Pattern to extract the name and toTS from the query
-    insert_pattern = re.compile(r"INSERT INTO simpletry.person \(id, name, toTS\) VALUES \('[^']+', '([^']+)', \{'(\d+)':toTimestamp\(now\(\)\)\}\);")
-    update_pattern = re.compile(r"UPDATE simpletry.person SET name = '([^']+)', toTS\['(\d+)'\] = toTimestamp\(now\(\)\) WHERE id = '[^']+';")
+
+    # Build the query -> trace index once instead of rescanning every trace per query
+    if trace_index is None:
+        trace_index = build_trace_index(data['traces'])
     
     for query, _ in queries_and_times:
-        insert_match = insert_pattern.search(query)
-        update_match = update_pattern.search(query)
-        if insert_match:
-            name = insert_match.group(1)
-            toTS = int(insert_match.group(2))
-        elif update_match:
-            name = update_match.group(1)
-            toTS = int(update_match.group(2))
-        else:
-            print(f"Warning: No name or toTS found in query: {query}")
+        parsed = parse_query(query)
+        if parsed is None:
             continue
+        name, toTS = parsed
         
-        trace_timestamps = [
-            trace[timestamp_line] for trace in data['traces'] 
-            if trace['query'] == query
-        ]
-        if trace_timestamps:
-            timestamps.append((name, toTS, trace_timestamps[0]))
+        trace = trace_index.get(query)
+        if trace is not None:
+            timestamps.append((name, toTS, trace[timestamp_line]))
         else:
             print(f"Warning: No timestamp found for query: {query}")
     
     return timestamps
 
-def find_conflicts(timestamps):
-    conflicts = []
-    
-    # Sort the queries by the numeric part of their names
-    sorted_queries = sorted(timestamps, key=lambda x: int(re.search(r'\d+', x[0]).group()))
+def extract_from_stream(filename, timestamp_line):
+    # Streaming results (result.jsonl): every record already joins the query with its trace,
+    # so the file is read one record at a time and only the small tuples are kept
+    timestamps = []
+    for record in iter_trace_timestamps(filename):
+        parsed = parse_query(record['query'])
+        if parsed is not None:
+            timestamps.append((parsed[0], parsed[1], record.get(timestamp_line)))
+    return timestamps
+
+def extract_with_metadata(records, timestamp_line, metadata):
+    # Records that carry their command's sequence number are joined to the workload metadata
+    # index with a list lookup: no regex and no hashing of the CQL text. Entries get the
+    # sequence number as a 4th element, which is used for ordering.
+    timestamps = []
+    for record in records:
+        seq = record.get('seq')
+        if seq is None or not 0 < seq < len(metadata):
+            print(f"Warning: No sequence number for query: {record.get('query')}")
+            continue
+        op, key, toTS, name = metadata[seq]
+        timestamps.append((name, toTS, record.get(timestamp_line), seq))
+    return timestamps
+
+def extract_from_columnar(filename, timestamp_line, commands_file='workload_commands.txt', metadata=None):
+    # Columnar results (result.npz): timestamps are int64 microseconds since the epoch and queries
+    # are sequence numbers into workload_commands.txt, so no timestamp string is parsed
+    from columnarResults import load_columnar, NULL_US
+    columns = load_columnar(filename)
+    column = {'memtable_timestamp': 'memtable_us', 'coordinator_timestamp': 'coordinator_us', 'launched_at': 'launched_at_us'}[timestamp_line]
+    if metadata is not None:
+        records = (
+            {'seq': seq, timestamp_line: None if timestamp == NULL_US else timestamp}
+            for seq, timestamp in zip(columns['seq'].tolist(), columns[column].tolist())
+        )
+        return extract_with_metadata(records, timestamp_line, metadata)
+    with open(commands_file, 'r') as file:
+        commands = [command.strip() for command in file]
+    timestamps = []
+    for seq, timestamp in zip(columns['seq'].tolist(), columns[column].tolist()):
+        if seq <= 0:
+            continue
+        parsed = parse_query(commands[seq - 1])
+        if parsed is not None:
+            timestamps.append((parsed[0], parsed[1], None if timestamp == NULL_US else timestamp))
+    return timestamps
+
+def sort_by_sequence(timestamps):
+    # Entries joined through the metadata index carry their sequence number
+    if timestamps and len(timestamps[0]) > 3:
+        return sorted(timestamps, key=lambda x: x[3])
+    # Otherwise sort the queries by the numeric part of their names
+    return sorted(timestamps, key=lambda x: int(re.search(r'\d+', x[0]).group()))
+
+def find_conflicts(timestamps, max_pairs=None):
+    # Yields the conflicts one at a time, so a heavily reordered run never holds its O(n^2) pairs
+    # Keep only queries that have a timestamp, in sequence order
+    sorted_queries = [entry for entry in sort_by_sequence(timestamps) if entry[2] is not None]
     
-    # Check for conflicts
-    for i in range(len(sorted_queries) - 1):
-        current_name, current_toTS, current_timestamp = sorted_queries[i]
-        next_name, next_toTS, next_timestamp = sorted_queries[i + 1]
+    # Check every pair (not only neighbours) for conflicts, optionally stopping after max_pairs
+    for i, j in iter_inversion_pairs([entry[2] for entry in sorted_queries], max_pairs):
+        current_name, current_toTS, current_timestamp = sorted_queries[i][:3]
+        next_name, next_toTS, next_timestamp = sorted_queries[j][:3]
         
-        if current_timestamp > next_timestamp:
-            conflict = {
-                'earlier_name': current_name,
-                'earlier_toTS': current_toTS,
-                'earlier_timestamp': current_timestamp,
-                'later_name': next_name,
-                'later_toTS': next_toTS,
-                'later_timestamp': next_timestamp
-            }
-            conflicts.append(conflict)
-    
-    return conflicts
+        yield {
+            'earlier_name': current_name,
+            'earlier_toTS': current_toTS,
+            'earlier_timestamp': current_timestamp,
+            'later_name': next_name,
+            'later_toTS': next_toTS,
+            'later_timestamp': next_timestamp
+        }
+
+def summarize_conflicts(timestamps):
+    # Total number of inverted pairs and how far each query was displaced from its sequence position
+    sorted_queries = [entry for entry in sort_by_sequence(timestamps) if entry[2] is not None]
+    summary = summarize_inversions([entry[2] for entry in sorted_queries])
+    # Keyed by sequence number when known (deletes have no name), otherwise by name
+    summary['displacements'] = {
+        (entry[3] if len(entry) > 3 else entry[0]): displacement
+        for entry, displacement in zip(sorted_queries, summary['displacements'])
+    }
+    return summary
 
 def save_data(data, filename):
     with open(filename, 'w') as file:
         json.dump(data, file, indent=4)
 
+def write_conflicts(conflicts, file):
+    # Streams the conflicts into a JSON list as they are found; returns how many were written
+    count = 0
+    file.write('[')
+    for conflict in conflicts:
+        file.write((',\n    ' if count else '\n    ') + json.dumps(conflict, default=str))
+        count += 1
+    file.write('\n]' if count else ']')
+    return count
+
 if __name__ == "__main__":
-    if len(sys.argv) != 3:
-        print("Usage: python script.py <input_json_file> <timestamp_line>")
-        sys.exit(1)
+    parser = argparse.ArgumentParser(description="Find conflicts in a result file")
+    parser.add_argument("input_filename", help="result.json, result.jsonl or result.npz")
+    parser.add_argument("timestamp_line", help="memtable_timestamp or coordinator_timestamp")
+    parser.add_argument("max_pairs", nargs="?", type=int, default=1000, help="stop listing conflicts after this many pairs (default 1000)")
+    parser.add_argument("--metadata", help="workload_metadata.jsonl: join by sequence number instead of parsing the queries")
+    args = parser.parse_args()
 
-    input_filename = sys.argv[1]
-    timestamp_line = sys.argv[2]
+    input_filename = args.input_filename
+    timestamp_line = args.timestamp_line
+    max_pairs = args.max_pairs
+    metadata = load_metadata(args.metadata) if args.metadata else None
     extracted_filename = 'extracted_data.json'
     conflicts_filename = 'conflicts.json'
+    summary_filename = 'conflicts_summary.json'
     
-    try:
-        with open(input_filename, 'r') as file:
-            data = json.load(file)
-    except FileNotFoundError:
-        print(f"Error: File '{input_filename}' not found.")
-        sys.exit(1)
-    except json.JSONDecodeError:
-        print(f"Error: File '{input_filename}' is not a valid JSON file.")
-        sys.exit(1)
-    
-    timestamps = extract_queries_and_timestamps(data, timestamp_line)
+    if input_filename.endswith('.npz'):
+        # Columnar run: timestamps stay integers (microseconds since the epoch)
+        timestamps = extract_from_columnar(input_filename, timestamp_line, metadata=metadata)
+    elif input_filename.endswith('.jsonl'):
+        # Streamed run: read record by record
+        try:
+            if metadata is not None:
+                timestamps = extract_with_metadata(iter_trace_timestamps(input_filename), timestamp_line, metadata)
+            else:
+                timestamps = extract_from_stream(input_filename, timestamp_line)
+        except FileNotFoundError:
+            print(f"Error: File '{input_filename}' not found.")
+            sys.exit(1)
+    else:
+        try:
+            with open(input_filename, 'r') as file:
+                data = json.load(file)
+        except FileNotFoundError:
+            print(f"Error: File '{input_filename}' not found.")
+            sys.exit(1)
+        except json.JSONDecodeError:
+            print(f"Error: File '{input_filename}' is not a valid JSON file.")
+            sys.exit(1)
+        
+        if metadata is not None:
+            timestamps = extract_with_metadata(data['traces'], timestamp_line, metadata)
+        else:
+            trace_index = build_trace_index(data['traces'])
+            timestamps = extract_queries_and_timestamps(data, timestamp_line, trace_index)
     print(f"Extracted data: {timestamps}")
     save_data(timestamps, extracted_filename)
     
-    conflicts = find_conflicts(timestamps)
-    print(f"Conflicts: {conflicts}")
-    save_data(conflicts, conflicts_filename)
+    with open(conflicts_filename, 'w') as file:
+        listed = write_conflicts(find_conflicts(timestamps, max_pairs), file)
+    print(f"Listed {listed} conflicts (at most {max_pairs})")
+    
+    summary = summarize_conflicts(timestamps)
+    print(f"Total inversions: {summary['total_inversions']} (adjacent: {summary['adjacent_inversions']}), max displacement: {summary['max_displacement']}")
+    save_data(summary, summary_filename)
     
     print(f"Extracted data saved to {extracted_filename}")
-    print(f"Conflicts saved to {conflicts_filename}")
\ No newline at end of file
+    print(f"Conflicts saved to {conflicts_filename}")
+    print(f"Inversion summary saved to {summary_filename}")
\ No newline at end of file
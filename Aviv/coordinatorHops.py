@@ -0,0 +1,179 @@
+import datetime
+import json
+import os
+import sys
+
+from stageLatency import find_coordinator, trace_stages, MUTATION_SENT, MUTATION_RECEIVED, RESPONSE_RECEIVED
+
+# The trace helpers and the histogram live next to the runners that produce the results
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'Omri'))
+from traceProcessing import elapsed_to_us
+from resultSink import iter_result_records
+from latencyHistogram import LatencyHistogram
+
+# Coordinator hops: how much of the latency and the reordering comes from ops whose coordinator
+# does not own the partition (round-robin or pinned routing instead of token-aware).
+#
+# For every op, from the event sources of its trace:
+#   replicas      the nodes with an "Adding to ... memtable" event
+#   hops          cross-node messages: MUTATION sent to a replica and its response back
+#   first_ack     coordinator: start -> the first replica's write is done (its own memtable when it
+#                 is a replica, else the first REQUEST_RESPONSE), what a consistency level ONE
+#                 write waits for
+#   coordinator_total, network_round_trip   as in stageLatency.py
+# An op is reordered when an op with a smaller sequence number got a later timestamp.
+# Ops are grouped by whether the coordinator was one of the replicas ("replica", "non_replica",
+# "unknown" when the events were not kept), and the difference of the two groups is the latency
+# the extra hop adds.
+
+GROUPS = ("replica", "non_replica", "unknown")
+MEASURES = ("first_ack", "coordinator_total", "network_round_trip")
+
+def op_hops(details, coordinator=None):
+    # {"coordinator", "replicas", "group", "hops", "first_ack", "coordinator_total", "network_round_trip"}
+    if details and coordinator is None:
+        coordinator = find_coordinator(details)
+    replicas = sorted({event["source"] for event in details if event["description"].startswith("Adding to")})
+    coordinator_events = [event for event in details if event["source"] == coordinator]
+    answered = [elapsed_to_us(event["source_elapsed"]) for event in coordinator_events
+                if event["description"].startswith(RESPONSE_RECEIVED)]
+    if coordinator_events:
+        hops = sum(1 for event in coordinator_events if event["description"].startswith(MUTATION_SENT)) + len(answered)
+    else:
+        # Only the replicas' events were fetched: every remote replica is one hop there and one back
+        hops = 2 * sum(1 for event in details if event["description"].startswith(MUTATION_RECEIVED))
+
+    if not replicas:
+        group = "unknown"
+    else:
+        group = "replica" if coordinator in replicas else "non_replica"
+
+    first_ack = None
+    if coordinator in replicas:
+        first_ack = min(elapsed_to_us(event["source_elapsed"]) for event in coordinator_events
+                        if event["description"].startswith("Adding to"))
+    elif answered:
+        first_ack = min(answered)
+
+    stages = {}
+    for stage, _, value in trace_stages(details):
+        if stage in ("coordinator_total", "network_round_trip"):
+            stages.setdefault(stage, []).append(value)
+    return {
+        "coordinator": coordinator,
+        "replicas": replicas,
+        "group": group,
+        "hops": hops,
+        "first_ack": first_ack,
+        "coordinator_total": max(stages["coordinator_total"]) if "coordinator_total" in stages else None,
+        # The fastest replica's round trip, the one a consistency level ONE write waits for
+        "network_round_trip": min(stages["network_round_trip"]) if "network_round_trip" in stages else None
+    }
+
+class HopBreakdown:
+    # Streaming per-group histograms; only (seq, timestamp, group, coordinator) is kept per op for the
+    # reordering, which needs every op in sequence order
+    def __init__(self, timestamp_field="coordinator_timestamp"):
+        self.timestamp_field = timestamp_field
+        self.histograms = {(group, measure): LatencyHistogram() for group in GROUPS for measure in MEASURES}
+        self.counts = {group: {"ops": 0, "hops": 0} for group in GROUPS}
+        self.coordinators = {}
+        self.order = []
+
+    def add(self, record, position):
+        hops = op_hops(record.get("details", []), record.get("coordinator"))
+        group = hops["group"]
+        self.counts[group]["ops"] += 1
+        self.counts[group]["hops"] += hops["hops"]
+        for measure in MEASURES:
+            if hops[measure] is not None:
+                self.histograms[(group, measure)].record(hops[measure])
+        node = self.coordinators.setdefault(hops["coordinator"], {"ops": 0, "non_replica": 0, "reordered": 0})
+        node["ops"] += 1
+        node["non_replica"] += group == "non_replica"
+
+        timestamp = record.get(self.timestamp_field)
+        seq = record.get("seq", position)
+        self.order.append((seq, datetime.datetime.fromisoformat(timestamp) if timestamp else None, group, hops["coordinator"]))
+
+    def reordered(self):
+        # Yields (group, coordinator) of every op that an earlier op (by sequence number) overtook
+        latest = None
+        for _, timestamp, group, coordinator in sorted(self.order, key=lambda item: item[0]):
+            if timestamp is None:
+                continue
+            if latest is not None and latest > timestamp:
+                yield group, coordinator
+            if latest is None or timestamp > latest:
+                latest = timestamp
+
+    def summary(self):
+        reordered = {group: 0 for group in GROUPS}
+        for group, coordinator in self.reordered():
+            reordered[group] += 1
+            self.coordinators[coordinator]["reordered"] += 1
+        total_ops = sum(counts["ops"] for counts in self.counts.values())
+        total_reordered = sum(reordered.values())
+
+        groups = {}
+        for group in GROUPS:
+            ops = self.counts[group]["ops"]
+            if not ops:
+                continue
+            groups[group] = {
+                "ops": ops,
+                "share": ops / total_ops,
+                "hops_mean": self.counts[group]["hops"] / ops,
+                "reordered": reordered[group],
+                "reordered_share": reordered[group] / ops,
+                "share_of_reordered": reordered[group] / total_reordered if total_reordered else 0.0
+            }
+            for measure in MEASURES:
+                groups[group][measure] = self.histograms[(group, measure)].to_dict()
+
+        # What the extra coordinator hop costs: mean difference between the groups
+        added = {}
+        if "replica" in groups and "non_replica" in groups:
+            for measure in ("first_ack", "coordinator_total"):
+                local, remote = groups["replica"][measure], groups["non_replica"][measure]
+                if local["count"] and remote["count"]:
+                    added[measure + "_mean_us"] = remote["mean_us"] - local["mean_us"]
+        return {"ops": total_ops, "reordered": total_reordered, "timestamp": self.timestamp_field,
+                "groups": groups, "added_latency": added, "coordinators": self.coordinators}
+
+def iter_records(input_file):
+    # Every trace record, from a streamed result.jsonl (one record at a time) or result.json
+    if input_file.endswith('.jsonl'):
+        yield from iter_result_records(input_file)
+        return
+    with open(input_file, 'r') as file:
+        data = json.load(file)
+    yield from data["traces"]
+
+def print_summary(summary):
+    print(f"{summary['ops']} ops, {summary['reordered']} reordered by {summary['timestamp']}")
+    print(f"{'coordinator':>12} {'ops':>8} {'share':>6} {'hops':>5} {'ack p50':>8} {'ack p99':>8} {'rtt p50':>8} {'reordered':>10} {'of all':>7}")
+    for group, stats in summary["groups"].items():
+        ack, rtt = stats["first_ack"], stats["network_round_trip"]
+        print(f"{group:>12} {stats['ops']:>8} {stats['share']:>6.1%} {stats['hops_mean']:>5.2f} {ack.get('p50_us', '-'):>8} {ack.get('p99_us', '-'):>8}"
+              f" {rtt.get('p50_us', '-'):>8} {stats['reordered_share']:>10.1%} {stats['share_of_reordered']:>7.1%}")
+    for measure, value in summary["added_latency"].items():
+        print(f"Added by a non-replica coordinator ({measure}): {value:.1f} us")
+    print(f"{'node':>16} {'ops':>8} {'non-replica':>12} {'reordered':>10}")
+    for node, stats in sorted(summary["coordinators"].items(), key=lambda item: str(item[0])):
+        print(f"{str(node):>16} {stats['ops']:>8} {stats['non_replica']:>12} {stats['reordered']:>10}")
+
+if __name__ == "__main__":
+    # Usage: python coordinatorHops.py [result.json|result.jsonl] [coordinator|memtable]
+    input_file = sys.argv[1] if len(sys.argv) > 1 else 'result.json'
+    timestamp_type = sys.argv[2] if len(sys.argv) > 2 else 'coordinator'
+
+    breakdown = HopBreakdown(f"{timestamp_type}_timestamp")
+    for position, record in enumerate(iter_records(input_file)):
+        breakdown.add(record, position)
+    summary = breakdown.summary()
+    print_summary(summary)
+
+    with open('coordinatorHops.json', 'w') as file:
+        json.dump(summary, file, indent=2)
+    print("Results saved to coordinatorHops.json")
@@ -0,0 +1,76 @@
+from bisect import bisect_right, insort
+
+# Inversion engine for the conflict finders.
+#
+# The input is always a list of timestamps (or any comparable values) ordered by client sequence
+# number. A pair (i, j) with i < j is an inversion when values[i] > values[j], i.e. the op that was
+# issued later reached the memtable / coordinator first. Equal values are not inversions.
+#
+# Comparing only neighbours misses every reordering that spans more than one position, and checking
+# all pairs is quadratic, so counting is done with a merge sort in O(n log n).
+
+
+def count_inversions(values):
+    # Bottom-up merge sort that counts, for every merge, how many left-side values are
+    # greater than each right-side value
+    items = list(values)
+    buffer = [None] * len(items)
+    inversions = 0
+    width = 1
+    while width < len(items):
+        for low in range(0, len(items), 2 * width):
+            middle = min(low + width, len(items))
+            high = min(low + 2 * width, len(items))
+            i, j, k = low, middle, low
+            while i < middle and j < high:
+                if items[j] < items[i]:
+                    buffer[k] = items[j]
+                    inversions += middle - i
+                    j += 1
+                else:
+                    buffer[k] = items[i]
+                    i += 1
+                k += 1
+            buffer[k:high] = items[i:middle] if i < middle else items[j:high]
+        items, buffer = buffer, items
+        width *= 2
+    return inversions
+
+
+def compute_displacements(values):
+    # Displacement of an op = its position in timestamp order minus its position in sequence order.
+    # Positive means the op landed later than it was issued, negative means it overtook earlier ops.
+    # The sort is stable, so ops with equal timestamps keep their sequence order.
+    order = sorted(range(len(values)), key=values.__getitem__)
+    displacements = [0] * len(values)
+    for rank, position in enumerate(order):
+        displacements[position] = rank - position
+    return displacements
+
+
+def iter_inversion_pairs(values, max_pairs=None):
+    # Yield every inverted pair (i, j) lazily, grouped by the later op j.
+    # Only the sorted prefix of already seen values is kept, so memory stays O(n) no matter
+    # how many pairs there are; max_pairs stops the stream early.
+    seen = []
+    emitted = 0
+    for j, value in enumerate(values):
+        # Every previously seen value strictly greater than this one forms an inversion
+        start = bisect_right(seen, (value, len(values)))
+        for k in range(start, len(seen)):
+            if max_pairs is not None and emitted >= max_pairs:
+                return
+            yield seen[k][1], j
+            emitted += 1
+        insort(seen, (value, j))
+
+
+def summarize_inversions(values):
+    # Total inversion count plus the displacement of every op and the worst one
+    displacements = compute_displacements(values)
+    return {
+        "total_inversions": count_inversions(values),
+        "adjacent_inversions": sum(1 for i in range(len(values) - 1) if values[i] > values[i + 1]),
+        "max_displacement": max((abs(d) for d in displacements), default=0),
+        "displacements": displacements
+    }
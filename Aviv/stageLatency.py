@@ -0,0 +1,155 @@
+import json
+import os
+import sys
+
+# The trace helpers and the histogram live next to the runners that produce the results
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'Omri'))
+from traceProcessing import elapsed_to_us
+from resultSink import iter_result_records
+from latencyHistogram import LatencyHistogram
+
+# Per-stage write latency from the trace events.
+#
+# source_elapsed is the time (us) since the node started handling the request, so stages are
+# differences between events of the same node and clock skew does not matter:
+#   parse_prepare          coordinator: start -> "Preparing statement" (or "Parsing")
+#   replica_determination  coordinator: parse_prepare -> "Determining replicas for mutation"
+#   memtable_apply         replica: mutation start -> "Adding to ... memtable" (includes the commitlog)
+#   response_enqueue       remote replica: memtable -> "Enqueuing response"
+#   network_round_trip     coordinator "Sending MUTATION" -> response received, minus the time the
+#                          remote replica spent on it (both network hops plus messaging queues)
+#   coordinator_total      coordinator: start -> its last event
+# Every (stage, node) pair has its own HDR-style histogram, so a run of any size is summarized in
+# constant memory, one trace at a time.
+
+STAGES = ("parse_prepare", "replica_determination", "network_round_trip", "memtable_apply", "response_enqueue", "coordinator_total")
+
+MUTATION_SENT = ("Sending MUTATION message to /", "Sending MUTATION_REQ message to /")
+MUTATION_RECEIVED = ("MUTATION message received from /", "MUTATION_REQ message received from /")
+RESPONSE_RECEIVED = ("REQUEST_RESPONSE message received from /", "MUTATION_RSP message received from /")
+COORDINATOR_ONLY = ("Parsing", "Preparing statement", "Determining replicas") + MUTATION_SENT + RESPONSE_RECEIVED
+
+def find_elapsed(entries, prefixes):
+    # source_elapsed of the first event whose description starts with one of the prefixes
+    for description, elapsed in entries:
+        if description.startswith(prefixes):
+            return elapsed
+    return None
+
+def find_coordinator(details):
+    # The node with coordinator-only events, else the sender named by a replica (traces fetched
+    # early can miss the coordinator's events), else the source of the first event
+    for event in details:
+        if event["description"].startswith(COORDINATOR_ONLY):
+            return event["source"]
+    for event in details:
+        if event["description"].startswith(MUTATION_RECEIVED):
+            return event["description"].rsplit("/", 1)[1]
+    return details[0]["source"]
+
+def trace_stages(details):
+    # Yields (stage, node, microseconds) for one trace's events
+    if not details:
+        return
+    coordinator = find_coordinator(details)
+    per_node = {}
+    for event in details:
+        per_node.setdefault(event["source"], []).append((event["description"], elapsed_to_us(event["source_elapsed"])))
+    coordinator_events = per_node.get(coordinator, [])
+
+    parsed = find_elapsed(coordinator_events, ("Preparing statement",))
+    if parsed is None:
+        parsed = find_elapsed(coordinator_events, ("Parsing",))
+    determined = find_elapsed(coordinator_events, ("Determining replicas",))
+    if parsed is not None:
+        yield "parse_prepare", coordinator, parsed
+        if determined is not None:
+            yield "replica_determination", coordinator, determined - parsed
+
+    # The coordinator is one of the replicas
+    applied = find_elapsed(coordinator_events, ("Adding to",))
+    if applied is not None and determined is not None:
+        yield "memtable_apply", coordinator, applied - determined
+
+    for node, entries in per_node.items():
+        if node == coordinator:
+            continue
+        received = find_elapsed(entries, MUTATION_RECEIVED)
+        start = received if received is not None else entries[0][1]
+        applied = find_elapsed(entries, ("Adding to",))
+        enqueued = find_elapsed(entries, ("Enqueuing response",))
+        if applied is not None:
+            yield "memtable_apply", node, applied - start
+            if enqueued is not None:
+                yield "response_enqueue", node, enqueued - applied
+        sent = find_elapsed(coordinator_events, tuple(prefix + node for prefix in MUTATION_SENT))
+        answered = find_elapsed(coordinator_events, tuple(prefix + node for prefix in RESPONSE_RECEIVED))
+        if sent is not None and answered is not None and enqueued is not None:
+            yield "network_round_trip", node, (answered - sent) - (enqueued - start)
+
+    if coordinator_events:
+        yield "coordinator_total", coordinator, max(elapsed for _, elapsed in coordinator_events)
+
+class StageBreakdown:
+    # Streaming per-stage, per-node histograms
+    def __init__(self):
+        self.histograms = {}
+        self.traces = 0
+
+    def add(self, details):
+        self.traces += 1
+        for stage, node, value in trace_stages(details):
+            key = (stage, node)
+            if key not in self.histograms:
+                self.histograms[key] = LatencyHistogram()
+            self.histograms[key].record(value)
+
+    def summary(self):
+        # {stage: {node: histogram summary, "all": summary over every node}}
+        result = {}
+        for stage in STAGES:
+            nodes = sorted(node for histogram_stage, node in self.histograms if histogram_stage == stage)
+            if not nodes:
+                continue
+            total = LatencyHistogram()
+            result[stage] = {}
+            for node in nodes:
+                total.merge(self.histograms[(stage, node)])
+                result[stage][node] = self.histograms[(stage, node)].to_dict()
+            result[stage]["all"] = total.to_dict()
+        return {"traces": self.traces, "stages": result}
+
+def iter_trace_details(input_file):
+    # The event list of every trace, from a streamed result.jsonl (one record at a time) or result.json
+    if input_file.endswith('.jsonl'):
+        for record in iter_result_records(input_file):
+            yield record.get("details", [])
+        return
+    with open(input_file, 'r') as file:
+        data = json.load(file)
+    for trace in data["traces"]:
+        yield trace.get("details", [])
+
+def print_summary(summary):
+    print(f"{'stage':>22} {'node':>16} {'count':>8} {'mean us':>9} {'p50 us':>8} {'p99 us':>8} {'p999 us':>8} {'max us':>8}")
+    for stage, nodes in summary["stages"].items():
+        for node, stats in nodes.items():
+            if not stats["count"]:
+                continue
+            print(f"{stage:>22} {node:>16} {stats['count']:>8} {stats['mean_us']:>9.1f} {stats['p50_us']:>8} {stats['p99_us']:>8} {stats['p999_us']:>8} {stats['max_us']:>8}")
+
+if __name__ == "__main__":
+    # Usage: python stageLatency.py [result.json|result.jsonl]
+    input_file = sys.argv[1] if len(sys.argv) > 1 else 'result.json'
+
+    breakdown = StageBreakdown()
+    for details in iter_trace_details(input_file):
+        breakdown.add(details)
+    summary = breakdown.summary()
+
+    print(f"Stage latencies of {summary['traces']} traces")
+    print_summary(summary)
+
+    with open('stageLatency.json', 'w') as file:
+        json.dump(summary, file, indent=2)
+    print("Results saved to stageLatency.json")
@@ -0,0 +1,80 @@
+import random
+
+import numpy as np
+
+import inversions
+import vectorAnalysis
+from analysisPipeline import AnalysisState, COLUMNS, TIMESTAMPS, NULL_US
+
+# The inversion engines (inversions.py, vectorAnalysis.py and the incremental merge of
+# analysisPipeline.py) checked against an O(n^2) count on seeded random inputs with ties, plus
+# regression cases of the NumPy analysis.
+# Run with: python -m pytest Aviv/test_inversions.py
+
+
+def brute_pairs(values):
+    return sorted((i, j) for j in range(len(values)) for i in range(j) if values[i] > values[j])
+
+
+def random_values(rng, n, spread):
+    return [rng.randrange(spread) for _ in range(n)]
+
+
+def test_count_inversions_engines():
+    rng = random.Random(0)
+    for n in list(range(8)) + [rng.randrange(8, 300) for _ in range(100)]:
+        values = random_values(rng, n, rng.choice([2, 10, 1000]))
+        expected = len(brute_pairs(values))
+        assert inversions.count_inversions(values) == expected
+        if values:
+            assert vectorAnalysis.count_inversions(np.array(values, dtype=np.int64)) == expected
+
+
+def test_iter_inversion_pairs():
+    rng = random.Random(1)
+    for _ in range(50):
+        values = random_values(rng, rng.randrange(60), 8)
+        expected = brute_pairs(values)
+        assert sorted(inversions.iter_inversion_pairs(values)) == expected
+        limited = list(inversions.iter_inversion_pairs(values, max_pairs=5))
+        assert len(limited) == min(5, len(expected)) and set(limited) <= set(expected)
+
+
+
+def test_clock_skew_without_remote_events():
+    # RF=1 with token-aware routing: every event is on the coordinator and nothing is sent
+    columns = {
+        "event_offsets": np.array([0, 2, 4], dtype=np.int64),
+        "event_datetime_us": np.array([10, 20, 30, 40], dtype=np.int64),
+        "event_source": np.array([0, 0, 1, 1], dtype=np.int32),
+        "event_description": np.array([0, 1, 0, 1], dtype=np.int32),
+        "sources": np.array(["127.0.0.1", "127.0.0.2"]),
+        "descriptions": np.array(["Parsing", "Adding to person memtable"])
+    }
+    assert vectorAnalysis.estimate_clock_skew(columns) == {}
+    keys, values = vectorAnalysis._group_min(np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64))
+    assert len(keys) == 0 and len(values) == 0
+
+
+def test_incremental_merge_matches_full_count():
+    # Rows arrive in random order and in several tails, with repeated sequence numbers and missing
+    # timestamps; the merged totals must equal a count over all rows ordered by sequence number
+    rng = np.random.default_rng(2)
+    for _ in range(200):
+        n = int(rng.integers(1, 150))
+        rows = {name: rng.integers(0, 40, n).astype(np.int64) for name in COLUMNS}
+        rows["seq"] = rng.integers(-2, 60, n).astype(np.int64)
+        rows["memtable_us"][rng.random(n) < 0.2] = NULL_US
+
+        state = AnalysisState()
+        start = 0
+        for end in sorted(rng.integers(0, n, int(rng.integers(0, 4))).tolist()) + [n]:
+            state.add({name: values[start:end] for name, values in rows.items()})
+            start = end
+
+        order = np.argsort(rows["seq"], kind="stable")
+        for column in TIMESTAMPS:
+            values = rows[column][order]
+            values = values[(rows["seq"][order] > 0) & (values != NULL_US)]
+            assert state.inversions[column] == len(brute_pairs(values.tolist()))
+        assert np.array_equal(state.columns["seq"], rows["seq"][order])
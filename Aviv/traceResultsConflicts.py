@@ -1,49 +1,90 @@
+import argparse
 import json
+import os
+import sys
 from datetime import datetime
+
+# The columnar result loader lives next to the runners that produce the results
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'Omri'))
+from inversions import iter_inversion_pairs, summarize_inversions
+from conflicts import write_conflicts
 #line for push
-def find_conflicts(trace_data):
-    conflicts = []
-    for i in range(len(trace_data) - 1):
-        current = trace_data[i]
-        next = trace_data[i + 1]
-        
-        current_seq = current[0]
-        current_query = current[1]
-        current_start = datetime.strptime(current[3], "%Y-%m-%d %H:%M:%S.%f") if current[3] else None
-        current_end = datetime.strptime(current[2], "%Y-%m-%d %H:%M:%S.%f")
-        
-        next_seq = next[0]
-        next_query = next[1]
-        next_start = datetime.strptime(next[3], "%Y-%m-%d %H:%M:%S.%f") if next[3] else None
-        
-        if current_start and next_start and current_start > next_start:
-            conflicts.append({
-                "sequence1": current_seq,
-                "sequence2": next_seq,
-                "query1": current_query,
-                "query2": next_query,
-                "start_time1": current_start.isoformat(),
-                "start_time2": next_start.isoformat()
-            })
-    
-    return conflicts
-
-# Read the JSON file
-with open('traceResult.json', 'r') as file:
-    data = json.load(file)
-
-# Extract the trace results
-trace_results = data['traceResults']
-
-# Find conflicts
-conflicts = find_conflicts(trace_results)
-
-# Save conflicts to a JSON file
-with open('traceResultConflicts.json', 'w') as outfile:
-    json.dump({"conflicts": conflicts}, outfile, indent=2)
-
-# Print summary
-if conflicts:
-    print(f"Found {len(conflicts)} conflicts. Results saved to traceResultConflicts.json")
-else:
-    print("No conflicts found. Empty result saved to traceResultConflicts.json")
\ No newline at end of file
+def parse_start_times(trace_data):
+    # Keep the rows that have a coordinator timestamp, parsed once per row
+    # (rows built from a columnar result.npz already hold datetimes)
+    rows = []
+    for row in trace_data:
+        if row[3]:
+            start = row[3] if isinstance(row[3], datetime) else datetime.strptime(row[3], "%Y-%m-%d %H:%M:%S.%f")
+            rows.append((row[0], row[1], start))
+    return rows
+
+def find_conflicts(trace_data, max_pairs=None):
+    # Yields the conflicts one at a time, so the pairs of a heavily reordered run are never all in memory
+    rows = parse_start_times(trace_data)
+
+    # Check every pair (not only neighbours), optionally stopping after max_pairs
+    for i, j in iter_inversion_pairs([row[2] for row in rows], max_pairs):
+        current_seq, current_query, current_start = rows[i]
+        next_seq, next_query, next_start = rows[j]
+
+        yield {
+            "sequence1": current_seq,
+            "sequence2": next_seq,
+            "query1": current_query,
+            "query2": next_query,
+            "start_time1": current_start.isoformat(),
+            "start_time2": next_start.isoformat()
+        }
+
+def summarize_conflicts(trace_data):
+    # Total number of inverted pairs and the displacement of every sequence number
+    rows = parse_start_times(trace_data)
+    summary = summarize_inversions([row[2] for row in rows])
+    summary["displacements"] = {
+        row[0]: displacement for row, displacement in zip(rows, summary["displacements"])
+    }
+    return summary
+
+def load_columnar_trace_results(filename, commands_file='workload_commands.txt'):
+    # Build the trace table straight from a columnar result.npz, without the JSON round trip
+    from columnarResults import load_columnar, columnar_trace_table
+    with open(commands_file, 'r') as file:
+        commands = [command.strip() for command in file]
+    return columnar_trace_table(load_columnar(filename), commands)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Find conflicts in traceResult.json")
+    parser.add_argument("input_file", nargs="?", default="traceResult.json", help="traceResult.json, or a columnar result.npz")
+    parser.add_argument("--max-pairs", type=int, default=1000, help="stop listing conflicts after this many pairs (default 1000)")
+    args = parser.parse_args()
+
+    if args.input_file.endswith('.npz'):
+        trace_results = load_columnar_trace_results(args.input_file)
+    else:
+        # Read the JSON file
+        with open(args.input_file, 'r') as file:
+            data = json.load(file)
+
+        # Extract the trace results
+        trace_results = data['traceResults']
+
+    summary = summarize_conflicts(trace_results)
+
+    # Save the summary, then stream the conflicts into the same JSON object
+    with open('traceResultConflicts.json', 'w') as outfile:
+        header = json.dumps({
+            "total_inversions": summary["total_inversions"],
+            "adjacent_inversions": summary["adjacent_inversions"],
+            "max_displacement": summary["max_displacement"],
+            "displacements": summary["displacements"]
+        }, indent=2)
+        outfile.write(header[:-2] + ',\n  "conflicts": ')
+        listed = write_conflicts(find_conflicts(trace_results, args.max_pairs), outfile)
+        outfile.write('\n}')
+
+    # Print summary
+    if summary["total_inversions"]:
+        print(f"Found {summary['total_inversions']} conflicts, listed {listed} (max displacement {summary['max_displacement']}). Results saved to traceResultConflicts.json")
+    else:
+        print("No conflicts found. Empty result saved to traceResultConflicts.json")
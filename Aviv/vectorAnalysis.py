@@ -0,0 +1,241 @@
+import json
+import os
+import sys
+import time
+
+import numpy as np
+
+# The columnar result loader lives next to the runners that produce the results
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'Omri'))
+
+# NumPy-backed conflict and skew analysis.
+#
+# Works on the table produced by ResultTraceTable.process_trace_results (traceResult.json) or on a
+# columnar result.npz. Every step is a batched array operation over int64 microsecond timestamps,
+# so million-row runs are analysed in seconds:
+#   - inversions: pairs of ops whose timestamps are in the opposite order of their sequence numbers
+#   - coordinator -> memtable latency distribution
+#   - reorder histogram: how many positions every op moved between sequence and timestamp order
+#   - per-node clock skew estimates (needs the trace events, i.e. a result.npz)
+
+NULL_US = np.iinfo(np.int64).min
+
+
+def load_table_arrays(input_file):
+    # Returns {"seq", "memtable_us", "coordinator_us"} int64 arrays ordered by sequence number
+    if input_file.endswith('.npz'):
+        from columnarResults import load_columnar
+        columns = load_columnar(input_file)
+        order = np.argsort(columns["seq"], kind="stable")
+        keep = order[columns["seq"][order] > 0]
+        return {name: columns[name][keep] for name in ("seq", "memtable_us", "coordinator_us")}, columns
+
+    with open(input_file, 'r') as file:
+        table = json.load(file)["traceResults"]
+    # Missing timestamps become NaT, whose int64 value is NULL_US
+    return {
+        "seq": np.array([row[0] for row in table], dtype=np.int64),
+        "memtable_us": np.array([row[2] for row in table], dtype="datetime64[us]").astype(np.int64),
+        "coordinator_us": np.array([row[3] for row in table], dtype="datetime64[us]").astype(np.int64)
+    }, None
+
+
+def dense_ranks(values):
+    # Equal values share a rank, so ties are not counted as inversions
+    _, ranks = np.unique(values, return_inverse=True)
+    return ranks.astype(np.int64)
+
+
+def count_inversions(values):
+    # Bottom-up merge counting, one batched searchsorted per level (O(n log^2 n), all inside NumPy).
+    # At block width w every left block is compared with the right block next to it: adding
+    # block_index * (n + 1) to the ranks makes all sorted left blocks one globally sorted array.
+    ranks = dense_ranks(values)
+    n = len(ranks)
+    positions = np.arange(n)
+    inversions = 0
+    width = 1
+    while width < n:
+        pair = positions // (2 * width)
+        is_left = (positions // width) % 2 == 0
+        offset = pair * (n + 1)
+        left_keys = np.sort(ranks[is_left] + offset[is_left])
+        right_keys = ranks[~is_left] + offset[~is_left]
+        # Left values <= each right value within the same pair, then the rest of the left block is greater
+        not_greater = np.searchsorted(left_keys, right_keys, side="right")
+        left_start = np.searchsorted(left_keys, offset[~is_left], side="left")
+        left_count = np.minimum(width, n - pair[~is_left] * 2 * width)
+        inversions += int(np.sum(left_count - (not_greater - left_start)))
+        width *= 2
+    return inversions
+
+
+def reorder_displacements(values):
+    # Position in timestamp order minus position in sequence order (stable for equal timestamps)
+    order = np.argsort(values, kind="stable")
+    displacements = np.empty(len(values), dtype=np.int64)
+    displacements[order] = np.arange(len(values)) - order
+    return displacements
+
+
+def reorder_histogram(displacements):
+    # {displacement: number of ops}
+    values, counts = np.unique(displacements, return_counts=True)
+    return {int(value): int(count) for value, count in zip(values, counts)}
+
+
+def latency_distribution(latencies_us):
+    if len(latencies_us) == 0:
+        return {"count": 0}
+    percentiles = np.percentile(latencies_us, [50, 90, 99, 99.9])
+    return {
+        "count": int(len(latencies_us)),
+        "min_us": int(latencies_us.min()),
+        "p50_us": float(percentiles[0]),
+        "p90_us": float(percentiles[1]),
+        "p99_us": float(percentiles[2]),
+        "p999_us": float(percentiles[3]),
+        "max_us": int(latencies_us.max()),
+        "negative": int(np.count_nonzero(latencies_us < 0))
+    }
+
+
+def _group_min(keys, values):
+    # Minimum value per distinct key; returns (unique keys, minima)
+    if len(keys) == 0:
+        return keys, values
+    order = np.lexsort((values, keys))
+    keys, values = keys[order], values[order]
+    starts = np.flatnonzero(np.r_[True, keys[1:] != keys[:-1]])
+    return keys[starts], values[starts]
+
+
+def estimate_clock_skew(columns):
+    # NTP-style skew estimate per node from the trace events of a result.npz.
+    # For every op, the coordinator is the source of its first event. For each other node B:
+    #   forward  = first event on B - first "Sending" event on the coordinator A  (delay + skew)
+    #   backward = first event on A after B's last event - B's last event        (delay - skew)
+    # Taking the minimum of each over all ops removes most of the queueing delay, and
+    # skew(B relative to A) = (min forward - min backward) / 2.
+    offsets = columns["event_offsets"]
+    if len(columns["event_datetime_us"]) == 0:
+        return {}
+    sources = columns["sources"]
+    descriptions = columns["descriptions"]
+    op = np.repeat(np.arange(len(offsets) - 1), np.diff(offsets))
+    when = columns["event_datetime_us"]
+    source = columns["event_source"].astype(np.int64)
+    is_sending = np.char.startswith(descriptions.astype(str), "Sending ")[columns["event_description"]]
+
+    has_events = np.diff(offsets) > 0
+    coordinator_of_op = np.full(len(offsets) - 1, -1, dtype=np.int64)
+    coordinator_of_op[has_events] = source[offsets[:-1][has_events]]
+    coordinator = coordinator_of_op[op]
+    remote = source != coordinator
+    # No send on any coordinator or no event on another node (e.g. RF=1 with token-aware routing):
+    # nothing crossed the network, so there is nothing to estimate
+    if not np.any(is_sending & ~remote) or not np.any(remote):
+        return {}
+
+    num_sources = len(sources)
+    # Per op: coordinator's first send, and first / last event per remote node
+    send_ops, send_times = _group_min(op[is_sending & ~remote], when[is_sending & ~remote])
+    send_time_of_op = np.full(len(offsets) - 1, NULL_US, dtype=np.int64)
+    send_time_of_op[send_ops] = send_times
+
+    remote_key = op[remote] * num_sources + source[remote]
+    first_keys, first_times = _group_min(remote_key, when[remote])
+    last_keys, last_neg = _group_min(remote_key, -when[remote])
+    last_times = -last_neg
+
+    first_ops = first_keys // num_sources
+    nodes = first_keys % num_sources
+    coordinators = coordinator_of_op[first_ops]
+    forward = first_times - send_time_of_op[first_ops]
+    valid_forward = send_time_of_op[first_ops] != NULL_US
+
+    # Coordinator's first event after the remote node's last event (response processing):
+    # one searchsorted over (op, time) keys packed into a single int64
+    base = when.min()
+    span = when.max() - base + 1
+    coordinator_events = ~remote
+    event_keys = np.sort(op[coordinator_events] * span + (when[coordinator_events] - base))
+    last_ops = last_keys // num_sources
+    index = np.searchsorted(event_keys, last_ops * span + (last_times - base), side="left")
+    next_key = event_keys[np.minimum(index, len(event_keys) - 1)]
+    found = (index < len(event_keys)) & (next_key // span == last_ops)
+    backward = np.where(found, next_key % span + base - last_times, NULL_US)
+
+    skew = {}
+    pair_key = coordinators * num_sources + nodes
+    for key in np.unique(pair_key):
+        in_pair = pair_key == key
+        fwd = forward[in_pair & valid_forward]
+        bwd = backward[in_pair & found]
+        if len(fwd) == 0 or len(bwd) == 0:
+            continue
+        name = f"{sources[key // num_sources]}->{sources[key % num_sources]}"
+        skew[name] = {
+            "ops": int(np.count_nonzero(in_pair)),
+            "min_forward_us": int(fwd.min()),
+            "min_backward_us": int(bwd.min()),
+            "skew_us": (int(fwd.min()) - int(bwd.min())) / 2
+        }
+    return skew
+
+
+def analyze(arrays, columns=None, timestamp_column="coordinator_us"):
+    timestamps = arrays[timestamp_column]
+    present = timestamps != NULL_US
+    values = timestamps[present]
+
+    displacements = reorder_displacements(values)
+    both = (arrays["memtable_us"] != NULL_US) & (arrays["coordinator_us"] != NULL_US)
+    result = {
+        "rows": int(len(timestamps)),
+        "rows_with_timestamp": int(len(values)),
+        "total_inversions": count_inversions(values) if len(values) else 0,
+        "adjacent_inversions": int(np.count_nonzero(values[:-1] > values[1:])),
+        "max_displacement": int(np.abs(displacements).max()) if len(values) else 0,
+        "reorder_histogram": reorder_histogram(displacements),
+        "coordinator_to_memtable": latency_distribution(arrays["memtable_us"][both] - arrays["coordinator_us"][both])
+    }
+    if columns is not None and "event_offsets" in columns:
+        result["clock_skew"] = estimate_clock_skew(columns)
+    return result
+
+
+def synthetic_arrays(num_rows, seed=0):
+    # Random run with local reordering, for timing the analysis on large inputs
+    rng = np.random.default_rng(seed)
+    coordinator = 1721839992000000 + np.arange(num_rows, dtype=np.int64) * 10 + rng.integers(0, 200, num_rows)
+    memtable = coordinator + rng.integers(50, 500, num_rows)
+    return {"seq": np.arange(1, num_rows + 1, dtype=np.int64), "memtable_us": memtable, "coordinator_us": coordinator}
+
+
+if __name__ == "__main__":
+    # Usage: python vectorAnalysis.py [traceResult.json|result.npz] [coordinator|memtable]
+    #        python vectorAnalysis.py --synthetic <number of rows>
+    if len(sys.argv) > 2 and sys.argv[1] == "--synthetic":
+        arrays, columns = synthetic_arrays(int(sys.argv[2])), None
+        timestamp_column = "coordinator_us"
+    else:
+        input_file = sys.argv[1] if len(sys.argv) > 1 else 'traceResult.json'
+        timestamp_column = (sys.argv[2] if len(sys.argv) > 2 else 'coordinator') + "_us"
+        arrays, columns = load_table_arrays(input_file)
+
+    start = time.perf_counter()
+    result = analyze(arrays, columns, timestamp_column)
+    elapsed = time.perf_counter() - start
+
+    print(f"Analyzed {result['rows']} rows in {elapsed:.2f}s")
+    print(f"Total inversions: {result['total_inversions']} (adjacent: {result['adjacent_inversions']}), max displacement: {result['max_displacement']}")
+    latency = result["coordinator_to_memtable"]
+    if latency["count"]:
+        print(f"Coordinator -> memtable us: p50={latency['p50_us']:.0f} p99={latency['p99_us']:.0f} max={latency['max_us']}")
+    for pair, skew in result.get("clock_skew", {}).items():
+        print(f"Clock skew {pair}: {skew['skew_us']:.0f} us over {skew['ops']} ops")
+
+    with open('vectorAnalysis.json', 'w') as file:
+        json.dump(result, file, indent=2)
+    print("Results saved to vectorAnalysis.json")
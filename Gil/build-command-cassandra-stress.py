@@ -16,6 +16,7 @@ normal_parameter = [
     "truncate",
     "cl",
     "send-to",
+    "n",
 ]
 
 
@@ -29,101 +30,57 @@ def build_special_parameter(config, param):
         nodes = ",".join(config["node"])
         special_param.append(f"-node {nodes}")
 
+    elif param == "no-warmup":
+        if config["no-warmup"]:
+            special_param.append("no-warmup")
+
+    elif param == "pop":
+        pop = " ".join(f"{key}={value}" for key, value in config["pop"].items())
+        special_param.append(f"-pop {pop}")
+
+    elif param == "rate":
+        rate = config["rate"]
+        rate_options = [
+            f"{key}={value}" for key, value in rate.items() if key != "auto"
+        ]
+        if rate.get("auto", False):
+            rate_options.append("auto")
+        special_param.append("-rate " + " ".join(rate_options))
+
+    elif param == "log":
+        log = " ".join(f"{key}={value}" for key, value in config["log"].items())
+        special_param.append(f"-log {log}")
+
+    else:
+        print(f"Warning: unknown cassandra-stress parameter '{param}' ignored")
+
     return special_param
 
 
 def build_command(config):
     command = [config["command"], config["mode"]]
 
+    # cassandra-stress wants the command options (key=value, ops(...), no-warmup)
+    # before the dash options (-node, -pop, -rate, -log)
+    dash_options = []
+    # n= and duration= are alternative ways to end the run, cassandra-stress refuses both
+    if "n" in config and "duration" in config:
+        print("Warning: both 'n' and 'duration' are set, 'n' ignored")
     for key in config.keys():
         if key == "command" or key == "mode":
             continue
+        if key == "n" and "duration" in config:
+            continue
         if key in normal_parameter:
             command.extend([f"{key}={config[key]}"])
         else:
-            command.extend(build_special_parameter(config, key))
-
-    return command
-
-
-# Function to run cassandra-stress with parameters from the configuration file
-# def run_cassandra_stress(config):
-#     command = [config["command"]]
-#     command.append(config["mode"])
-
-#     # Add parameters to the command
-#     if "profile" in config:
-#         command.extend([f"profile={config['profile']}"])
-
-#     if "ops" in config:
-#         command.extend([f"\"ops({config['ops']})\""])
-
-#     if "doration" in config:
-#         command.extend([f"duration={config['duration']}"])
-
-#     if "cl" in config:
-#         command.extend([f'cl={config["cl"]}'])
-
-#     if "n" in config:
-#         command.extend([f'n={str(config["n"])}'])
-
-#     if config.get("no-warmup", False):
-#         command.append("-no-warmup")
-
-#     if "pop" in config:
-#         for key, value in config["pop"].items():
-#             command.extend([f"-pop", f"{key}={value}"])
-
-#     if "nodes" in config:
-#         command.extend(["-node", ",".join(config["nodes"])])
-
-#     if "log" in config:
-#         command.extend(
-#             ["-log", f'file={config["log"]["file"]},level={config["log"]["level"]}']
-#         )
-
-#     if "rate" in config:
-#         rate = config["rate"]
-#         command.extend(
-#             [
-#                 "-rate",
-#             ]
-#         )
-
-#         if "threads" in rate:
-#             command.extend([f'threads={rate["threads"]}'])
-
-#         if "throttle" in rate:
-#             command.extend([f'throttle={rate["throttle"]}'])
-
-#         if "fixed" in rate:
-#             command.extend([f'fixed={rate["fixed"]}'])
-
-#         if "auto" in rate.keys() and rate["auto"]:
-#             command.extend([f"auto"])
-
-#     if "send-to" in config:
-#         command.extend(["-send-to", config["send-to"]])
-
-#     print(command)
-#     print(" ".join(command))
-#     # Open the log file
-#     # with open(config["log"]["file"], "w") as log_file:
-#     #     # Run the command
-#     #     process = subprocess.Popen(
-#     #         command, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True
-#     #     )
-
-#     #     # Read the output and write it to both the terminal and the log file
-#     #     for line in iter(process.stdout.readline, ""):
-#     #         print(line, end="")  # Print to terminal
-#     #         log_file.write(line)  # Write to log file
-
-#     #     # Wait for the process to finish and get the return code
-#     #     process.stdout.close()
-#     #     return_code = process.wait()
+            for param in build_special_parameter(config, key):
+                if param.startswith("-"):
+                    dash_options.append(param)
+                else:
+                    command.append(param)
 
-#     # print(f"cassandra-stress ran with return code {return_code}")
+    return command + dash_options
 
 
 if __name__ == "__main__":
@@ -0,0 +1,246 @@
+import argparse
+import datetime
+import importlib.util
+import json
+import os
+import re
+import shlex
+import subprocess
+import sys
+import threading
+
+# Runs cassandra-stress as background load and the traced workload (Omri's runner) on top of it.
+#
+# cassandra-stress is started with the command from build-command-cassandra-stress.py. Its interval
+# lines are read as they are printed and stored as a timestamped series (stressSeries.json). Once
+# the first interval is reported (so warm-up is over), the traced workload is started. When both
+# are done the trace table is built, and every stress interval gets the number of traced ops whose
+# coordinator timestamp falls into it and how many of them were reordered (stressAlignment.json).
+#
+# Trace timestamps come from the nodes' clocks (UTC), the stress series from this machine's clock
+# (also UTC), so the client should be NTP-synced with the cluster.
+
+GIL_DIR = os.path.dirname(os.path.abspath(__file__))
+OMRI_DIR = os.path.join(GIL_DIR, "..", "Omri")
+TRACE_TIME_FORMAT = "%Y-%m-%d %H:%M:%S.%f"
+
+
+def load_build_command_module():
+    # The file name has dashes, so it is loaded by path
+    spec = importlib.util.spec_from_file_location(
+        "build_command_cassandra_stress",
+        os.path.join(GIL_DIR, "build-command-cassandra-stress.py"),
+    )
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def utc_now():
+    return datetime.datetime.now(datetime.timezone.utc).replace(tzinfo=None)
+
+
+def parse_number(value):
+    value = value.strip().replace(",", "")
+    try:
+        return float(value)
+    except ValueError:
+        return None
+
+
+class StressMonitor:
+    # Reads cassandra-stress output on a background thread, copies it to a log file and parses
+    # the interval lines:
+    #   type                     total ops,    op/s,    pk/s,   row/s,    mean,     med, ...
+    #   total,                       3,700,    3700,    3700,    3700,     1.1,     0.9, ...
+    # (the type column has no comma in the header, and total ops has thousands separators).
+    # Every sample is stamped with the time it was read, which is the end of its interval.
+    def __init__(self, process, log_file):
+        self.process = process
+        self.log_file = log_file
+        self.header = None
+        self.samples = []
+        self.first_sample = threading.Event()
+        self._last_end = {}
+        self._started_at = utc_now()
+        self._thread = threading.Thread(target=self._read_loop, daemon=True)
+        self._thread.start()
+
+    def _read_loop(self):
+        with open(self.log_file, "w") as log:
+            for line in iter(self.process.stdout.readline, ""):
+                print(line, end="")
+                log.write(line)
+                self.parse_line(line, utc_now())
+        self.first_sample.set()
+
+    def parse_line(self, line, read_at):
+        line = re.sub(r"(?<=\d),(?=\d{3}\b)", "", line.strip())
+        fields = [field.strip() for field in line.split(",")]
+        if fields[0].startswith("type"):
+            self.header = [
+                name for name in re.split(r"\s{2,}", fields[0]) if name
+            ] + fields[1:]
+            return
+        if self.header is None or len(fields) != len(self.header):
+            return
+        values = [parse_number(field) for field in fields[1:]]
+        if None in values:
+            return
+        sample = {
+            "type": fields[0],
+            "start": self._last_end.get(fields[0], self._started_at).isoformat(),
+            "end": read_at.isoformat(),
+        }
+        sample.update(zip(self.header[1:], values))
+        self._last_end[fields[0]] = read_at
+        self.samples.append(sample)
+        if fields[0] == "total":
+            self.first_sample.set()
+
+    def wait(self):
+        return_code = self.process.wait()
+        self._thread.join()
+        return return_code
+
+
+def launch_stress(command, log_file):
+    # The command is built for a shell ("ops(...)" is quoted), so it is split the same way
+    process = subprocess.Popen(
+        shlex.split(" ".join(command)),
+        stdout=subprocess.PIPE,
+        stderr=subprocess.STDOUT,
+        text=True,
+        bufsize=1,
+        cwd=GIL_DIR,
+    )
+    return StressMonitor(process, log_file)
+
+
+def run_traced_workload(workload_dir, workload_args):
+    runner = os.path.join(OMRI_DIR, "pyTraceSimpleThreads.py")
+    return subprocess.run(
+        [sys.executable, runner] + workload_args, cwd=workload_dir
+    ).returncode
+
+
+def build_trace_table(workload_dir, result_file):
+    table_script = os.path.join(OMRI_DIR, "ResultTraceTable.py")
+    subprocess.run([sys.executable, table_script, result_file], cwd=workload_dir)
+    with open(os.path.join(workload_dir, "traceResult.json"), "r") as file:
+        return json.load(file)["traceResults"]
+
+
+def reordered_ops(trace_table):
+    # [(coordinator datetime, reordered)] in sequence order: an op is reordered when an op
+    # with a lower sequence number reached its coordinator later
+    rows = sorted(
+        (row[0], datetime.datetime.strptime(row[3], TRACE_TIME_FORMAT))
+        for row in trace_table
+        if row[3]
+    )
+    result = []
+    latest = None
+    for _, timestamp in rows:
+        result.append((timestamp, latest is not None and timestamp < latest))
+        if latest is None or timestamp > latest:
+            latest = timestamp
+    return result
+
+
+def align_with_traces(samples, trace_table, sample_type="total"):
+    # Every stress interval of sample_type with the traced ops that fall into it
+    ops = reordered_ops(trace_table)
+    aligned = []
+    for sample in samples:
+        if sample["type"] != sample_type:
+            continue
+        start = datetime.datetime.fromisoformat(sample["start"])
+        end = datetime.datetime.fromisoformat(sample["end"])
+        in_interval = [
+            reordered for timestamp, reordered in ops if start <= timestamp < end
+        ]
+        entry = dict(sample)
+        entry["traced_ops"] = len(in_interval)
+        entry["reordered_ops"] = sum(in_interval)
+        aligned.append(entry)
+
+    matched = sum(entry["traced_ops"] for entry in aligned)
+    return {
+        "intervals": aligned,
+        "traced_ops": len(ops),
+        "traced_ops_outside_stress": len(ops) - matched,
+    }
+
+
+def print_alignment(alignment):
+    print(
+        f"{'end':>26} {'op/s':>10} {'mean ms':>8} {'.99 ms':>8} {'traced':>7} {'reordered':>9}"
+    )
+    for entry in alignment["intervals"]:
+        print(
+            f"{entry['end']:>26} {entry.get('op/s', 0):>10.0f} {entry.get('mean', 0):>8.2f}"
+            f" {entry.get('.99', 0):>8.2f} {entry['traced_ops']:>7} {entry['reordered_ops']:>9}"
+        )
+    if alignment["traced_ops_outside_stress"]:
+        print(
+            f"{alignment['traced_ops_outside_stress']} of {alignment['traced_ops']} traced ops fell outside the stress run"
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Run cassandra-stress in the background and the traced workload on top of it"
+    )
+    parser.add_argument(
+        "--config", default=os.path.join(GIL_DIR, "cassandra-stress-config.yaml")
+    )
+    parser.add_argument(
+        "--workload-dir", default=".", help="directory with workload_commands.txt"
+    )
+    parser.add_argument(
+        "--first-sample-timeout",
+        type=float,
+        default=120,
+        help="seconds to wait for stress to report its first interval",
+    )
+    parser.add_argument(
+        "workload_args",
+        nargs=argparse.REMAINDER,
+        help="arguments passed to pyTraceSimpleThreads.py (after --)",
+    )
+    args = parser.parse_args()
+    workload_args = [arg for arg in args.workload_args if arg != "--"]
+
+    builder = load_build_command_module()
+    command = builder.build_command(builder.read_config(args.config))
+    print(" ".join(command))
+
+    monitor = launch_stress(
+        command, os.path.join(args.workload_dir, "stress_output.log")
+    )
+    if not monitor.first_sample.wait(args.first_sample_timeout):
+        print(
+            "Warning: cassandra-stress reported no interval yet, starting the workload anyway"
+        )
+
+    workload_code = run_traced_workload(args.workload_dir, workload_args)
+    stress_code = monitor.wait()
+    print(
+        f"cassandra-stress ran with return code {stress_code}, traced workload with return code {workload_code}"
+    )
+
+    with open(os.path.join(args.workload_dir, "stressSeries.json"), "w") as file:
+        json.dump(
+            {"command": " ".join(command), "samples": monitor.samples}, file, indent=2
+        )
+
+    if workload_code == 0:
+        result_file = "result.jsonl" if "--stream" in workload_args else "result.json"
+        alignment = align_with_traces(
+            monitor.samples, build_trace_table(args.workload_dir, result_file)
+        )
+        with open(os.path.join(args.workload_dir, "stressAlignment.json"), "w") as file:
+            json.dump(alignment, file, indent=2)
+        print_alignment(alignment)
+        print("Results saved to stressSeries.json and stressAlignment.json")
@@ -1,6 +1,10 @@
 import json
+import sys
 from datetime import datetime
 
+from traceIndex import build_trace_index
+from resultSink import iter_trace_timestamps
+
 
 # The generated matrix (stored in traceResult.json) is a 2D table where each row represents a command and its associated timestamps. The columns are as follows:
 
@@ -10,38 +14,61 @@ from datetime import datetime
 # 4. Coordinator Timestamp: The timestamp when the command reached the coordinator. This value can be None if the command did not reach the coordinator.
 
 
-def process_trace_results(input_file, output_file):
-    # Read the results from the JSON file
-    with open(input_file, 'r') as file:
-        data = json.load(file)
-    
+def load_trace_index(input_file):
+    # Returns (index, by_sequence). Results written with sequence numbers are indexed by them (an
+    # integer lookup), older results by the query text.
+    # Streaming results (result.jsonl) are read record by record, keeping only the timestamps
+    if input_file.endswith('.jsonl'):
+        records = list(iter_trace_timestamps(input_file))
+    else:
+        # Read the results from the JSON file
+        with open(input_file, 'r') as file:
+            records = json.load(file)["traces"]
+    by_sequence = bool(records) and all(record.get("seq") is not None for record in records)
+    return build_trace_index(records, "seq" if by_sequence else "query"), by_sequence
+
+def build_result_table(commands, trace_index, by_sequence=False):
     # Initialize a list to store the 2D table
     result_table = []
 
-    # Create a dictionary to map commands to sequence numbers
-    command_sequence = {command.strip(): i+1 for i, command in enumerate(open('workload_commands.txt').readlines())}
-
-    # Initialize a set to keep track of which sequence numbers are captured
-    captured_sequences = set()
-
-    # Iterate through the traces to find the commands that reached the memtable and coordinator
-    for trace in data["traces"]:
+    # Look up the trace of every command to find the ones that reached the memtable and coordinator
+    # (by sequence number when the runner recorded it, otherwise by the command text)
+    for sequence_number, command in enumerate(commands, start=1):
+        trace = trace_index.get(sequence_number if by_sequence else command)
+        if trace is None:
+            continue
         memtable_timestamp = trace.get("memtable_timestamp")
         coordinator_timestamp = trace.get("coordinator_timestamp")
         if memtable_timestamp or coordinator_timestamp:
-            command = trace["query"]
-            sequence_number = command_sequence.get(command)
-            if sequence_number:
-                memtable_datetime = datetime.fromisoformat(memtable_timestamp) if memtable_timestamp else None
-                coordinator_datetime = datetime.fromisoformat(coordinator_timestamp) if coordinator_timestamp else None
-                result_table.append([sequence_number, command, memtable_datetime, coordinator_datetime])
-                captured_sequences.add(sequence_number)
+            memtable_datetime = datetime.fromisoformat(memtable_timestamp) if memtable_timestamp else None
+            coordinator_datetime = datetime.fromisoformat(coordinator_timestamp) if coordinator_timestamp else None
+            result_table.append([sequence_number, command, memtable_datetime, coordinator_datetime])
+    return result_table
+
+def process_trace_results(input_file, output_file, trace_index=None):
+    # Read the commands in sequence order (sequence number = line number)
+    with open('workload_commands.txt') as file:
+        commands = [command.strip() for command in file]
+
+    if input_file.endswith('.npz'):
+        # Columnar results (result.npz) already hold integer sequence numbers and timestamps
+        from columnarResults import load_columnar, columnar_trace_table
+        result_table = columnar_trace_table(load_columnar(input_file), commands)
+    else:
+        # Build the command -> trace index once so every lookup is O(1)
+        if trace_index is None:
+            trace_index, by_sequence = load_trace_index(input_file)
+        else:
+            by_sequence = False
+        result_table = build_result_table(commands, trace_index, by_sequence)
+
+    # Keep track of which sequence numbers are captured
+    captured_sequences = {row[0] for row in result_table}
 
-    # Sort the result table by sequence number (first column)
-    result_table.sort(key=lambda x: x[0])
+    # The table is already ordered by sequence number (first column)
 
     # Log which sequence numbers were not captured
-    missing_sequences = set(range(1, len(command_sequence) + 1)) - captured_sequences
+    missing_sequences = set(range(1, len(commands) + 1)) - captured_sequences
     print(f"Missing sequence numbers: {sorted(missing_sequences)}")
 
     # Create the output data structure
@@ -54,8 +81,8 @@ def process_trace_results(input_file, output_file):
         json.dump(output_data, file, ensure_ascii=False, indent=4, default=str)
 
 if __name__ == "__main__":
-    # Define the input and output file paths
-    input_file = 'result.json'
+    # Define the input and output file paths (pass result.jsonl or result.npz to read a streamed or columnar run)
+    input_file = sys.argv[1] if len(sys.argv) > 1 else 'result.json'
     output_file = 'traceResult.json'
 
     # Process the trace results and generate the 2D table
@@ -0,0 +1,231 @@
+import datetime
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+try:
+    from cassandra import ConsistencyLevel
+    from cassandra.query import SimpleStatement
+except ImportError:
+    # Offline runs against fakeCassandra.py work without cassandra-driver
+    from fakeCassandra import ConsistencyLevel, SimpleStatement
+
+from traceProcessing import process_trace
+from clientProfiling import NO_TIMERS, logger
+
+# Bounded-concurrency workload executor built on the driver's execute_async futures.
+#
+# Instead of one OS thread per command, at most max_in_flight writes are outstanding at any time
+# (a semaphore is taken before every execute_async and released in the future's callback).
+# Trace fetching is blocking (get_query_trace polls system_traces), so it never runs on the
+# driver's event loop: finished writes hand their future to a separate, small worker pool.
+# With deferred_traces=True no trace is fetched during the run at all; only the trace session ids
+# are recorded (in pending_commands) for traceHarvester.harvest_into_results() after the run.
+# With a sampler (traceSampling.TraceSampler) only some ops are traced, and the report compares the
+# latency of the traced and the untraced ops.
+
+
+def percentile(sorted_values, fraction):
+    # Nearest-rank percentile of an already sorted list
+    if not sorted_values:
+        return None
+    index = min(len(sorted_values) - 1, max(0, int(round(fraction * len(sorted_values))) - 1))
+    return sorted_values[index]
+
+
+def latency_report(latencies, elapsed_sec):
+    # Achieved throughput plus latency percentiles in milliseconds
+    ordered = sorted(latencies)
+    return {
+        "ops": len(ordered),
+        "elapsed_sec": elapsed_sec,
+        "ops_per_sec": len(ordered) / elapsed_sec if elapsed_sec > 0 else None,
+        "latency_ms": {
+            "p50": percentile(ordered, 0.50),
+            "p90": percentile(ordered, 0.90),
+            "p99": percentile(ordered, 0.99),
+            "p999": percentile(ordered, 0.999),
+            "max": ordered[-1] if ordered else None
+        }
+    }
+
+
+class AsyncWorkloadExecutor:
+    def __init__(self, session, max_in_flight=128, trace_workers=4, trace_wait_sec=10,
+                 consistency_level=ConsistencyLevel.ONE, deferred_traces=False, sink=None, monitor=None,
+                 sampler=None, retention="full", timers=NO_TIMERS):
+        self.session = session
+        self.max_in_flight = max_in_flight
+        self.trace_workers = trace_workers
+        self.trace_wait_sec = trace_wait_sec
+        self.consistency_level = consistency_level
+        self.deferred_traces = deferred_traces
+
+        # Optional resultSink.ResultSink: finished ops are streamed to disk instead of kept in the lists
+        self.sink = sink
+
+        # Optional liveMonitor.LiveMonitor: live counters and conflict detection, can stop the run early
+        self.monitor = monitor
+
+        # Which ops are traced (None: all of them) and how many of their events are kept
+        self.sampler = sampler
+        self.retention = retention
+        self.traced_latencies = []
+        self.untraced_latencies = []
+
+        # clientProfiling.PhaseTimers: client time per phase (build, send, callback, trace fetch, ...)
+        self.timers = timers
+
+        # Results in the same shape as the runners' traces_res / queries_and_times lists
+        self.traces_res = []
+        self.queries_and_times = []
+        self.latencies = []
+        self.errors = 0
+
+        # Deferred mode: [command, trace_id, completed_at, seq] for the post-run harvester
+        self.pending_commands = []
+
+        self._lock = threading.Lock()
+        self._in_flight = threading.BoundedSemaphore(max_in_flight)
+        self._trace_pool = None
+
+    def run(self, commands, statements=None, sequence_numbers=None):
+        # statements: optional bound statements (prepared mode), one per command
+        # sequence_numbers: sequence number of every command (default: its position, starting at 1)
+        self._trace_pool = ThreadPoolExecutor(max_workers=self.trace_workers)
+        start = time.perf_counter()
+
+        for i, command in enumerate(commands):
+            if self._aborted():
+                break
+            seq = sequence_numbers[i] if sequence_numbers is not None else i + 1
+            # Block while the in-flight window is full
+            self._in_flight.acquire()
+            self._execute(command, statements[i] if statements is not None else None, seq)
+
+        elapsed = self._drain(start)
+        report = latency_report(self.latencies, elapsed)
+        self._add_tracing_report(report)
+        return report
+
+    def _aborted(self):
+        return self.monitor is not None and self.monitor.abort.is_set()
+
+    def _add_tracing_report(self, report):
+        # Sampled runs: the same latency percentiles for the traced and the untraced ops
+        if self.sampler is None:
+            return
+        report["tracing"] = {
+            "traced_ops": len(self.traced_latencies),
+            "untraced_ops": len(self.untraced_latencies),
+            "traced_latency_ms": latency_report(self.traced_latencies, report["elapsed_sec"])["latency_ms"],
+            "untraced_latency_ms": latency_report(self.untraced_latencies, report["elapsed_sec"])["latency_ms"]
+        }
+
+    def _execute(self, command, statement, seq, intended_at=None):
+        # Issue one op (the caller holds an in-flight slot). Latency is measured from intended_at
+        # when given (open-loop scheduling), otherwise from the moment the op is sent.
+        started = self.timers.now()
+        if statement is None:
+            statement = SimpleStatement(command, consistency_level=self.consistency_level)
+        traced = self.sampler is None or self.sampler.should_trace(seq, command)
+        if self.monitor is not None:
+            self.monitor.on_issue()
+        started = self.timers.lap("build_statement", command, started)
+        issued_at = time.perf_counter()
+        future = self.session.execute_async(statement, trace=traced)
+        future.add_callbacks(self._on_success, self._on_error,
+                             callback_args=(command, seq, future, issued_at, intended_at or issued_at, traced),
+                             errback_args=(command,))
+        self.timers.lap("send", command, started)
+
+    def _drain(self, start):
+        # Wait for the window to drain: once every slot can be taken, no write is outstanding
+        for _ in range(self.max_in_flight):
+            self._in_flight.acquire()
+        elapsed = time.perf_counter() - start
+        for _ in range(self.max_in_flight):
+            self._in_flight.release()
+
+        # Then wait for the remaining trace fetches
+        self._trace_pool.shutdown(wait=True)
+        return elapsed
+
+    def _record_latency(self, command, latency_ms, service_ms):
+        # latency_ms: from the intended start, service_ms: from the moment the op was sent
+        with self._lock:
+            self.latencies.append(latency_ms)
+        if self.monitor is not None:
+            self.monitor.on_complete(latency_ms)
+
+    def _on_success(self, rows, command, seq, future, issued_at, intended_at, traced):
+        # Runs on the driver's event loop thread: record and hand off, never block here.
+        # The slot is released whatever happens, or a failing callback would hang the drain in run()
+        try:
+            self._handle_success(command, seq, future, issued_at, intended_at, traced)
+        finally:
+            self._in_flight.release()
+
+    def _handle_success(self, command, seq, future, issued_at, intended_at, traced):
+        started = self.timers.now()
+        now = time.perf_counter()
+        completed_at = datetime.datetime.now().isoformat()
+        latency_ms = (now - intended_at) * 1000
+        self._record_latency(command, latency_ms, (now - issued_at) * 1000)
+        if self.sampler is not None:
+            with self._lock:
+                (self.traced_latencies if traced else self.untraced_latencies).append(latency_ms)
+        if not traced:
+            # No trace to fetch; the op only counts in the latencies
+            if self.monitor is not None:
+                self.monitor.on_untraced(seq)
+            self.timers.lap("callback", command, started)
+            return
+        if self.deferred_traces:
+            # The trace id comes back with the response, reading it does not touch system_traces
+            with self._lock:
+                for trace_id in future.get_query_trace_ids():
+                    self.pending_commands.append([command, trace_id, completed_at, seq])
+            self.timers.lap("callback", command, started)
+            return
+        # Submitted before the slot is released, so the drain in run() cannot close the pool first
+        self._trace_pool.submit(self._fetch_trace, command, seq, future, completed_at)
+        self.timers.lap("callback", command, started)
+
+    def _on_error(self, error, command):
+        with self._lock:
+            self.errors += 1
+        if self.monitor is not None:
+            self.monitor.on_error()
+        self._in_flight.release()
+        print(f"Error executing command '{command}':", error)
+
+    def _fetch_trace(self, command, seq, future, completed_at):
+        started = self.timers.now()
+        try:
+            trace = future.get_query_trace(max_wait_sec=self.trace_wait_sec)
+            started = self.timers.lap("trace_fetch", command, started)
+            data = process_trace(trace, self.retention)
+            # Prepared statements trace the template, keep the executed command instead
+            data["query"] = command
+            data["seq"] = seq
+        except Exception as e:
+            print("Error retrieving query trace:", e)
+            return
+        started = self.timers.lap("process_trace", command, started)
+        # Print the captured timestamps (only with --log-level debug)
+        if data.get("memtable_timestamp"):
+            logger.debug("Command '%s' reached memtable at %s", command, data["memtable_timestamp"])
+        if data.get("coordinator_timestamp"):
+            logger.debug("Command '%s' reached coordinator at %s", command, data["coordinator_timestamp"])
+        started = self.timers.lap("log", command, started)
+        if self.monitor is not None:
+            self.monitor.on_trace(seq, data, completed_at)
+            started = self.timers.lap("monitor", command, started)
+        if self.sink is not None:
+            self.sink.write(command, data, completed_at)
+        else:
+            with self._lock:
+                self.traces_res.append(data)
+                self.queries_and_times.append([command, completed_at])
+        self.timers.lap("record", command, started)
@@ -0,0 +1,136 @@
+import time
+
+from traceSampling import partition_key
+from workloadGenerator import using_timestamp
+from resultsStore import op_rows
+
+# Per-partition batching mode.
+#
+# batch_commands() groups consecutive ops on the same person id into one
+#     BEGIN UNLOGGED BATCH INSERT ...; UPDATE ...; APPLY BATCH;
+# of at most batch_size statements (a new batch starts whenever the partition changes), like the
+# batchtype: UNLOGGED inserts of Gil's stress profile. Every batch is one round trip and one trace.
+# A single-partition batch is applied as one mutation, and Cassandra skips the batch log for it even
+# when it is LOGGED, so the two types should only differ for batches over several partitions.
+#
+# The trade-off: all statements of a batch get the same write timestamp, so when two of them write
+# the same column the larger value wins, not the later statement. With timestamps=True every
+# statement gets its own USING TIMESTAMP (base + its position in the batch) to keep the order.
+#
+# After the run, expand_batch_results() turns every batch trace back into one record per statement
+# (sequence number and command of the statement, timestamps of the batch), so result.json and the
+# analysis scripts look the same as in the single-statement mode.
+
+BATCH_TYPES = ("UNLOGGED", "LOGGED")
+
+
+class Batch:
+    def __init__(self, key, batch_type="UNLOGGED"):
+        self.key = key
+        self.batch_type = batch_type
+        self.members = []
+
+    def add(self, seq, command):
+        self.members.append((seq, command))
+
+    def command(self, base_timestamp_us=None):
+        # The batch as one CQL string; with a base timestamp every statement gets its own
+        statements = []
+        for i, (_, command) in enumerate(self.members):
+            command = command.strip()
+            if base_timestamp_us is not None:
+                command = using_timestamp(command, base_timestamp_us + i)
+            statements.append(command if command.endswith(";") else command + ";")
+        return f"BEGIN {self.batch_type} BATCH " + " ".join(statements) + " APPLY BATCH;"
+
+
+def batch_commands(commands, batch_size, batch_type="UNLOGGED", sequence_numbers=None):
+    # Yields the batches of consecutive ops per partition (sequence numbers start at 1 by default)
+    batch = None
+    for i, command in enumerate(commands):
+        seq = sequence_numbers[i] if sequence_numbers is not None else i + 1
+        key = partition_key(command)
+        if batch is not None and (batch.key != key or len(batch.members) >= batch_size):
+            yield batch
+            batch = None
+        if batch is None:
+            batch = Batch(key, batch_type)
+        batch.add(seq, command)
+    if batch is not None:
+        yield batch
+
+
+class BatchedWorkload:
+    # The batch commands for the executor, remembering the statements of every batch by the
+    # sequence number of its first statement
+    def __init__(self, commands, batch_size, batch_type="UNLOGGED", timestamps=False):
+        self.batches = list(batch_commands(commands, batch_size, batch_type))
+        self.timestamps = timestamps
+        self.by_seq = {batch.members[0][0]: batch for batch in self.batches}
+        self.statements = sum(len(batch.members) for batch in self.batches)
+
+    def commands(self):
+        # Rendered lazily, so client timestamps are taken when the batch is sent
+        last = 0
+        for batch in self.batches:
+            base = None
+            if self.timestamps:
+                base = max(last + 1, time.time_ns() // 1000)
+                last = base + len(batch.members) - 1
+            yield batch.command(base)
+
+    def sequence_numbers(self):
+        return [batch.members[0][0] for batch in self.batches]
+
+
+def expand_batch_results(workload, traces_res, queries_and_times):
+    # One record per statement, in place of one per batch
+    traces = []
+    for trace in traces_res:
+        batch = workload.by_seq.get(trace.get("seq"))
+        if batch is None:
+            traces.append(trace)
+            continue
+        for seq, command in batch.members:
+            traces.append(dict(trace, query=command, seq=seq, batch_seq=batch.members[0][0], batch_size=len(batch.members)))
+    queries = []
+    completed = {trace["seq"]: completed_at for trace, (_, completed_at) in zip(traces_res, queries_and_times) if "seq" in trace}
+    for trace in traces:
+        queries.append([trace["query"], completed.get(trace.get("batch_seq", trace.get("seq")))])
+    return traces, queries
+
+
+def reorder_summary(report, traces, statements=None):
+    # Throughput in statements and the share of statements an earlier one overtook (by coordinator timestamp)
+    rows = op_rows(traces)
+    timestamped = [row for row in rows if row[4] is not None]
+    statements = statements if statements is not None else report["ops"]
+    elapsed = report["elapsed_sec"]
+    ties = sum(1 for previous, row in zip(timestamped, timestamped[1:]) if previous[4] == row[4])
+    return {
+        "statements": statements,
+        "round_trips": report["ops"],
+        "statements_per_sec": statements / elapsed if elapsed > 0 else None,
+        "latency_ms": report["latency_ms"],
+        "traced_statements": len(timestamped),
+        "reordered": sum(row[6] for row in timestamped),
+        "reorder_rate": sum(row[6] for row in timestamped) / len(timestamped) if timestamped else None,
+        # Neighbours with the same timestamp: ordered by value, not by sequence number
+        "timestamp_ties": ties
+    }
+
+
+def print_batching_comparison(single, batched):
+    print(f"{'':>18} {'single':>10} {'batched':>10}")
+    rows = [("round trips", single["round_trips"], batched["round_trips"], "d"),
+            ("statements/sec", single["statements_per_sec"], batched["statements_per_sec"], ".1f"),
+            ("p50 ms / trip", single["latency_ms"]["p50"], batched["latency_ms"]["p50"], ".2f"),
+            ("p99 ms / trip", single["latency_ms"]["p99"], batched["latency_ms"]["p99"], ".2f"),
+            ("reorder rate", single["reorder_rate"], batched["reorder_rate"], ".4f"),
+            ("timestamp ties", single["timestamp_ties"], batched["timestamp_ties"], "d")]
+    for name, left, right, spec in rows:
+        if left is None or right is None:
+            continue
+        print(f"{name:>18} {left:>10{spec}} {right:>10{spec}}")
+    if single["statements_per_sec"] and batched["statements_per_sec"]:
+        print(f"Batching speed-up: {batched['statements_per_sec'] / single['statements_per_sec']:.2f}x statements/sec")
@@ -0,0 +1,76 @@
+import os
+import sys
+import time
+
+from fakeCassandra import FakeCluster
+from asyncExecutor import AsyncWorkloadExecutor
+from traceHarvester import harvest_into_results
+from traceIndex import build_trace_index
+from ResultTraceTable import build_result_table
+from traceProcessing import build_final_data
+
+# The inversion counting lives with the analysis scripts
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'Aviv'))
+from inversions import summarize_inversions
+
+# Offline benchmark of the whole pipeline against fakeCassandra.FakeCluster (seeded, no network):
+#   - executor throughput for several in-flight windows, with traces fetched during the run
+#   - deferred mode: run without trace fetches, then the bulk harvest
+#   - analysis: trace table join and inversion summary on the collected results
+# Usage: python benchPipeline.py [number of ops] [reorder probability]
+
+
+def synthetic_commands(num_ops, keys=100):
+    # Same command shapes as generateWorkload.py, spread over a number of person ids
+    commands = []
+    for i in range(1, num_ops + 1):
+        person_id = 208306068 + i % keys
+        if i % 3:
+            commands.append(f"INSERT INTO simpletry.person (id, name, toTS) VALUES ('{person_id}', 'omri{i}', {{'{i}':toTimestamp(now())}});")
+        else:
+            commands.append(f"UPDATE simpletry.person SET name = 'Aviv/Gil{i}', toTS['{i}'] = toTimestamp(now()) WHERE id = '{person_id}';")
+    return commands
+
+
+def bench_executor(session, commands, max_in_flight, deferred_traces=False):
+    executor = AsyncWorkloadExecutor(session, max_in_flight=max_in_flight, trace_workers=4, deferred_traces=deferred_traces)
+    report = executor.run(commands)
+    return executor, report
+
+
+def bench_analysis(commands, traces_res, queries_and_times):
+    start = time.perf_counter()
+    final_data = build_final_data(queries_and_times, traces_res)
+    table = build_result_table(commands, build_trace_index(final_data["traces"], "seq"), by_sequence=True)
+    join_sec = time.perf_counter() - start
+
+    start = time.perf_counter()
+    summary = summarize_inversions([row[3] for row in table if row[3]])
+    inversions_sec = time.perf_counter() - start
+    return join_sec, inversions_sec, summary["total_inversions"]
+
+
+if __name__ == "__main__":
+    num_ops = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    reorder_probability = float(sys.argv[2]) if len(sys.argv) > 2 else 0.01
+    commands = synthetic_commands(num_ops)
+
+    cluster = FakeCluster(seed=0, reorder_probability=reorder_probability, clock_skew_ms={"127.0.0.3": 3.0})
+    session = cluster.connect('simpletry')
+
+    print(f"{'max in flight':>14} {'ops/sec':>10} {'p50 ms':>8} {'p99 ms':>8}")
+    for max_in_flight in (1, 16, 128, 1024):
+        executor, report = bench_executor(session, commands, max_in_flight)
+        latency = report["latency_ms"]
+        print(f"{max_in_flight:>14} {report['ops_per_sec']:>10.0f} {latency['p50']:>8.2f} {latency['p99']:>8.2f}")
+
+    executor, report = bench_executor(session, commands, 128, deferred_traces=True)
+    start = time.perf_counter()
+    traces_res, queries_and_times = harvest_into_results(session, executor.pending_commands)
+    print(f"Deferred: {report['ops_per_sec']:.0f} ops/sec, harvest of {len(traces_res)} traces {time.perf_counter() - start:.2f}s")
+
+    join_sec, inversions_sec, inversions = bench_analysis(commands, traces_res, queries_and_times)
+    print(f"Analysis: trace table join {join_sec:.2f}s, inversion summary {inversions_sec:.2f}s ({inversions} inversions)")
+
+    session.shutdown()
+    cluster.shutdown()
@@ -0,0 +1,208 @@
+import collections
+import cProfile
+import json
+import logging
+import pstats
+import sys
+import threading
+import time
+
+from traceProcessing import op_type
+
+# Where the client spends its time.
+#
+# PhaseTimers accumulates wall time per phase of every op (building the statement, sending it,
+# waiting for the trace, turning the trace into a record, logging, storing the result), per op type
+# and per thread. Every thread writes only to its own table, so timing adds no lock contention.
+# The code being timed chains the phases:
+#     started = timers.now()
+#     ...
+#     started = timers.lap("build_statement", command, started)
+# NO_TIMERS does nothing (not even read the clock), so the runners can always call it.
+#
+# start_profiler() profiles the whole run on top: "cprofile" runs cProfile in the calling thread
+# (exact, but only that thread), "sample" looks at the stacks of every thread every few
+# milliseconds, which also covers the driver's event loop and the trace fetch pool.
+
+logger = logging.getLogger("workload")
+
+
+class PhaseTimers:
+    def __init__(self):
+        self._local = threading.local()
+        self._tables = []
+        self._lock = threading.Lock()
+
+    def now(self):
+        return time.perf_counter_ns()
+
+    def lap(self, phase, command, since):
+        # Record the time since `since` for this phase and op type; returns the current time
+        now = time.perf_counter_ns()
+        table = getattr(self._local, "table", None)
+        if table is None:
+            table = self._local.table = {}
+            with self._lock:
+                self._tables.append((threading.current_thread().name, table))
+        key = (phase, op_type(command))
+        elapsed = now - since
+        stats = table.get(key)
+        if stats is None:
+            table[key] = [1, elapsed, elapsed]
+        else:
+            stats[0] += 1
+            stats[1] += elapsed
+            stats[2] = max(stats[2], elapsed)
+        return now
+
+    def report(self):
+        # {"by_op": {op type: {phase: stats}}, "by_thread": {thread: {phase: stats}}}
+        by_op = {}
+        by_thread = {}
+        with self._lock:
+            tables = list(self._tables)
+        for thread_name, table in tables:
+            for (phase, operation), stats in list(table.items()):
+                _merge(by_op.setdefault(operation, {}), phase, stats)
+                _merge(by_thread.setdefault(thread_name, {}), phase, stats)
+        return {"by_op": _summarize(by_op), "by_thread": _summarize(by_thread)}
+
+
+class NoTimers:
+    def now(self):
+        return 0
+
+    def lap(self, phase, command, since):
+        return 0
+
+    def report(self):
+        return None
+
+
+NO_TIMERS = NoTimers()
+
+
+def _merge(phases, phase, stats):
+    total = phases.setdefault(phase, [0, 0, 0])
+    total[0] += stats[0]
+    total[1] += stats[1]
+    total[2] = max(total[2], stats[2])
+
+
+def _summarize(groups):
+    return {
+        name: {
+            phase: {"count": count, "total_ms": total_ns / 1e6, "mean_us": total_ns / count / 1e3, "max_us": max_ns / 1e3}
+            for phase, (count, total_ns, max_ns) in phases.items()
+        }
+        for name, phases in groups.items()
+    }
+
+
+def print_phase_report(report):
+    print(f"{'op':>8} {'phase':>16} {'count':>8} {'total ms':>10} {'mean us':>9} {'max us':>9}")
+    for operation, phases in sorted(report["by_op"].items()):
+        for phase, stats in sorted(phases.items(), key=lambda item: -item[1]["total_ms"]):
+            print(f"{operation:>8} {phase:>16} {stats['count']:>8} {stats['total_ms']:>10.1f} {stats['mean_us']:>9.1f} {stats['max_us']:>9.1f}")
+    print(f"{'thread':>30} {'phase':>16} {'total ms':>10}")
+    for thread_name, phases in sorted(report["by_thread"].items()):
+        for phase, stats in sorted(phases.items(), key=lambda item: -item[1]["total_ms"]):
+            print(f"{thread_name:>30} {phase:>16} {stats['total_ms']:>10.1f}")
+
+
+def save_phase_report(report, filename='phaseTimers.json'):
+    with open(filename, 'w') as file:
+        json.dump(report, file, indent=2)
+    print(f"Phase timers saved to {filename}")
+
+
+class SamplingProfiler:
+    # Counts, every interval, the function each thread is running ("self") and every function on
+    # its stack ("total"); a function's share of the samples estimates its share of the time
+    def __init__(self, interval_sec=0.005):
+        self.interval_sec = interval_sec
+        self.samples = 0
+        self.self_counts = collections.Counter()
+        self.total_counts = collections.Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._sample_loop, name="sampling-profiler", daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def _sample_loop(self):
+        own_id = threading.get_ident()
+        while not self._stop.wait(self.interval_sec):
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_id:
+                    continue
+                self.samples += 1
+                self.self_counts[_frame_name(frame)] += 1
+                seen = set()
+                while frame is not None:
+                    name = _frame_name(frame)
+                    if name not in seen:
+                        self.total_counts[name] += 1
+                        seen.add(name)
+                    frame = frame.f_back
+
+    def stop(self, filename='profile.txt', top=30):
+        self._stop.set()
+        self._thread.join()
+        lines = [f"{self.samples} thread samples every {self.interval_sec * 1000:.0f} ms", "",
+                 f"{'self %':>7} {'total %':>7}  function"]
+        for name, count in self.self_counts.most_common(top):
+            lines.append(f"{count * 100 / self.samples:>7.1f} {self.total_counts[name] * 100 / self.samples:>7.1f}  {name}")
+        with open(filename, 'w') as file:
+            file.write("\n".join(lines) + "\n")
+        print("\n".join(lines[:min(len(lines), 13)]))
+        print(f"Sampling profile saved to {filename}")
+
+
+def _frame_name(frame):
+    code = frame.f_code
+    return f"{code.co_name} ({code.co_filename}:{code.co_firstlineno})"
+
+
+class CProfiler:
+    # cProfile of the calling thread; the stats file opens with pstats or snakeviz
+    def __init__(self):
+        self.profile = cProfile.Profile()
+
+    def start(self):
+        self.profile.enable()
+
+    def stop(self, filename='profile.pstats', top=20):
+        self.profile.disable()
+        self.profile.dump_stats(filename)
+        pstats.Stats(self.profile).sort_stats("cumulative").print_stats(top)
+        print(f"cProfile stats saved to {filename}")
+
+
+def start_profiler(mode):
+    # mode: None, "cprofile" or "sample"; returns the running profiler (call stop() at the end) or None
+    if mode is None:
+        return None
+    profiler = CProfiler() if mode == "cprofile" else SamplingProfiler()
+    profiler.start()
+    return profiler
+
+
+def add_profiling_arguments(parser):
+    parser.add_argument("--phase-timers", action="store_true", help="time every client-side phase of the ops, per op type and thread")
+    parser.add_argument("--profile", choices=["cprofile", "sample"], default=None,
+                        help="profile the run: cProfile of the main thread, or a sampling profiler over all threads")
+    parser.add_argument("--log-level", choices=["debug", "info", "warning"], default="info",
+                        help="debug also prints the coordinator / memtable timestamps of every command")
+
+
+def setup_from_args(args):
+    # Configures the level of the workload logger only (the root logger, and so the driver's own
+    # logging, is left alone); returns the phase timers to use
+    logger.setLevel(args.log_level.upper())
+    if not logger.handlers:
+        handler = logging.StreamHandler()
+        handler.setFormatter(logging.Formatter("%(message)s"))
+        logger.addHandler(handler)
+        logger.propagate = False
+    return PhaseTimers() if args.phase_timers else NO_TIMERS
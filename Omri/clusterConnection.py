@@ -0,0 +1,157 @@
+import os
+import time
+
+try:
+    from cassandra import ConsistencyLevel
+except ImportError:
+    # Offline runs against fakeCassandra.py work without cassandra-driver
+    from fakeCassandra import ConsistencyLevel
+
+from asyncExecutor import AsyncWorkloadExecutor
+from traceSampling import NoTracing
+from workloadGenerator import STATEMENT_TEMPLATES
+
+# Cluster connection settings (clusterConfig.yaml) and the warm-up phase before the timed run.
+#
+# connect() builds the Cluster from the config file: contact points, credentials, protocol version,
+# the load-balancing policy (the routing mode: token_aware, dc_aware, round_robin or pinned to one
+# coordinator) and the consistency level of the default execution profile. Pool sizes
+# only apply to protocol v1/v2; from v3 on the driver multiplexes all requests to a host over one
+# connection, so "pre-sizing" means opening that connection to every host before the run.
+#
+# warm_up() runs before the timed phase:
+#   1. waits until every host that is up has an open connection
+#   2. prepares the workload's statement templates (the driver caches them per cluster)
+#   3. sends untraced rounds of writes, alternating plain and prepared, to a separate "warmup"
+#      partition until the median latency of two rounds in a row differs by less than the tolerance,
+#      then deletes the partition
+# so the first timed ops no longer pay for connection setup, schema metadata and cold caches.
+
+DEFAULT_CONFIG_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'clusterConfig.yaml')
+WARMUP_KEY = 'warmup'
+ROUTING_MODES = ("token_aware", "dc_aware", "round_robin", "pinned")
+
+
+def read_cluster_config(filename=DEFAULT_CONFIG_FILE):
+    # Returns the whole config ({"cluster": ..., "warmup": ...})
+    import yaml
+    with open(filename, 'r') as file:
+        return yaml.safe_load(file)
+
+
+def load_balancing_policy(settings):
+    # The driver is only needed for a real cluster
+    from cassandra.policies import DCAwareRoundRobinPolicy, RoundRobinPolicy, TokenAwarePolicy, WhiteListRoundRobinPolicy
+    local_dc = settings.get("local_dc")
+    policy = settings.get("load_balancing", "token_aware")
+    if policy == "round_robin":
+        return RoundRobinPolicy()
+    if policy == "pinned":
+        # Only this host is ever used as coordinator
+        if not settings.get("pinned_host"):
+            raise ValueError("The pinned routing mode needs a pinned_host")
+        return WhiteListRoundRobinPolicy([settings["pinned_host"]])
+    if policy == "dc_aware":
+        return DCAwareRoundRobinPolicy(local_dc=local_dc)
+    if policy == "token_aware":
+        return TokenAwarePolicy(DCAwareRoundRobinPolicy(local_dc=local_dc))
+    raise ValueError(f"Unknown load balancing policy: {policy}")
+
+
+def build_cluster(settings):
+    from cassandra.auth import PlainTextAuthProvider
+    from cassandra.cluster import Cluster, ExecutionProfile, EXEC_PROFILE_DEFAULT
+    from cassandra.policies import HostDistance
+    profile = ExecutionProfile(load_balancing_policy=load_balancing_policy(settings),
+                               consistency_level=ConsistencyLevel.name_to_value[settings.get("consistency", "ONE")],
+                               request_timeout=settings.get("request_timeout", 10))
+    options = {}
+    if settings.get("protocol_version"):
+        options["protocol_version"] = settings["protocol_version"]
+    cluster = Cluster(contact_points=settings["contact_points"], port=settings.get("port", 9042),
+                      auth_provider=PlainTextAuthProvider(username=settings["username"], password=settings["password"]),
+                      execution_profiles={EXEC_PROFILE_DEFAULT: profile},
+                      connect_timeout=settings.get("connect_timeout", 10), **options)
+
+    # Connection pools per host only exist in protocol v1/v2
+    if settings.get("protocol_version") in (1, 2):
+        cluster.set_core_connections_per_host(HostDistance.LOCAL, settings.get("core_connections_per_host", 2))
+        cluster.set_max_connections_per_host(HostDistance.LOCAL, settings.get("max_connections_per_host", 8))
+    return cluster
+
+
+def connect(config, fake=False):
+    # Returns (cluster, session)
+    settings = config["cluster"]
+    if fake:
+        # Offline run: simulated latencies and traces, no network
+        from fakeCassandra import FakeCluster
+        cluster = FakeCluster(seed=0, routing=settings.get("load_balancing"), pinned_node=settings.get("pinned_host"))
+    else:
+        cluster = build_cluster(settings)
+    session = cluster.connect(settings.get("keyspace", "simpletry"))
+    return cluster, session
+
+
+def wait_for_pools(session, timeout_sec=30):
+    # Until every host that is up has an open connection; returns the number of connected hosts
+    deadline = time.monotonic() + timeout_sec
+    while True:
+        state = session.get_pool_state()
+        hosts = [host for host in session.cluster.metadata.all_hosts() if host.is_up]
+        connected = [host for host in hosts if state.get(host, {}).get("open_count")]
+        if len(connected) == len(hosts) or time.monotonic() > deadline:
+            if len(connected) < len(hosts):
+                print(f"Warning: only {len(connected)} of {len(hosts)} hosts connected after {timeout_sec}s")
+            return len(connected)
+        time.sleep(0.1)
+
+
+def warmup_commands(num_ops, prepared):
+    # (commands, statements) writing to the warm-up partition; every second op is a bound prepared statement
+    commands = []
+    statements = []
+    for i in range(1, num_ops + 1):
+        params = [WARMUP_KEY, f'warmup{i}', f'{i}']
+        commands.append(STATEMENT_TEMPLATES[0]["literal"].format(*params))
+        statements.append(prepared[0].bind(params) if i % 2 == 0 else None)
+    return commands, statements
+
+
+def warm_up(session, config, max_in_flight=128):
+    # Returns the median latency (ms) of every warm-up round
+    settings = config.get("warmup", {})
+    hosts = wait_for_pools(session, settings.get("pool_timeout", 30))
+    prepared = [session.prepare(template["cql"]) for template in STATEMENT_TEMPLATES]
+
+    medians = []
+    for _ in range(settings.get("max_rounds", 5)):
+        commands, statements = warmup_commands(settings.get("ops", 200), prepared)
+        executor = AsyncWorkloadExecutor(session, max_in_flight=max_in_flight, sampler=NoTracing())
+        medians.append(executor.run(commands, statements)["latency_ms"]["p50"])
+        if len(medians) > 1 and abs(medians[-1] - medians[-2]) <= settings.get("tolerance", 0.1) * medians[-2]:
+            break
+    session.execute(f"DELETE FROM simpletry.person WHERE id = '{WARMUP_KEY}';")
+
+    rounds = " -> ".join(f"{median:.2f}" for median in medians)
+    print(f"Warm-up: {hosts} hosts connected, {len(prepared)} statements prepared, median latency per round (ms): {rounds}")
+    return medians
+
+
+def add_connection_arguments(parser, warmup=True):
+    parser.add_argument("--cluster-config", default=DEFAULT_CONFIG_FILE, help="cluster connection and warm-up settings (yaml)")
+    parser.add_argument("--routing", choices=ROUTING_MODES, default=None, help="routing mode, instead of load_balancing in the config")
+    parser.add_argument("--pin-host", default=None, help="coordinate every op on this host (implies --routing pinned)")
+    if warmup:
+        parser.add_argument("--no-warmup", action="store_true", help="start the timed phase right after connecting")
+
+
+def config_from_args(args):
+    # The config file with the command line overrides applied
+    config = read_cluster_config(args.cluster_config)
+    if args.pin_host:
+        config["cluster"]["pinned_host"] = args.pin_host
+        config["cluster"]["load_balancing"] = "pinned"
+    elif args.routing:
+        config["cluster"]["load_balancing"] = args.routing
+    return config
@@ -0,0 +1,167 @@
+import json
+import sys
+from datetime import datetime, timedelta
+
+import numpy as np
+
+from resultSink import iter_result_records
+from traceProcessing import elapsed_to_us
+
+# Compact columnar storage for trace results (result.npz).
+#
+# result.json repeats every query string several times and stores every timestamp as an ISO string
+# that the analysis scripts parse again row by row. The columnar file stores one row per traced op:
+#
+#   seq                  int64  sequence number of the command in workload_commands.txt (-1 if unknown)
+#   launched_at_us       int64  trace start, microseconds since the epoch
+#   coordinator_us       int64  coordinator timestamp (NULL_US if the trace had none)
+#   memtable_us          int64  memtable timestamp (NULL_US if the trace had none)
+#   completed_at_us      int64  client completion time (NULL_US if unknown)
+#
+# and the trace events of all ops flattened, with event_offsets[i]:event_offsets[i + 1] being the
+# events of row i:
+#
+#   event_datetime_us    int64  event time, microseconds since the epoch
+#   event_elapsed_us     int64  source_elapsed in microseconds
+#   event_description    int32  code into the "descriptions" dictionary
+#   event_source         int32  code into the "sources" dictionary
+#   event_thread         int32  code into the "threads" dictionary
+#
+# The query text itself is not stored: it is line seq of workload_commands.txt. For the same reason
+# "Parsing <query>" event descriptions are stored as just "Parsing".
+# Timestamps are the naive datetimes of the trace, converted without any time zone shift.
+
+NULL_US = np.iinfo(np.int64).min
+EPOCH = datetime(1970, 1, 1)
+
+
+def to_epoch_us(value):
+    # ISO string or datetime -> int microseconds since the epoch (NULL_US for None)
+    if value is None:
+        return NULL_US
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value)
+    return (value.replace(tzinfo=None) - EPOCH) // timedelta(microseconds=1)
+
+
+def from_epoch_us(value):
+    # int microseconds since the epoch -> datetime (None for NULL_US)
+    if value == NULL_US:
+        return None
+    return EPOCH + timedelta(microseconds=int(value))
+
+
+class _Dictionary:
+    # Assigns consecutive integer codes to strings
+    def __init__(self):
+        self.codes = {}
+
+    def encode(self, value):
+        value = "" if value is None else str(value)
+        code = self.codes.get(value)
+        if code is None:
+            code = self.codes[value] = len(self.codes)
+        return code
+
+    def values(self):
+        return np.array(list(self.codes), dtype=str)
+
+
+def _description_key(description):
+    return "Parsing" if description.startswith("Parsing ") else description
+
+
+def write_columnar(filename, records, commands):
+    # records: result records (query, launched_at, coordinator/memtable timestamps, details and
+    # optionally completed_at); commands: workload commands in sequence order
+    command_sequence = {command: i + 1 for i, command in enumerate(commands)}
+    descriptions, sources, threads = _Dictionary(), _Dictionary(), _Dictionary()
+
+    seq, launched_at, coordinator, memtable, completed_at = [], [], [], [], []
+    event_offsets = [0]
+    event_datetime, event_elapsed, event_description, event_source, event_thread = [], [], [], [], []
+
+    for record in records:
+        seq.append(record["seq"] if record.get("seq") is not None else command_sequence.get(record["query"], -1))
+        launched_at.append(to_epoch_us(record.get("launched_at")))
+        coordinator.append(to_epoch_us(record.get("coordinator_timestamp")))
+        memtable.append(to_epoch_us(record.get("memtable_timestamp")))
+        completed_at.append(to_epoch_us(record.get("completed_at")))
+        for event in record.get("details", []):
+            event_datetime.append(to_epoch_us(event["datetime"]))
+            event_elapsed.append(elapsed_to_us(event["source_elapsed"]))
+            event_description.append(descriptions.encode(_description_key(event["description"])))
+            event_source.append(sources.encode(event["source"]))
+            event_thread.append(threads.encode(event["thread_name"]))
+        event_offsets.append(len(event_datetime))
+
+    # Uncompressed, so np.load can read each column without decompressing the others
+    np.savez(
+        filename,
+        seq=np.array(seq, dtype=np.int64),
+        launched_at_us=np.array(launched_at, dtype=np.int64),
+        coordinator_us=np.array(coordinator, dtype=np.int64),
+        memtable_us=np.array(memtable, dtype=np.int64),
+        completed_at_us=np.array(completed_at, dtype=np.int64),
+        event_offsets=np.array(event_offsets, dtype=np.int64),
+        event_datetime_us=np.array(event_datetime, dtype=np.int64),
+        event_elapsed_us=np.array(event_elapsed, dtype=np.int64),
+        event_description=np.array(event_description, dtype=np.int32),
+        event_source=np.array(event_source, dtype=np.int32),
+        event_thread=np.array(event_thread, dtype=np.int32),
+        descriptions=descriptions.values(),
+        sources=sources.values(),
+        threads=threads.values()
+    )
+    return len(seq)
+
+
+def load_columnar(filename):
+    # Returns {column name: numpy array}; no pickled objects are involved
+    with np.load(filename, allow_pickle=False) as columns:
+        return {name: columns[name] for name in columns.files}
+
+
+def iter_records(input_file):
+    # Result records from result.json (joined with queries_and_times) or from a streamed result.jsonl
+    if input_file.endswith('.jsonl'):
+        yield from iter_result_records(input_file)
+        return
+    with open(input_file, 'r') as file:
+        data = json.load(file)
+    completed = {}
+    for query, completed_at in data["queries_and_times"]:
+        completed.setdefault(query, completed_at)
+    for trace in data["traces"]:
+        trace["completed_at"] = completed.get(trace["query"])
+        yield trace
+
+
+def convert_results(input_file, commands_file, output_file):
+    with open(commands_file, 'r') as file:
+        commands = [command.strip() for command in file]
+    rows = write_columnar(output_file, iter_records(input_file), commands)
+    print(f"Wrote {rows} rows to {output_file}")
+
+
+def columnar_trace_table(columns, commands):
+    # The ResultTraceTable table ([sequence number, command, memtable datetime, coordinator datetime],
+    # ordered by sequence number) for the rows that reached the memtable or the coordinator
+    seq = columns["seq"]
+    memtable = columns["memtable_us"]
+    coordinator = columns["coordinator_us"]
+    # First row of every sequence number (np.unique returns them ordered by sequence number)
+    _, first = np.unique(seq, return_index=True)
+    first = first[(seq[first] > 0) & ((memtable[first] != NULL_US) | (coordinator[first] != NULL_US))]
+    table = []
+    for i in first:
+        table.append([int(seq[i]), commands[seq[i] - 1], from_epoch_us(memtable[i]), from_epoch_us(coordinator[i])])
+    return table
+
+
+if __name__ == "__main__":
+    # Usage: python columnarResults.py [result.json|result.jsonl] [workload_commands.txt] [result.npz]
+    input_file = sys.argv[1] if len(sys.argv) > 1 else 'result.json'
+    commands_file = sys.argv[2] if len(sys.argv) > 2 else 'workload_commands.txt'
+    output_file = sys.argv[3] if len(sys.argv) > 3 else 'result.npz'
+    convert_results(input_file, commands_file, output_file)
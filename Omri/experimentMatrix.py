@@ -0,0 +1,167 @@
+import argparse
+import datetime
+import importlib.util
+import itertools
+import os
+import time
+
+try:
+    from cassandra import ConsistencyLevel
+except ImportError:
+    # Offline runs against fakeCassandra.py work without cassandra-driver
+    from fakeCassandra import ConsistencyLevel
+
+from asyncExecutor import AsyncWorkloadExecutor
+from workloadGenerator import iter_operations, render_operation, using_timestamp
+from resultsStore import open_store, add_run, run_query, print_rows, QUERIES
+from clusterConnection import config_from_args, connect, warm_up, add_connection_arguments
+
+# Runs the traced workload once for every combination of the swept parameters and stores every run
+# in the SQLite store (resultsStore.py), instead of copying result directories by hand.
+#
+# Swept parameters (comma separated lists):
+#   --max-in-flight      outstanding writes of the async executor (the old thread count)
+#   --consistency        consistency level of the writes
+#   --client-timestamps  off / on: send every write with USING TIMESTAMP from the client clock
+#   --mix                insert:update:delete weights of the generated workload
+#   --stress-rate        background cassandra-stress throttle in ops/sec (0: no background load),
+#                        started with Gil's config and run-cassandra-stress.py
+# Every combination runs --repeat times with the same generated workload (--ops, --partitions,
+# --distribution, --workload-seed), so runs differ only in the swept parameters.
+#
+# Usage: python experimentMatrix.py --max-in-flight 1,16,128 --client-timestamps off,on --ops 5000
+#        python resultsStore.py --query conflicts-vs-concurrency
+
+GIL_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'Gil')
+
+
+def split_list(value, convert=str):
+    return [convert(item) for item in value.split(",") if item != ""]
+
+
+def on_off(value):
+    if value not in ("on", "off"):
+        raise argparse.ArgumentTypeError(f"expected on or off, got '{value}'")
+    return value == "on"
+
+
+def matrix(args):
+    # Every combination of the swept parameters, as dicts
+    names = ["max_in_flight", "consistency", "client_timestamps", "mix", "stress_rate"]
+    values = [split_list(args.max_in_flight, int), split_list(args.consistency), split_list(args.client_timestamps, on_off),
+              split_list(args.mix), split_list(args.stress_rate, float)]
+    for combination in itertools.product(*values):
+        yield dict(zip(names, combination))
+
+
+def client_timestamped(commands):
+    # Strictly increasing client write timestamps, taken when the command is sent
+    last = 0
+    for command in commands:
+        last = max(last + 1, time.time_ns() // 1000)
+        yield using_timestamp(command, last)
+
+
+def load_stress_runner():
+    # Gil's runner (and through it the command builder); the file name has dashes, so it is loaded by path
+    spec = importlib.util.spec_from_file_location("run_cassandra_stress", os.path.join(GIL_DIR, "run-cassandra-stress.py"))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def start_stress(stress_config, rate, log_file, first_sample_timeout=120):
+    # Background load at the given throttle; returns the StressMonitor (None when rate is 0)
+    if not rate:
+        return None
+    runner = load_stress_runner()
+    builder = runner.load_build_command_module()
+    config = builder.read_config(stress_config)
+    config["rate"] = dict(config.get("rate") or {}, throttle=f"{int(rate)}/s")
+    monitor = runner.launch_stress(builder.build_command(config), log_file)
+    if not monitor.first_sample.wait(first_sample_timeout):
+        print("Warning: cassandra-stress reported no interval yet, starting the run anyway")
+    return monitor
+
+
+def stop_stress(monitor):
+    if monitor is None:
+        return
+    monitor.process.terminate()
+    monitor.wait()
+
+
+def run_once(session, params, args):
+    # One run of the generated workload with the given parameters; returns (report, traces)
+    operations = iter_operations(args.ops, args.partitions, args.distribution, args.zipf_exponent, params["mix"], args.workload_seed)
+    commands = (render_operation(template_index, op_params) for template_index, op_params, _ in operations)
+    if params["client_timestamps"]:
+        commands = client_timestamped(commands)
+
+    executor = AsyncWorkloadExecutor(session, max_in_flight=params["max_in_flight"], trace_workers=args.trace_workers,
+                                     consistency_level=ConsistencyLevel.name_to_value[params["consistency"]])
+    report = executor.run(commands)
+    report["errors"] = executor.errors
+    return report, executor.traces_res
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run the traced workload for every combination of parameters and store the runs")
+    parser.add_argument("--max-in-flight", default="128", help="comma separated outstanding write limits")
+    parser.add_argument("--consistency", default="ONE", help="comma separated consistency levels")
+    parser.add_argument("--client-timestamps", default="off", help="off, on or off,on: writes with USING TIMESTAMP from the client")
+    parser.add_argument("--mix", default="60:30:10", help="comma separated insert:update:delete weights")
+    parser.add_argument("--stress-rate", default="0", help="comma separated background cassandra-stress rates in ops/sec (0: none)")
+    parser.add_argument("--repeat", type=int, default=1, help="runs per combination")
+    parser.add_argument("--ops", type=int, default=2000, help="generated ops per run")
+    parser.add_argument("--partitions", type=int, default=1)
+    parser.add_argument("--distribution", choices=["uniform", "zipfian"], default="uniform")
+    parser.add_argument("--zipf-exponent", type=float, default=1.0)
+    parser.add_argument("--workload-seed", type=int, default=0)
+    parser.add_argument("--trace-workers", type=int, default=4)
+    parser.add_argument("--stress-config", default=os.path.join(GIL_DIR, "cassandra-stress-config.yaml"))
+    parser.add_argument("--pause", type=float, default=0, help="seconds to wait between runs")
+    parser.add_argument("--label", default=None, help="name stored with every run of this matrix")
+    parser.add_argument("--db", default="experiments.db")
+    parser.add_argument("--fake", action="store_true", help="run against an in-process fake cluster (fakeCassandra.py) instead of the real one")
+    add_connection_arguments(parser)
+    args = parser.parse_args()
+
+    # Connect to the Cassandra cluster from the cluster config file (or to the fake cluster)
+    config = config_from_args(args)
+    cluster, session = connect(config, args.fake)
+    if not args.no_warmup:
+        warm_up(session, config)
+    connection = open_store(args.db)
+
+    combinations = list(matrix(args))
+    print(f"{len(combinations)} combinations x {args.repeat} runs of {args.ops} ops")
+    for params in combinations:
+        for repeat in range(args.repeat):
+            if args.fake and params["stress_rate"]:
+                print("Warning: no background stress against the fake cluster")
+                stress = None
+            else:
+                stress = start_stress(args.stress_config, params["stress_rate"], f"stress_output_{int(params['stress_rate'])}.log")
+
+            run_params = dict(params, repeat=repeat, ops=args.ops, partitions=args.partitions, distribution=args.distribution,
+                              zipf_exponent=args.zipf_exponent, workload_seed=args.workload_seed, fake=args.fake,
+                              routing=config["cluster"].get("load_balancing"),
+                              started_at=datetime.datetime.now().isoformat())
+            try:
+                report, traces = run_once(session, run_params, args)
+            finally:
+                stop_stress(stress)
+
+            run_id = add_run(connection, run_params, report, traces, args.label)
+            print(f"Run {run_id}: max_in_flight={params['max_in_flight']} consistency={params['consistency']}"
+                  f" client_timestamps={params['client_timestamps']} mix={params['mix']} stress_rate={params['stress_rate']}:"
+                  f" {report['ops_per_sec']:.0f} ops/sec, p99 {report['latency_ms']['p99']:.2f} ms")
+            time.sleep(args.pause)
+
+    # Compare the runs of this matrix
+    print_rows(*run_query(connection, QUERIES["conflicts-vs-concurrency"].format(last=len(combinations) * args.repeat)))
+
+    connection.close()
+    session.shutdown()
+    cluster.shutdown()
@@ -0,0 +1,540 @@
+import datetime
+import heapq
+import itertools
+import math
+import random
+import re
+import threading
+import time
+import uuid
+import zlib
+from collections import namedtuple
+
+# In-process stand-in for the Cassandra cluster, for running and benchmarking the pipeline offline.
+#
+# FakeCluster(...).connect() returns a session with the subset of the driver API the runners use:
+# execute / execute_async (response futures with add_callbacks, result, get_query_trace and
+# get_query_trace_ids), prepare / bind, get_pool_state / metadata.all_hosts() (every node is up
+# with one open connection), and the system_traces.sessions / events queries of
+# traceHarvester.py. Every op gets a trace that looks like the real ones (Parsing, Preparing
+# statement, Determining replicas for mutation, ... Adding to person memtable), built from a
+# simple timing model:
+#   - client -> coordinator and back: the "network" latency distribution
+#   - between coordinator and replica (when they differ): the "internode" latency distribution
+#   - applying the mutation on the replica: the "service" latency distribution, drawn once per
+#     statement of a batch (BEGIN ... BATCH), which saves only the round trips
+#   - the coordinator is picked like the driver's load-balancing policy: routing="round_robin" cycles
+#     through the nodes, "token_aware" sends every op to its first replica, "pinned" always to
+#     pinned_node (the first node by default)
+#   - with reorder_probability an op is held back for an extra "reorder" delay before it reaches
+#     its coordinator, so later ops overtake it
+#   - every node's trace timestamps are shifted by its clock skew and cut to
+#     timestamp_resolution_us (the real traces have millisecond resolution)
+#   - writes are applied to an in-memory simpletry.person (FakeTable) with last-write-wins on the
+#     coordinator's write timestamp (or USING TIMESTAMP), so the final state can be read back with
+#     SELECT ... WHERE id = ?
+# Completions are delivered on one event loop thread, like the driver's.
+#
+# Latency distributions are given as tuples, in milliseconds:
+#   ("constant", value), ("uniform", low, high), ("exponential", mean), ("lognormal", median, sigma)
+
+SessionRow = namedtuple("SessionRow", "session_id client command coordinator duration parameters request started_at")
+EventRow = namedtuple("EventRow", "session_id event_id activity source source_elapsed thread")
+PersonRow = namedtuple("PersonRow", "id name name_writetime tots")
+
+DEFAULT_NODES = ("127.0.0.1", "127.0.0.2", "127.0.0.3", "127.0.0.4")
+CLIENT_ADDRESS = "127.0.0.100"
+UUID_EPOCH = datetime.datetime(1582, 10, 15)
+EPOCH = datetime.datetime(1970, 1, 1)
+
+INSERT_STATEMENT = re.compile(r"VALUES \('([^']*)', '([^']*)', \{'([^']*)':toTimestamp\(now\(\)\)\}\)")
+UPDATE_STATEMENT = re.compile(r"SET name = '([^']*)', toTS\['([^']*)'\] = toTimestamp\(now\(\)\) WHERE id = '([^']*)'")
+DELETE_ENTRY_STATEMENT = re.compile(r"DELETE toTS\['([^']*)'\] FROM .* WHERE id = '([^']*)'")
+DELETE_ROW_STATEMENT = re.compile(r"DELETE FROM .* WHERE id = '([^']*)'")
+USING_TIMESTAMP = re.compile(r"USING TIMESTAMP (\d+)")
+
+
+def make_distribution(spec, rng):
+    # Returns a function that draws one latency in milliseconds
+    kind = spec[0]
+    if kind == "constant":
+        return lambda: spec[1]
+    if kind == "uniform":
+        return lambda: rng.uniform(spec[1], spec[2])
+    if kind == "exponential":
+        return lambda: rng.expovariate(1 / spec[1])
+    if kind == "lognormal":
+        return lambda: rng.lognormvariate(math.log(spec[1]), spec[2])
+    raise ValueError(f"Unknown latency distribution: {spec}")
+
+
+def time_uuid(when, sequence):
+    # Version 1 uuid for a naive UTC datetime, like the event ids in system_traces.events
+    # (sequence goes into the node field, so events with the same timestamp get different ids)
+    timestamp = (when - UUID_EPOCH) // datetime.timedelta(microseconds=1) * 10
+    return uuid.UUID(fields=(timestamp & 0xffffffff, timestamp >> 32 & 0xffff, timestamp >> 48 & 0x0fff | 0x1000,
+                             0x80, 0, sequence & 0xffffffffffff))
+
+
+class FakeTraceEvent:
+    def __init__(self, description, when, source, source_elapsed, thread_name):
+        self.description = description
+        self.datetime = when
+        self.source = source
+        self.source_elapsed = source_elapsed
+        self.thread_name = thread_name
+
+
+class FakeQueryTrace:
+    # Same attributes as cassandra.query.QueryTrace
+    def __init__(self, trace_id, request_type, coordinator, started_at, parameters, duration, events):
+        self.trace_id = trace_id
+        self.request_type = request_type
+        self.client = CLIENT_ADDRESS
+        self.coordinator = coordinator
+        self.started_at = started_at
+        self.parameters = parameters
+        self.duration = duration
+        self.events = events
+
+
+# Stand-ins for the driver classes the runners import, used when cassandra-driver is not installed,
+# so --fake runs and benchPipeline.py work offline. They keep only what the fake cluster reads.
+
+
+class ConsistencyLevel:
+    ANY = 0
+    ONE = 1
+    TWO = 2
+    THREE = 3
+    QUORUM = 4
+    ALL = 5
+    LOCAL_QUORUM = 6
+    EACH_QUORUM = 7
+    SERIAL = 8
+    LOCAL_SERIAL = 9
+    LOCAL_ONE = 10
+
+
+ConsistencyLevel.name_to_value = {name: value for name, value in vars(ConsistencyLevel).items() if name.isupper()}
+ConsistencyLevel.value_to_name = {value: name for name, value in ConsistencyLevel.name_to_value.items()}
+
+
+class SimpleStatement:
+    def __init__(self, query_string, consistency_level=None, fetch_size=None):
+        self.query_string = query_string
+        self.consistency_level = consistency_level
+        self.fetch_size = fetch_size
+
+
+class BatchType:
+    LOGGED = "LOGGED"
+    UNLOGGED = "UNLOGGED"
+    COUNTER = "COUNTER"
+
+
+class BatchStatement:
+    def __init__(self, batch_type=BatchType.LOGGED, consistency_level=None):
+        self.batch_type = batch_type
+        self.consistency_level = consistency_level
+        self._statements_and_parameters = []
+
+    def add(self, statement, parameters=None):
+        self._statements_and_parameters.append((statement, parameters))
+
+
+class TraceEvent(FakeTraceEvent):
+    # Same arguments as cassandra.query.TraceEvent: the time comes from the event's time uuid,
+    # source_elapsed is in microseconds
+    def __init__(self, description, timeuuid, source, source_elapsed, thread_name):
+        when = UUID_EPOCH + datetime.timedelta(microseconds=timeuuid.time // 10)
+        elapsed = datetime.timedelta(microseconds=source_elapsed) if source_elapsed is not None else None
+        super().__init__(description, when, source, elapsed, thread_name)
+
+
+class FakeTable:
+    # simpletry.person as cells of (value, write timestamp); value None is a tombstone
+    def __init__(self):
+        self.rows = {}
+
+    def apply(self, query_string, write_us, now_value):
+        # Applies a write (or every statement of a batch) with the coordinator's timestamp
+        text = query_string.strip()
+        if text.upper().startswith("BEGIN"):
+            statements = text[text.upper().index("BATCH") + len("BATCH"):text.upper().rindex("APPLY BATCH")].split(";")
+        else:
+            statements = [text]
+        for statement in statements:
+            if statement.strip():
+                self._apply_statement(statement.strip(), write_us, now_value)
+
+    def _apply_statement(self, statement, write_us, now_value):
+        explicit = USING_TIMESTAMP.search(statement)
+        timestamp = int(explicit.group(1)) if explicit else write_us
+        if statement.startswith("INSERT"):
+            match = INSERT_STATEMENT.search(statement)
+            if match:
+                row = self._row(match.group(1))
+                # Inserting a whole map replaces it: the older entries are shadowed
+                row["map_deleted_at"] = max(row["map_deleted_at"], timestamp - 1)
+                _write_cell(row, "name", match.group(2), timestamp)
+                _write_cell(row["tots"], match.group(3), now_value, timestamp)
+        elif statement.startswith("UPDATE"):
+            match = UPDATE_STATEMENT.search(statement)
+            if match:
+                row = self._row(match.group(3))
+                _write_cell(row, "name", match.group(1), timestamp)
+                _write_cell(row["tots"], match.group(2), now_value, timestamp)
+        elif statement.startswith("DELETE"):
+            match = DELETE_ENTRY_STATEMENT.search(statement)
+            if match:
+                _write_cell(self._row(match.group(2))["tots"], match.group(1), None, timestamp)
+                return
+            match = DELETE_ROW_STATEMENT.search(statement)
+            if match:
+                row = self._row(match.group(1))
+                row["deleted_at"] = max(row["deleted_at"], timestamp)
+
+    def _row(self, key):
+        if key not in self.rows:
+            self.rows[key] = {"deleted_at": -1, "map_deleted_at": -1, "name": None, "tots": {}}
+        return self.rows[key]
+
+    def read(self, key):
+        # [PersonRow] with the live cells, [] when nothing of the partition is live
+        row = self.rows.get(key)
+        if row is None:
+            return []
+        name = row["name"]
+        if name is not None and (name[0] is None or name[1] <= row["deleted_at"]):
+            name = None
+        shadowed_at = max(row["deleted_at"], row["map_deleted_at"])
+        tots = {entry: cell[0] for entry, cell in row["tots"].items() if cell[0] is not None and cell[1] > shadowed_at}
+        if name is None and not tots:
+            return []
+        return [PersonRow(key, name[0] if name else None, name[1] if name else None, tots or None)]
+
+
+def _write_cell(cells, column, value, timestamp):
+    # Last write wins; on equal timestamps a tombstone wins, then the larger value
+    old = cells.get(column)
+    if old is None or timestamp > old[1] or (timestamp == old[1] and (value is None or (old[0] is not None and value > old[0]))):
+        cells[column] = (value, timestamp)
+
+
+class FakeHost:
+    def __init__(self, address):
+        self.address = address
+        self.is_up = True
+
+    def __repr__(self):
+        return self.address
+
+
+class FakeMetadata:
+    def __init__(self, nodes):
+        self.hosts = [FakeHost(node) for node in nodes]
+
+    def all_hosts(self):
+        return list(self.hosts)
+
+
+class FakePreparedStatement:
+    def __init__(self, query_string):
+        self.query_string = query_string
+        self.consistency_level = None
+
+    def bind(self, values):
+        return FakeBoundStatement(self, values)
+
+
+class FakeBoundStatement:
+    def __init__(self, prepared_statement, values):
+        self.prepared_statement = prepared_statement
+        self.query_string = prepared_statement.query_string
+        self.values = list(values)
+        self.fetch_size = None
+
+
+class FakeResultSet(list):
+    def __init__(self, rows, response_future):
+        super().__init__(rows)
+        self.response_future = response_future
+
+    def get_query_trace(self, max_wait_sec=None):
+        return self.response_future.get_query_trace(max_wait_sec)
+
+
+class FakeResponseFuture:
+    def __init__(self, rows, trace):
+        self._rows = rows
+        self._trace = trace
+        # Every result fits in one page
+        self.has_more_pages = False
+        self._done = threading.Event()
+        self._lock = threading.Lock()
+        self._callbacks = []
+
+    def add_callbacks(self, callback, errback, callback_args=(), callback_kwargs=None, errback_args=(), errback_kwargs=None):
+        # Like the driver: runs right away on the caller's thread if the op has already finished
+        with self._lock:
+            if not self._done.is_set():
+                self._callbacks.append((callback, callback_args, callback_kwargs or {}))
+                return
+        callback(self._rows, *callback_args, **(callback_kwargs or {}))
+
+    def _complete(self):
+        with self._lock:
+            self._done.set()
+            callbacks, self._callbacks = self._callbacks, []
+        for callback, args, kwargs in callbacks:
+            callback(self._rows, *args, **kwargs)
+
+    def result(self):
+        self._done.wait()
+        return FakeResultSet(self._rows, self)
+
+    def get_query_trace_ids(self):
+        return [self._trace.trace_id] if self._trace is not None else []
+
+    def get_query_trace(self, max_wait_sec=None):
+        self._done.wait(max_wait_sec)
+        return self._trace
+
+
+class _EventLoop:
+    # Runs every scheduled completion at its due time on a single thread
+    def __init__(self):
+        self._queue = []
+        self._counter = itertools.count()
+        self._condition = threading.Condition()
+        self._running = True
+        self._thread = threading.Thread(target=self._loop, name="fake-cassandra-event-loop", daemon=True)
+        self._thread.start()
+
+    def schedule(self, due, function):
+        with self._condition:
+            heapq.heappush(self._queue, (due, next(self._counter), function))
+            self._condition.notify()
+
+    def _loop(self):
+        while True:
+            with self._condition:
+                while self._running and (not self._queue or self._queue[0][0] > time.perf_counter()):
+                    timeout = self._queue[0][0] - time.perf_counter() if self._queue else None
+                    self._condition.wait(timeout)
+                if not self._running:
+                    return
+                _, _, function = heapq.heappop(self._queue)
+            function()
+
+    def stop(self):
+        with self._condition:
+            self._running = False
+            self._condition.notify()
+        self._thread.join()
+
+
+class FakeCluster:
+    def __init__(self, contact_points=DEFAULT_NODES, network=("lognormal", 0.2, 0.3), internode=("lognormal", 0.1, 0.3),
+                 service=("lognormal", 0.05, 0.5), reorder_probability=0.0, reorder=("exponential", 2.0),
+                 clock_skew_ms=None, replication_factor=1, timestamp_resolution_us=1000, routing="round_robin",
+                 pinned_node=None, seed=None, **kwargs):
+        # kwargs: the real Cluster's other arguments (auth_provider, ...), accepted and ignored
+        self.nodes = list(contact_points)
+        self.routing = routing
+        self.pinned_node = pinned_node if pinned_node in self.nodes else self.nodes[0]
+        self.clock_skew_ms = dict(clock_skew_ms or {})
+        self.replication_factor = min(replication_factor, len(self.nodes))
+        self.metadata = FakeMetadata(self.nodes)
+        self.reorder_probability = reorder_probability
+        self.timestamp_resolution_us = timestamp_resolution_us
+        self._rng = random.Random(seed)
+        self._network = make_distribution(network, self._rng)
+        self._internode = make_distribution(internode, self._rng)
+        self._service = make_distribution(service, self._rng)
+        self._reorder = make_distribution(reorder, self._rng)
+        self._lock = threading.Lock()
+        self._next_coordinator = itertools.count()
+        self._event_sequence = itertools.count()
+        self._loop = _EventLoop()
+        self.table = FakeTable()
+        self._last_write_us = {}
+
+        # Trace timestamps follow this machine's UTC clock, measured with perf_counter from here on
+        self._base_datetime = datetime.datetime.now(datetime.timezone.utc).replace(tzinfo=None)
+        self._base_perf = time.perf_counter()
+
+        # In-memory system_traces: {session_id: SessionRow} and {session_id: [EventRow]}
+        self.trace_sessions = {}
+        self.trace_events = {}
+
+    def connect(self, keyspace=None):
+        return FakeSession(self, keyspace)
+
+    def shutdown(self):
+        self._loop.stop()
+
+    def _node_time(self, node, perf_time):
+        # What node's clock reads at perf_time, cut to the trace timestamp resolution
+        when = self._base_datetime + datetime.timedelta(seconds=perf_time - self._base_perf,
+                                                        milliseconds=self.clock_skew_ms.get(node, 0))
+        micros = when.microsecond - when.microsecond % self.timestamp_resolution_us
+        return when.replace(microsecond=micros)
+
+    def _write_timestamp(self, node, perf_time):
+        # Microseconds since the epoch on node's clock, strictly increasing per coordinator like Cassandra's
+        when = self._base_datetime + datetime.timedelta(seconds=perf_time - self._base_perf,
+                                                        milliseconds=self.clock_skew_ms.get(node, 0))
+        write_us = max((when - EPOCH) // datetime.timedelta(microseconds=1), self._last_write_us.get(node, 0) + 1)
+        self._last_write_us[node] = write_us
+        return write_us
+
+    def _replica(self, key):
+        # Partition placement: the same key always goes to the same node
+        return self.nodes[zlib.crc32(key.encode()) % len(self.nodes)] if key is not None else self.nodes[0]
+
+    def _run(self, query_string, key, traced, values):
+        # Builds the op's trace and returns (completion perf_counter time, trace or None)
+        prepared = values is not None
+        with self._lock:
+            sent_at = time.perf_counter()
+            arrival = sent_at + self._network() / 1000
+            if self.reorder_probability and self._rng.random() < self.reorder_probability:
+                arrival += self._reorder() / 1000
+            first_replica = self.nodes.index(self._replica(key))
+            replicas = [self.nodes[(first_replica + i) % len(self.nodes)] for i in range(self.replication_factor)]
+            if self.routing == "token_aware":
+                coordinator = replicas[0]
+            elif self.routing == "pinned":
+                coordinator = self.pinned_node
+            else:
+                coordinator = self.nodes[next(self._next_coordinator) % len(self.nodes)]
+            statements = query_string.count(";") - 1 if query_string.lstrip().upper().startswith("BEGIN") else 1
+            service = [sum(self._service() for _ in range(max(1, statements))) / 1000 for _ in replicas]
+            hops = [(self._internode() / 1000, self._internode() / 1000) for _ in replicas]
+            response = self._network() / 1000
+            if not query_string.lstrip().upper().startswith("SELECT"):
+                routed_at = arrival + 0.00026
+                self.table.apply(_render(query_string, values), self._write_timestamp(coordinator, routed_at),
+                                 self._node_time(coordinator, routed_at))
+
+        events = []
+
+        def event(node, perf_time, elapsed_from, description, thread_name):
+            events.append((node, perf_time, int((perf_time - elapsed_from) * 1000000), description, thread_name))
+
+        is_mutation = not query_string.lstrip().upper().startswith("SELECT")
+        if not prepared:
+            event(coordinator, arrival + 0.00004, arrival, f"Parsing {query_string}", "Native-Transport-Requests-1")
+            event(coordinator, arrival + 0.0001, arrival, "Preparing statement", "Native-Transport-Requests-1")
+        routed = arrival + 0.00026
+        if is_mutation:
+            event(coordinator, routed, arrival, "Determining replicas for mutation", "Native-Transport-Requests-1")
+        answers = []
+        for replica, apply_time, (to_replica, from_replica) in zip(replicas, service, hops):
+            if replica == coordinator:
+                start = routed
+                applied = start + apply_time
+                event(replica, start + 0.00002, arrival, "Appending to commitlog", "MutationStage-1")
+                event(replica, applied, arrival, "Adding to person memtable", "MutationStage-1")
+                answered = applied
+            else:
+                event(coordinator, routed + 0.00001, arrival, f"Sending MUTATION message to /{replica}", "MessagingService-Outgoing-1")
+                start = routed + to_replica
+                applied = start + apply_time
+                event(replica, start, start, f"MUTATION message received from /{coordinator}", "MessagingService-Incoming-1")
+                event(replica, start + 0.00002, start, "Appending to commitlog", "MutationStage-1")
+                event(replica, applied, start, "Adding to person memtable", "MutationStage-1")
+                event(replica, applied + 0.00001, start, f"Enqueuing response to /{coordinator}", "MutationStage-1")
+                answered = applied + 0.00001 + from_replica
+                event(coordinator, answered, arrival, f"REQUEST_RESPONSE message received from /{replica}", "MessagingService-Incoming-1")
+                event(coordinator, answered + 0.00001, arrival, f"Processing response from /{replica}", "RequestResponseStage-1")
+            answers.append(answered)
+        # Consistency level ONE: the op completes with the first replica's answer
+        done = min(answers)
+        completed = done + response
+
+        if not traced:
+            return completed, None
+
+        trace_id = uuid.uuid4()
+        events.sort(key=lambda item: item[1])
+        trace_events = []
+        event_rows = []
+        for node, perf_time, elapsed_us, description, thread_name in events:
+            when = self._node_time(node, perf_time)
+            trace_events.append(FakeTraceEvent(description, when, node, datetime.timedelta(microseconds=elapsed_us), thread_name))
+            event_rows.append(EventRow(trace_id, time_uuid(when, next(self._event_sequence)), description, node, elapsed_us, thread_name))
+        started_at = self._node_time(coordinator, arrival)
+        duration = datetime.timedelta(microseconds=int((done - arrival) * 1000000))
+        request_type = "Execute CQL3 prepared query" if prepared else "Execute CQL3 query"
+        parameters = {"consistency_level": "ONE", "page_size": "5000", "query": query_string}
+        trace = FakeQueryTrace(trace_id, request_type, coordinator, started_at, parameters, duration, trace_events)
+
+        with self._lock:
+            self.trace_sessions[trace_id] = SessionRow(trace_id, CLIENT_ADDRESS, "QUERY", coordinator,
+                                                       duration // datetime.timedelta(microseconds=1), parameters, request_type, started_at)
+            self.trace_events[trace_id] = event_rows
+        return completed, trace
+
+
+def _render(query_string, values):
+    # A bound statement as the equivalent plain statement
+    if not values:
+        return query_string
+    values = iter(values)
+    return re.sub(r"\?", lambda _: "'" + str(next(values)) + "'", query_string)
+
+
+def _partition_key(query_string, values):
+    # The person id: a literal in plain statements, a bound value in prepared ones
+    if values is None:
+        match = re.search(r"(?:id = |VALUES \()'([^']*)'", query_string)
+        return match.group(1) if match else None
+    if not values:
+        return None
+    return values[-1] if "WHERE id = ?" in query_string else values[0]
+
+
+class FakeSession:
+    def __init__(self, cluster, keyspace=None):
+        self.cluster = cluster
+        self.keyspace = keyspace
+        self.default_consistency_level = None
+
+    def prepare(self, query):
+        return FakePreparedStatement(query)
+
+    def get_pool_state(self):
+        return {host: {"shutdown": False, "open_count": 1, "in_flights": [0]} for host in self.cluster.metadata.all_hosts()}
+
+    def execute(self, query, parameters=None, trace=False, **kwargs):
+        return self.execute_async(query, parameters, trace, **kwargs).result()
+
+    def execute_async(self, query, parameters=None, trace=False, **kwargs):
+        query_string = getattr(query, "query_string", query)
+        values = getattr(query, "values", None)
+        if hasattr(query, "_statements_and_parameters"):
+            # A BatchStatement: only its number of statements matters to the timing model
+            query_string = "BEGIN BATCH " + "".join("/* statement */; " for _ in query._statements_and_parameters) + "APPLY BATCH;"
+
+        # system_traces reads of traceHarvester.py are answered from the recorded traces
+        if "FROM system_traces.sessions" in query_string:
+            future = FakeResponseFuture([self.cluster.trace_sessions[i] for i in values[0] if i in self.cluster.trace_sessions], None)
+            future._complete()
+            return future
+        if "FROM system_traces.events" in query_string:
+            future = FakeResponseFuture([row for i in values[0] for row in self.cluster.trace_events.get(i, [])], None)
+            future._complete()
+            return future
+
+        key = _partition_key(query_string, values)
+        completed, query_trace = self.cluster._run(query_string, key, trace, values)
+        rows = self.cluster.table.read(key) if "FROM simpletry.person" in query_string and query_string.lstrip().upper().startswith("SELECT") else []
+        future = FakeResponseFuture(rows, query_trace)
+        self.cluster._loop.schedule(completed, future._complete)
+        return future
+
+    def shutdown(self):
+        pass
@@ -0,0 +1,279 @@
+import argparse
+import json
+import os
+import queue
+import sys
+import zlib
+
+try:
+    from cassandra import ConsistencyLevel
+except ImportError:
+    # Offline runs against fakeCassandra.py work without cassandra-driver
+    from fakeCassandra import ConsistencyLevel
+
+from resultsStore import to_epoch_us
+from resultSink import iter_result_records
+from clusterConnection import config_from_args, connect, add_connection_arguments
+
+# The inversion counting lives with the analysis scripts
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'Aviv'))
+from inversions import count_inversions
+
+# Post-run check of what actually landed in simpletry.person.
+#
+# Every partition the workload touched (workload_metadata.jsonl) is read back with
+#     SELECT id, name, WRITETIME(name), toTS FROM simpletry.person WHERE id = ?
+# as concurrent async reads (at most --concurrency partitions at once, every read paged with
+# --fetch-size), and the server's last-write-wins outcome is compared with two replays of the ops:
+#   client order  the ops in sequence order (what the workload meant)
+#   trace order   the ops in coordinator timestamp order from the traces (ties by sequence number),
+#                 only for partitions whose ops were all traced
+# For every partition:
+#   name          the winning name, and WRITETIME(name), the write timestamp the server kept
+#   toTS entries  missing (the replay has them, the server does not) and resurrected (the server has
+#                 entries the replay deleted or an INSERT replaced)
+#   apply order   the toTS values are toTimestamp(now()) on the coordinator, so the server's own apply
+#                 order is visible without tracing: inversions of the values in sequence order
+#
+# Memory is bounded by the partitions of one bucket: with --buckets N the keys are split by hash
+# into N passes, each pass reading the metadata (and the results) again but keeping only its keys.
+# Mismatching partitions are streamed to finalStateMismatches.jsonl, the totals are saved to
+# finalStateVerification.json.
+
+SELECT_QUERY = "SELECT id, name, WRITETIME(name) AS name_writetime, toTS FROM simpletry.person WHERE id = ?"
+
+
+class KeyState:
+    # The ops of one partition and its client order replay
+    def __init__(self):
+        self.ops = {}
+        self.name = None
+        self.entries = set()
+
+    def apply(self, seq, op, toTS, name):
+        self.ops[seq] = (op, toTS, name)
+        self.name, self.entries = replay_op(self.name, self.entries, op, toTS, name)
+
+
+def replay_op(current_name, entries, op, toTS, name):
+    # (name, toTS entries) after one op; an INSERT writes the whole map, so it replaces the entries
+    if op == "insert":
+        return name, {str(toTS)}
+    if op == "update":
+        return name, entries | {str(toTS)}
+    return current_name, entries - {str(toTS)}
+
+
+def bucket_of(key, buckets):
+    return zlib.crc32(key.encode()) % buckets if buckets > 1 else 0
+
+
+def load_bucket(metadata_file, bucket, buckets):
+    # {key: KeyState} for the keys of this bucket, in one pass over workload_metadata.jsonl
+    states = {}
+    with open(metadata_file, 'r') as file:
+        for line in file:
+            if not line.strip():
+                continue
+            seq, op, key, toTS, name = json.loads(line)
+            if bucket_of(key, buckets) != bucket:
+                continue
+            if key not in states:
+                states[key] = KeyState()
+            states[key].apply(seq, op, toTS, name)
+    return states
+
+
+def load_trace_order(traces, states):
+    # {key: [(coordinator_us, seq)]} of the traced ops of these partitions
+    seq_to_key = {seq: key for key, state in states.items() for seq in state.ops}
+    order = {}
+    for trace in traces:
+        key = seq_to_key.get(trace.get("seq"))
+        coordinator_us = to_epoch_us(trace.get("coordinator_timestamp"))
+        if key is None or coordinator_us is None:
+            continue
+        order.setdefault(key, []).append((coordinator_us, trace["seq"]))
+    return order
+
+
+def trace_replay(state, traced):
+    # (name, toTS entries) with the ops in coordinator timestamp order, None unless every op was traced
+    if len(traced) != len(state.ops):
+        return None
+    name, entries = None, set()
+    for _, seq in sorted(traced):
+        op, toTS, op_name = state.ops[seq]
+        name, entries = replay_op(name, entries, op, toTS, op_name)
+    return name, entries
+
+
+class PagedReader:
+    # Reads one partition per key, at most `concurrency` at a time, every read paged by fetch_size.
+    # Pages arrive on the driver's event loop and are only collected there; the calling thread gets
+    # every finished partition from read() and only then issues the next read, so at most
+    # `concurrency` partitions are held in memory.
+    def __init__(self, session, consistency_level=ConsistencyLevel.ALL, concurrency=64, fetch_size=1000):
+        self.session = session
+        self.concurrency = concurrency
+        self.fetch_size = fetch_size
+        self.statement = session.prepare(SELECT_QUERY)
+        self.statement.consistency_level = consistency_level
+
+    def read(self, keys):
+        # Yields (key, rows) in completion order; rows is the exception when the read failed
+        results = queue.Queue()
+        in_flight = 0
+        for key in keys:
+            if in_flight >= self.concurrency:
+                yield results.get()
+                in_flight -= 1
+            self._issue(key, results)
+            in_flight += 1
+        for _ in range(in_flight):
+            yield results.get()
+
+    def _issue(self, key, results):
+        statement = self.statement.bind([key])
+        statement.fetch_size = self.fetch_size
+        future = self.session.execute_async(statement)
+        future.add_callbacks(self._on_page, self._on_error, callback_args=(key, future, [], results),
+                             errback_args=(key, results))
+
+    def _on_page(self, page, key, future, rows, results):
+        rows.extend(page)
+        if future.has_more_pages:
+            # The same callbacks run again with the next page
+            future.start_fetching_next_page()
+        else:
+            results.put((key, rows))
+
+    def _on_error(self, error, key, results):
+        results.put((key, error))
+
+
+class Verification:
+    # Totals over every partition
+    def __init__(self, mismatches_file):
+        self.totals = {
+            "partitions": 0, "read_errors": 0, "missing_partitions": 0,
+            "name_matches_client": 0, "name_matches_trace": 0, "trace_compared": 0,
+            "expected_entries": 0, "server_entries": 0,
+            "missing_vs_client": 0, "resurrected_vs_client": 0, "missing_vs_trace": 0, "resurrected_vs_trace": 0,
+            "apply_order_inversions": 0, "mismatched_partitions": 0
+        }
+        self._mismatches = open(mismatches_file, 'w', encoding='utf-8')
+
+    def add(self, key, state, rows, traced):
+        totals = self.totals
+        totals["partitions"] += 1
+        if isinstance(rows, Exception):
+            totals["read_errors"] += 1
+            print(f"Error reading partition '{key}':", rows)
+            return
+        row = rows[0] if rows else None
+        if row is None and (state.name is not None or state.entries):
+            totals["missing_partitions"] += 1
+        name = row.name if row is not None else None
+        tots = dict(row.tots or {}) if row is not None else {}
+        entries = set(tots)
+
+        totals["expected_entries"] += len(state.entries)
+        totals["server_entries"] += len(entries)
+        totals["name_matches_client"] += name == state.name
+        missing, resurrected = state.entries - entries, entries - state.entries
+        totals["missing_vs_client"] += len(missing)
+        totals["resurrected_vs_client"] += len(resurrected)
+
+        # The server's apply order: toTS values in sequence order
+        ordered = [tots[entry] for entry in sorted(entries, key=lambda entry: int(entry) if entry.isdigit() else 0)]
+        inversions = count_inversions(ordered)
+        totals["apply_order_inversions"] += inversions
+
+        replayed = trace_replay(state, traced)
+        trace_name = None
+        if replayed is not None:
+            trace_name, trace_entries = replayed
+            totals["trace_compared"] += 1
+            totals["name_matches_trace"] += name == trace_name
+            totals["missing_vs_trace"] += len(trace_entries - entries)
+            totals["resurrected_vs_trace"] += len(entries - trace_entries)
+
+        if name != state.name or missing or resurrected:
+            totals["mismatched_partitions"] += 1
+            self._mismatches.write(json.dumps({
+                "key": key, "server_name": name, "name_writetime": row.name_writetime if row is not None else None,
+                "client_name": state.name, "trace_name": trace_name,
+                "missing": sorted(missing), "resurrected": sorted(resurrected), "apply_order_inversions": inversions
+            }) + '\n')
+
+    def close(self):
+        self._mismatches.close()
+        return self.totals
+
+
+def verify_final_state(session, metadata_file='workload_metadata.jsonl', traces=None, concurrency=64, fetch_size=1000,
+                       buckets=1, consistency_level=ConsistencyLevel.ALL, mismatches_file='finalStateMismatches.jsonl'):
+    # traces: None, or a function returning the trace records (called once per bucket); returns the totals
+    reader = PagedReader(session, consistency_level, concurrency, fetch_size)
+    verification = Verification(mismatches_file)
+    for bucket in range(buckets):
+        states = load_bucket(metadata_file, bucket, buckets)
+        trace_order = load_trace_order(traces(), states) if traces is not None else {}
+        for key, rows in reader.read(list(states)):
+            verification.add(key, states[key], rows, trace_order.get(key, []))
+    return verification.close()
+
+
+def iter_records(results_file):
+    # The trace records of a result.jsonl (one at a time) or result.json
+    if results_file.endswith('.jsonl'):
+        return iter_result_records(results_file)
+    with open(results_file, 'r') as file:
+        return json.load(file)["traces"]
+
+
+def print_verification(totals):
+    print(f"Verified {totals['partitions']} partitions ({totals['read_errors']} read errors, {totals['missing_partitions']} missing),"
+          f" {totals['mismatched_partitions']} differ from the client order")
+    print(f"name: {totals['name_matches_client']} match the client order, "
+          f"{totals['name_matches_trace']} of {totals['trace_compared']} fully traced match the trace order")
+    print(f"toTS: {totals['server_entries']} entries on the server, {totals['expected_entries']} expected;"
+          f" vs client order {totals['missing_vs_client']} missing / {totals['resurrected_vs_client']} resurrected,"
+          f" vs trace order {totals['missing_vs_trace']} missing / {totals['resurrected_vs_trace']} resurrected")
+    print(f"Server apply order (toTS values): {totals['apply_order_inversions']} inversions")
+
+
+def add_verifier_arguments(parser):
+    parser.add_argument("--read-concurrency", type=int, default=64, help="partitions read at once")
+    parser.add_argument("--fetch-size", type=int, default=1000, help="rows per page of every read")
+    parser.add_argument("--buckets", type=int, default=1, help="split the partitions into this many passes to bound memory")
+    parser.add_argument("--read-consistency", default="ALL", help="consistency level of the reads")
+
+
+def save_verification(totals, filename='finalStateVerification.json'):
+    with open(filename, 'w') as file:
+        json.dump(totals, file, indent=2)
+    print(f"Verification saved to {filename} (mismatching partitions in finalStateMismatches.jsonl)")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Read back every partition the workload wrote and compare it with the client and trace order")
+    parser.add_argument("--metadata", default="workload_metadata.jsonl")
+    parser.add_argument("--results", default=None, help="result.json or result.jsonl of the run, for the trace order")
+    add_verifier_arguments(parser)
+    parser.add_argument("--fake", action="store_true", help="read from an in-process fake cluster (fakeCassandra.py), which starts empty")
+    add_connection_arguments(parser, warmup=False)
+    args = parser.parse_args()
+
+    config = config_from_args(args)
+    cluster, session = connect(config, args.fake)
+
+    traces = (lambda: iter_records(args.results)) if args.results else None
+    totals = verify_final_state(session, args.metadata, traces, args.read_concurrency, args.fetch_size, args.buckets,
+                                ConsistencyLevel.name_to_value[args.read_consistency])
+    print_verification(totals)
+    save_verification(totals)
+
+    session.shutdown()
+    cluster.shutdown()
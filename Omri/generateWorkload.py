@@ -1,15 +1,31 @@
-from cassandra.cluster import Cluster
 from cassandra.query import SimpleStatement
 from cassandra import ConsistencyLevel
-from cassandra.auth import PlainTextAuthProvider
+import argparse
 import json
 import random
 import datetime
 
+from workloadMetadata import save_metadata
+from clusterConnection import config_from_args, connect, add_connection_arguments
+from workloadGenerator import (STATEMENT_TEMPLATES, INSERT_TEMPLATE, UPDATE_TEMPLATE, DELETE_TEMPLATE,
+                               add_generator_arguments, operations_from_args, write_workload)
+
 workload_commands = []
 
+# The same workload as (template index, bound parameters) pairs, in the same order as workload_commands
+workload_operations = []
+
+# Structured metadata of every op ([op, key, toTS, name]), in the same order as workload_commands
+workload_metadata = []
+
+def add_operation(template_index, params, key, time_stamp_id, name=None):
+    # Record the operation as a template + parameters, as its metadata and as the rendered CQL command
+    workload_operations.append([template_index, params])
+    workload_metadata.append([STATEMENT_TEMPLATES[template_index]["op"], key, int(time_stamp_id), name])
+    workload_commands.append(STATEMENT_TEMPLATES[template_index]["literal"].format(*params))
+
 def generate_workload(num_inserts=10, num_updates=5, num_deletes=5, mix_commands=False):
-    global workload_commands
+    global workload_commands, workload_operations, workload_metadata
     person_id = 208306068
     current_number = 0
 
@@ -17,40 +33,52 @@ def generate_workload(num_inserts=10, num_updates=5, num_deletes=5, mix_commands
     for i in range(1, num_inserts + 1):
         person_name = f'omri{i}'
         time_stamp_id = f'{i}'
-        command = f"INSERT INTO simpletry.person (id, name, toTS) VALUES ('{person_id}', '{person_name}', {{'{time_stamp_id}':toTimestamp(now())}});"
-        workload_commands.append(command)
+        add_operation(INSERT_TEMPLATE, [f'{person_id}', person_name, time_stamp_id], f'{person_id}', time_stamp_id, person_name)
         current_number = i
 
     # Generate update commands starting from the next number
     for i in range(1, num_updates + 1):
         person_name = f'Aviv/Gil{current_number + i}'
         time_stamp_id = f'{current_number + i}'
-        command = f"UPDATE simpletry.person SET name = '{person_name}', toTS['{time_stamp_id}'] = toTimestamp(now()) WHERE id = '{person_id}';"
-        workload_commands.append(command)
+        add_operation(UPDATE_TEMPLATE, [person_name, time_stamp_id, f'{person_id}'], f'{person_id}', time_stamp_id, person_name)
 
     current_number += num_updates
 
     # Generate delete commands starting from the next number
     for i in range(1, num_deletes + 1):
         time_stamp_id = f'{current_number + i}'
-        command = f"DELETE toTS['{time_stamp_id}'] FROM simpletry.person WHERE id = '{person_id}';"
-        workload_commands.append(command)
+        add_operation(DELETE_TEMPLATE, [time_stamp_id, f'{person_id}'], f'{person_id}', time_stamp_id)
 
-    # Mix commands if the option is enabled
+    # Mix commands if the option is enabled (commands, operations and metadata stay aligned)
     if mix_commands:
-        random.shuffle(workload_commands)
+        mixed = list(zip(workload_commands, workload_operations, workload_metadata))
+        random.shuffle(mixed)
+        workload_commands = [command for command, _, _ in mixed]
+        workload_operations = [operation for _, operation, _ in mixed]
+        workload_metadata = [metadata for _, _, metadata in mixed]
 
 def save_workload_to_file(filename):
     with open(filename, 'w') as file:
         for command in workload_commands:
             file.write(command + '\n')
 
+def save_prepared_workload_to_file(filename):
+    # Compact JSON Lines format: the first line holds the templates, every other line is one
+    # operation [template index, parameters], in the same order as workload_commands.txt
+    with open(filename, 'w') as file:
+        file.write(json.dumps({"templates": STATEMENT_TEMPLATES}) + '\n')
+        for operation in workload_operations:
+            file.write(json.dumps(operation, separators=(',', ':')) + '\n')
+
 if __name__ == "__main__":
-    auth_provider = PlainTextAuthProvider(username='omrino', password='sfgs44Df')
-    cluster = Cluster(contact_points=['62.90.89.27', '62.90.89.28', '62.90.89.29', '62.90.89.39'], auth_provider=auth_provider)
+    parser = argparse.ArgumentParser(description="Create the person table and generate the workload files")
+    parser.add_argument("--ops", type=int, default=None, help="stream this many generated ops (see workloadGenerator.py) instead of the fixed insert/update workload")
+    add_generator_arguments(parser)
+    add_connection_arguments(parser, warmup=False)
+    args = parser.parse_args()
 
-    session = cluster.connect('simpletry')
-    session.default_consistency_level = ConsistencyLevel.ONE
+    # Connect with the settings of the cluster config file
+    cluster, session = connect(config_from_args(args))
 
     session.execute("CREATE KEYSPACE IF NOT EXISTS simpletry WITH REPLICATION = { 'class' : 'SimpleStrategy', 'replication_factor' : '1' };")
 
@@ -58,11 +86,18 @@ if __name__ == "__main__":
 
     session.execute("CREATE TABLE IF NOT EXISTS person (id text, name text, toTS MAP<text,timestamp>, PRIMARY KEY (id));")
 
-    # Generate workload commands with specified numbers and mix option
-    generate_workload(num_inserts=50, num_updates=30, num_deletes=0, mix_commands=False)
-
-    # Save workload commands to a file
-    save_workload_to_file('workload_commands.txt')
+    if args.ops:
+        # Written op by op, the workload is never held in memory
+        written = write_workload(operations_from_args(args.ops, args))
+        print(f"Generated {written} ops over {args.partitions} partitions ({args.distribution})")
+    else:
+        # Generate workload commands with specified numbers and mix option
+        generate_workload(num_inserts=50, num_updates=30, num_deletes=0, mix_commands=False)
+
+        # Save workload commands to a file, plus the template + parameters form for prepared mode
+        save_workload_to_file('workload_commands.txt')
+        save_prepared_workload_to_file('workload_prepared.jsonl')
+        save_metadata('workload_metadata.jsonl', workload_metadata)
 
     session.shutdown()
     cluster.shutdown()
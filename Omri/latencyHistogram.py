@@ -0,0 +1,75 @@
+import math
+
+# HDR-style latency histogram (integer microseconds).
+#
+# Values below sub_bucket_count are counted exactly. Above that, every power of two is split into
+# sub_bucket_count / 2 equal buckets, so any recorded value is reported with a relative error below
+# 10^-significant_digits, while the histogram stays a few thousand counters however long the run is.
+# Buckets are kept in a dict, so only the ranges that were actually hit take memory.
+
+
+class LatencyHistogram:
+    def __init__(self, significant_digits=3):
+        self.significant_digits = significant_digits
+        self.sub_bucket_bits = math.ceil(math.log2(2 * 10 ** significant_digits))
+        self.counts = {}
+        self.total = 0
+        self.sum = 0
+        self.min = None
+        self.max = None
+
+    def _index(self, value):
+        shift = max(0, value.bit_length() - self.sub_bucket_bits)
+        return (shift << (self.sub_bucket_bits - 1)) + (value >> shift)
+
+    def _highest_equivalent(self, index):
+        # Largest value that falls into bucket index
+        if index < (1 << self.sub_bucket_bits):
+            return index
+        shift = (index >> (self.sub_bucket_bits - 1)) - 1
+        lowest = (index - (shift << (self.sub_bucket_bits - 1))) << shift
+        return lowest + (1 << shift) - 1
+
+    def record(self, value_us, count=1):
+        value_us = max(0, int(value_us))
+        index = self._index(value_us)
+        self.counts[index] = self.counts.get(index, 0) + count
+        self.total += count
+        self.sum += value_us * count
+        self.min = value_us if self.min is None else min(self.min, value_us)
+        self.max = value_us if self.max is None else max(self.max, value_us)
+
+    def merge(self, other):
+        for index, count in other.counts.items():
+            self.counts[index] = self.counts.get(index, 0) + count
+        self.total += other.total
+        self.sum += other.sum
+        if other.total:
+            self.min = other.min if self.min is None else min(self.min, other.min)
+            self.max = other.max if self.max is None else max(self.max, other.max)
+
+    def value_at_percentile(self, percentile):
+        # Smallest bucket value that at least percentile% of the recorded values are at or below
+        if not self.total:
+            return None
+        target = max(1, math.ceil(percentile / 100 * self.total))
+        seen = 0
+        for index in sorted(self.counts):
+            seen += self.counts[index]
+            if seen >= target:
+                return min(self._highest_equivalent(index), self.max)
+        return self.max
+
+    def to_dict(self):
+        if not self.total:
+            return {"count": 0}
+        return {
+            "count": self.total,
+            "min_us": self.min,
+            "mean_us": self.sum / self.total,
+            "p50_us": self.value_at_percentile(50),
+            "p90_us": self.value_at_percentile(90),
+            "p99_us": self.value_at_percentile(99),
+            "p999_us": self.value_at_percentile(99.9),
+            "max_us": self.max
+        }
@@ -0,0 +1,198 @@
+import bisect
+import collections
+import datetime
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from latencyHistogram import LatencyHistogram
+
+# Live view of a running workload.
+#
+# The executor reports every issued, completed and failed op and every fetched trace to a
+# LiveMonitor. Traces arrive out of order, so OnlineConflictDetector first puts them back in
+# sequence order in a bounded reorder buffer, then counts for every op how many of the previous
+# `window` ops (in sequence order) have a later timestamp: the same conflicts as Aviv/conflicts.py,
+# restricted to pairs at most `window` sequence numbers apart, found while the run is going.
+#
+# start_metrics_server() serves the counters in the Prometheus text format on
+# http://127.0.0.1:<port>/metrics, so long runs can be watched (and stopped with max_conflicts)
+# without waiting for the result file.
+
+
+class OnlineConflictDetector:
+    def __init__(self, window=10000):
+        self.window = window
+        self.conflicts = 0
+        self.checked = 0
+        self.skipped = 0
+        # Traces of ops that were already skipped when they arrived
+        self.late = 0
+        self._pending = {}
+        self._next_seq = 1
+        # Timestamps of the last `window` released ops, in sequence order and sorted
+        self._recent = collections.deque()
+        self._sorted = []
+
+    def add(self, seq, timestamp):
+        # Returns the number of new conflicts found by this op (and any ops it released)
+        if seq < self._next_seq:
+            # Already skipped (or a duplicate): buffering it would move _next_seq back to it
+            self.late += 1
+            return 0
+        self._pending[seq] = timestamp
+        found = 0
+        while self._next_seq in self._pending:
+            found += self._release(self._pending.pop(self._next_seq))
+            self._next_seq += 1
+        # An op that never produces a trace must not block the buffer forever
+        while len(self._pending) > self.window:
+            missing_until = min(self._pending)
+            self.skipped += missing_until - self._next_seq
+            self._next_seq = missing_until
+            while self._next_seq in self._pending:
+                found += self._release(self._pending.pop(self._next_seq))
+                self._next_seq += 1
+        return found
+
+    def _release(self, timestamp):
+        self.checked += 1
+        if timestamp is None:
+            return 0
+        # Earlier ops (in sequence order) with a later timestamp
+        found = len(self._sorted) - bisect.bisect_right(self._sorted, timestamp)
+        self.conflicts += found
+        self._recent.append(timestamp)
+        bisect.insort(self._sorted, timestamp)
+        if len(self._recent) > self.window:
+            oldest = self._recent.popleft()
+            del self._sorted[bisect.bisect_left(self._sorted, oldest)]
+        return found
+
+
+class LiveMonitor:
+    def __init__(self, window=10000, timestamp_field="coordinator_timestamp", max_conflicts=None, rate_window_sec=10):
+        self.detector = OnlineConflictDetector(window)
+        self.timestamp_field = timestamp_field
+        self.max_conflicts = max_conflicts
+        self.rate_window_sec = rate_window_sec
+
+        # Set when max_conflicts is exceeded; the executor stops sending new ops
+        self.abort = threading.Event()
+
+        self.issued = 0
+        self.completed = 0
+        self.errors = 0
+        self.traces = 0
+        self.untraced = 0
+        self.trace_lag_sec = 0.0
+        self._lock = threading.Lock()
+
+        # p99 over the current rate window, and (time, ops, conflicts) samples for the rates
+        self._latency = LatencyHistogram()
+        self._last_latency = None
+        self._latency_started = time.monotonic()
+        self._samples = collections.deque([(self._latency_started, 0, 0)])
+        self._sampler = threading.Thread(target=self._sample_loop, name="live-monitor", daemon=True)
+        self._sampler.start()
+
+    def on_issue(self):
+        with self._lock:
+            self.issued += 1
+
+    def on_complete(self, latency_ms):
+        with self._lock:
+            self.completed += 1
+            self._latency.record(latency_ms * 1000)
+
+    def on_error(self):
+        with self._lock:
+            self.errors += 1
+
+    def on_trace(self, seq, data, completed_at):
+        # The trace timestamps are ISO strings, which compare in time order
+        lag = (datetime.datetime.now() - datetime.datetime.fromisoformat(completed_at)).total_seconds()
+        with self._lock:
+            self.traces += 1
+            self.trace_lag_sec = lag
+            self.detector.add(seq, data.get(self.timestamp_field))
+            if self.max_conflicts is not None and self.detector.conflicts > self.max_conflicts and not self.abort.is_set():
+                print(f"Conflicts exceeded {self.max_conflicts}, stopping the run")
+                self.abort.set()
+
+    def on_untraced(self, seq):
+        # A sampled-out op: nothing to compare, but the reorder buffer must not wait for its trace
+        with self._lock:
+            self.untraced += 1
+            self.detector.add(seq, None)
+
+    def _sample_loop(self):
+        while True:
+            now = time.monotonic()
+            with self._lock:
+                self._samples.append((now, self.completed, self.detector.conflicts))
+                while len(self._samples) > 1 and now - self._samples[0][0] > self.rate_window_sec:
+                    self._samples.popleft()
+                # Start a new latency window every rate window
+                if now - self._latency_started >= self.rate_window_sec:
+                    self._last_latency, self._latency = self._latency, LatencyHistogram()
+                    self._latency_started = now
+            time.sleep(1)
+
+    def snapshot(self):
+        with self._lock:
+            first, last = self._samples[0], self._samples[-1]
+            elapsed = last[0] - first[0]
+            latency = self._latency if self._latency.total or self._last_latency is None else self._last_latency
+            p99 = latency.value_at_percentile(99)
+            return {
+                "ops_total": self.completed,
+                "errors_total": self.errors,
+                "in_flight": self.issued - self.completed - self.errors,
+                "traces_total": self.traces,
+                "trace_backlog": self.completed - self.traces - self.untraced,
+                "trace_lag_seconds": self.trace_lag_sec,
+                "conflicts_total": self.detector.conflicts,
+                "skipped_sequence_numbers_total": self.detector.skipped,
+                "late_traces_total": self.detector.late,
+                "ops_per_second": (last[1] - first[1]) / elapsed if elapsed > 0 else 0.0,
+                "conflicts_per_second": (last[2] - first[2]) / elapsed if elapsed > 0 else 0.0,
+                "latency_p99_seconds": p99 / 1000000 if p99 is not None else 0.0
+            }
+
+
+METRIC_TYPES = {
+    "ops_total": "counter", "errors_total": "counter", "traces_total": "counter", "conflicts_total": "counter",
+    "skipped_sequence_numbers_total": "counter", "late_traces_total": "counter"
+}
+
+
+def render_metrics(snapshot, prefix="cassandra_workload_"):
+    lines = []
+    for name, value in snapshot.items():
+        lines.append(f"# TYPE {prefix}{name} {METRIC_TYPES.get(name, 'gauge')}")
+        lines.append(f"{prefix}{name} {value}")
+    return "\n".join(lines) + "\n"
+
+
+def start_metrics_server(monitor, port=9108, host="127.0.0.1"):
+    # Serves /metrics on a daemon thread; returns the server (call shutdown() to stop it)
+    class MetricsHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path != "/metrics":
+                self.send_error(404)
+                return
+            body = render_metrics(monitor.snapshot()).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), MetricsHandler)
+    threading.Thread(target=server.serve_forever, name="metrics-server", daemon=True).start()
+    print(f"Serving live metrics on http://{host}:{port}/metrics")
+    return server
@@ -0,0 +1,182 @@
+import argparse
+import heapq
+import json
+import multiprocessing
+import os
+import queue
+import time
+
+from asyncExecutor import AsyncWorkloadExecutor, latency_report
+from resultSink import ResultSink
+from clusterConnection import config_from_args, connect, warm_up, add_connection_arguments
+
+# Multi-process workload driver.
+#
+# One Python process cannot drive the cluster past a single core (GIL), so the workload is sharded
+# across N worker processes, each with its own Cluster/Session and connection pool. Command number
+# seq (1-based line of workload_commands.txt) goes to worker (seq - 1) % N, so neighbouring commands
+# still run at the same time in different processes. All workers connect first and then start the
+# timed phase together (barrier), after every worker has warmed up its connections. Each worker streams its results to result.worker<k>.jsonl with the
+# global sequence number in every record; the parent merges them into one result.jsonl ordered by
+# sequence number without loading the worker files into memory.
+
+
+def read_shard(filename, num_workers, worker_index):
+    # [(seq, command)] of this worker's shard
+    shard = []
+    with open(filename, 'r') as file:
+        for seq, command in enumerate(file, start=1):
+            if (seq - 1) % num_workers == worker_index and command.strip():
+                shard.append((seq, command.strip()))
+    return shard
+
+
+def worker_file(worker_index):
+    return f'result.worker{worker_index}.jsonl'
+
+
+def run_shard(worker_index, num_workers, filename, max_in_flight, trace_workers, barrier, config):
+    shard = read_shard(filename, num_workers, worker_index)
+    cluster, session = connect(config)
+    sink = ResultSink(worker_file(worker_index))
+    try:
+        # Start the timed phase in all workers together, after every worker is connected and warmed up
+        if config.get("warmup") is not None:
+            warm_up(session, config, max_in_flight)
+        barrier.wait()
+        started_at = time.time()
+        executor = AsyncWorkloadExecutor(session, max_in_flight=max_in_flight, trace_workers=trace_workers, sink=sink)
+        executor.run([command for _, command in shard], sequence_numbers=[seq for seq, _ in shard])
+        finished_at = time.time()
+    finally:
+        sink.close()
+        session.shutdown()
+        cluster.shutdown()
+    return {
+        "worker": worker_index,
+        "started_at": started_at,
+        "finished_at": finished_at,
+        "errors": executor.errors,
+        "latencies": executor.latencies
+    }
+
+
+def run_worker(worker_index, num_workers, filename, max_in_flight, trace_workers, barrier, reports, config):
+    try:
+        report = run_shard(worker_index, num_workers, filename, max_in_flight, trace_workers, barrier, config)
+    except Exception as e:
+        # Release the other workers from the barrier instead of leaving them waiting
+        barrier.abort()
+        report = {"worker": worker_index, "error": f"{type(e).__name__}: {e}"}
+    reports.put(report)
+
+
+def collect_reports(workers, reports, barrier, poll_sec=1.0):
+    # One report per worker. A worker that exits without sending one (killed by the OOM killer, a
+    # crash in the driver's C extension, a failure while the spawned process imports its modules)
+    # is reported as failed instead of waiting for it forever.
+    received = {}
+    exited = set()
+    while len(received) < len(workers):
+        try:
+            report = reports.get(timeout=poll_sec)
+            received[report["worker"]] = report
+            continue
+        except queue.Empty:
+            pass
+        for worker_index, worker in enumerate(workers):
+            if worker_index in received or worker.exitcode is None:
+                continue
+            if worker_index in exited:
+                # Gone for a whole poll without its report arriving: it never sent one
+                received[worker_index] = {"worker": worker_index, "error": f"exited with code {worker.exitcode} without a report"}
+                barrier.abort()
+            else:
+                exited.add(worker_index)
+    return [received[worker_index] for worker_index in range(len(workers))]
+
+
+def merge_worker_results(num_workers, output_file):
+    # Index every worker file as (seq, byte offset) pairs, then k-way merge them by sequence number,
+    # reading each record back with a seek. Only two integers per op are kept in memory.
+    def indexed(worker_index):
+        entries = []
+        with open(worker_file(worker_index), 'rb') as file:
+            offset = 0
+            for line in file:
+                if line.strip():
+                    try:
+                        entries.append((json.loads(line)["seq"], offset))
+                    except json.JSONDecodeError:
+                        print(f"Warning: Skipping incomplete record in {worker_file(worker_index)}")
+                offset += len(line)
+        entries.sort()
+        return entries
+
+    files = [open(worker_file(worker_index), 'rb') for worker_index in range(num_workers)]
+    streams = [[(seq, worker_index, offset) for seq, offset in indexed(worker_index)] for worker_index in range(num_workers)]
+    merged = 0
+    with open(output_file, 'wb') as output:
+        for seq, worker_index, offset in heapq.merge(*streams):
+            files[worker_index].seek(offset)
+            output.write(files[worker_index].readline())
+            merged += 1
+    for file in files:
+        file.close()
+    for worker_index in range(num_workers):
+        os.remove(worker_file(worker_index))
+    return merged
+
+
+def run_multi_process(filename, num_workers, config, max_in_flight=128, trace_workers=4, output_file='result.jsonl'):
+    # config: the cluster config (clusterConnection.read_cluster_config); no "warmup" section skips the warm-up
+    # The driver does not survive fork() after connecting, so workers are spawned fresh
+    context = multiprocessing.get_context("spawn")
+    barrier = context.Barrier(num_workers)
+    reports = context.Queue()
+    workers = [
+        context.Process(target=run_worker, args=(worker_index, num_workers, filename, max_in_flight, trace_workers, barrier, reports, config))
+        for worker_index in range(num_workers)
+    ]
+    for worker in workers:
+        worker.start()
+    worker_reports = collect_reports(workers, reports, barrier)
+    for worker in workers:
+        worker.join()
+
+    failed = [report for report in worker_reports if "error" in report]
+    if failed:
+        for report in failed:
+            print(f"Worker {report['worker']} failed: {report['error']}")
+        raise RuntimeError(f"{len(failed)} of {num_workers} workers failed")
+
+    # Throughput over the common timed phase and latency percentiles over all workers
+    latencies = [latency for report in worker_reports for latency in report["latencies"]]
+    elapsed = max(report["finished_at"] for report in worker_reports) - min(report["started_at"] for report in worker_reports)
+    report = latency_report(latencies, elapsed)
+    report["errors"] = sum(worker_report["errors"] for worker_report in worker_reports)
+    report["workers"] = num_workers
+
+    merged = merge_worker_results(num_workers, output_file)
+    print(f"Merged {merged} results from {num_workers} workers into {output_file}")
+    return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run workload_commands.txt from several processes")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help="number of worker processes")
+    parser.add_argument("--max-in-flight", type=int, default=128, help="maximum number of outstanding writes per worker")
+    parser.add_argument("--trace-workers", type=int, default=4, help="threads used to fetch query traces per worker")
+    add_connection_arguments(parser)
+    args = parser.parse_args()
+
+    config = config_from_args(args)
+    if args.no_warmup:
+        config.pop("warmup", None)
+    report = run_multi_process('workload_commands.txt', args.workers, config, args.max_in_flight, args.trace_workers)
+
+    latency = report["latency_ms"]
+    print(f"Executed {report['ops']} commands ({report['errors']} errors) with {report['workers']} workers in {report['elapsed_sec']:.2f}s")
+    if report["ops"]:
+        print(f"Throughput: {report['ops_per_sec']:.1f} ops/sec")
+        print(f"Latency ms: p50={latency['p50']:.2f} p90={latency['p90']:.2f} p99={latency['p99']:.2f} p999={latency['p999']:.2f} max={latency['max']:.2f}")
@@ -0,0 +1,100 @@
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from asyncExecutor import AsyncWorkloadExecutor, latency_report
+from latencyHistogram import LatencyHistogram
+from traceProcessing import op_type
+
+# Open-loop (fixed arrival rate) workload executor.
+#
+# The closed-loop runners only send the next op when an earlier one has finished, so a slow
+# cluster also slows down the load it is given and the slow periods are under-sampled
+# ("coordinated omission"). Here every op has an intended start time taken from the arrival
+# schedule (constant spacing or Poisson arrivals at the target rate), and it is sent at that time
+# whether or not earlier ops have finished. Latency is measured from the intended start to the
+# completion, so time an op spent waiting behind a stalled cluster or a full in-flight window is
+# counted. The time from the actual send is kept as service time for comparison.
+#
+# Latencies go into HDR-style histograms per op type (insert / update / delete).
+
+
+def arrival_offsets(rate, arrivals="constant", seed=None):
+    # Intended start of every op in seconds from the start of the run (endless generator)
+    if arrivals == "constant":
+        i = 0
+        while True:
+            yield i / rate
+            i += 1
+    elif arrivals == "poisson":
+        rng = random.Random(seed)
+        offset = 0.0
+        while True:
+            yield offset
+            offset += rng.expovariate(rate)
+    else:
+        raise ValueError(f"Unknown arrival process: {arrivals}")
+
+
+class OpenLoopExecutor(AsyncWorkloadExecutor):
+    def __init__(self, session, rate, arrivals="constant", seed=None, max_in_flight=4096, **kwargs):
+        # max_in_flight only guards the client against runaway memory; when it is reached the
+        # sender falls behind the schedule and the delay shows up in the latencies
+        super().__init__(session, max_in_flight=max_in_flight, **kwargs)
+        self.rate = rate
+        self.arrivals = arrivals
+        self.seed = seed
+        self.histograms = {}
+        self.service_histograms = {}
+        self.max_schedule_lag_ms = 0.0
+
+    def run(self, commands, statements=None, sequence_numbers=None):
+        self._trace_pool = ThreadPoolExecutor(max_workers=self.trace_workers)
+        start = time.perf_counter()
+
+        for i, (command, offset) in enumerate(zip(commands, arrival_offsets(self.rate, self.arrivals, self.seed))):
+            if self._aborted():
+                break
+            seq = sequence_numbers[i] if sequence_numbers is not None else i + 1
+            intended_at = start + offset
+            delay = intended_at - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            self._in_flight.acquire()
+            self.max_schedule_lag_ms = max(self.max_schedule_lag_ms, (time.perf_counter() - intended_at) * 1000)
+            self._execute(command, statements[i] if statements is not None else None, seq, intended_at)
+
+        elapsed = self._drain(start)
+        report = latency_report(self.latencies, elapsed)
+        report["offered_ops_per_sec"] = self.rate
+        report["arrivals"] = self.arrivals
+        report["max_schedule_lag_ms"] = self.max_schedule_lag_ms
+        report["by_op"] = self.histogram_report()
+        self._add_tracing_report(report)
+        return report
+
+    def _record_latency(self, command, latency_ms, service_ms):
+        operation = op_type(command)
+        with self._lock:
+            self.latencies.append(latency_ms)
+            if operation not in self.histograms:
+                self.histograms[operation] = LatencyHistogram()
+                self.service_histograms[operation] = LatencyHistogram()
+            self.histograms[operation].record(latency_ms * 1000)
+            self.service_histograms[operation].record(service_ms * 1000)
+        if self.monitor is not None:
+            self.monitor.on_complete(latency_ms)
+
+    def histogram_report(self):
+        # {op type: {"latency": ..., "service": ...}} plus "all" over every op type
+        total_latency, total_service = LatencyHistogram(), LatencyHistogram()
+        report = {}
+        for operation in sorted(self.histograms):
+            total_latency.merge(self.histograms[operation])
+            total_service.merge(self.service_histograms[operation])
+            report[operation] = {
+                "latency": self.histograms[operation].to_dict(),
+                "service": self.service_histograms[operation].to_dict()
+            }
+        report["all"] = {"latency": total_latency.to_dict(), "service": total_service.to_dict()}
+        return report
@@ -0,0 +1,69 @@
+import json
+
+try:
+    from cassandra import ConsistencyLevel
+except ImportError:
+    # Offline runs against fakeCassandra.py work without cassandra-driver
+    from fakeCassandra import ConsistencyLevel
+
+# Prepared-statement workload mode.
+#
+# workload_prepared.jsonl (written by generateWorkload.py) holds the statement templates on its first
+# line and one [template index, parameters] operation per following line, in the same order as
+# workload_commands.txt. The runners prepare every template once per session and execute bound
+# statements, so the coordinator does not parse every op. Each op is still identified by its rendered
+# CQL text, so result.json and the analysis scripts look the same as in the plain mode.
+
+
+def load_prepared_workload(filename):
+    # Returns (templates, operations)
+    with open(filename, 'r') as file:
+        templates = json.loads(file.readline())["templates"]
+        operations = [json.loads(line) for line in file if line.strip()]
+    return templates, operations
+
+
+def render_command(template, params):
+    # The plain CQL command equivalent to the bound template
+    return template["literal"].format(*params)
+
+
+def prepare_templates(session, templates, consistency_level=ConsistencyLevel.ONE):
+    # Prepare every template once for this session
+    prepared = []
+    for template in templates:
+        statement = session.prepare(template["cql"])
+        statement.consistency_level = consistency_level
+        prepared.append(statement)
+    return prepared
+
+
+def load_bound_statements(filename, session, consistency_level=ConsistencyLevel.ONE):
+    # Returns (commands, statements): the rendered command text and the bound statement of every op
+    templates, operations = load_prepared_workload(filename)
+    prepared = prepare_templates(session, templates, consistency_level)
+    commands = []
+    statements = []
+    for template_index, params in operations:
+        commands.append(render_command(templates[template_index], params))
+        statements.append(prepared[template_index].bind(params))
+    return commands, statements
+
+
+class BoundOperations:
+    # The commands and bound statements of a stream of (template index, parameters) ops, bound one op
+    # at a time. The executors read statements[i] right after taking command i, so only the current
+    # op's statement is kept.
+    def __init__(self, session, templates, operations, consistency_level=ConsistencyLevel.ONE):
+        self.templates = templates
+        self.prepared = prepare_templates(session, templates, consistency_level)
+        self.operations = operations
+        self._statement = None
+
+    def commands(self):
+        for template_index, params in self.operations:
+            self._statement = self.prepared[template_index].bind(params)
+            yield render_command(self.templates[template_index], params)
+
+    def __getitem__(self, index):
+        return self._statement
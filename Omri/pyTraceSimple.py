@@ -1,122 +1,157 @@
-from cassandra.cluster import Cluster
-from cassandra.query import SimpleStatement
-from cassandra import ConsistencyLevel
-from cassandra.auth import PlainTextAuthProvider
+import argparse
+try:
+    from cassandra.query import SimpleStatement
+    from cassandra import ConsistencyLevel
+except ImportError:
+    # Offline runs against fakeCassandra.py work without cassandra-driver
+    from fakeCassandra import SimpleStatement, ConsistencyLevel
 import json
 import datetime
+import time
+
+from traceProcessing import process_trace, build_final_data
+from traceHarvester import harvest_into_results
+from preparedWorkload import load_bound_statements
+from resultSink import ResultSink
+from clusterConnection import config_from_args, connect, warm_up, add_connection_arguments
+from clientProfiling import NO_TIMERS, logger, add_profiling_arguments, setup_from_args, start_profiler, print_phase_report, save_phase_report
 
 # Lists to store the results
 traces_res = []
 queries_and_times = []
 
-def execute_command(command, session):
-    # Set consistency level for the query
+# Deferred trace mode: [command, trace_id, completed_at, seq] to harvest after the run
+pending_commands = []
+
+# Streaming mode: a resultSink.ResultSink that receives every finished op instead of the lists above
+result_sink = None
+
+# Client-side phase timers (clientProfiling.PhaseTimers with --phase-timers)
+phase_timers = NO_TIMERS
+
+def execute_command(command, session, deferred_traces=False, statement=None, seq=None):
+    started = phase_timers.now()
+
+    # Set consistency level for the query (prepared mode passes an already bound statement)
     consistency_level = ConsistencyLevel.ONE
-    query = SimpleStatement(command, consistency_level=consistency_level)
+    query = statement if statement is not None else SimpleStatement(command, consistency_level=consistency_level)
+    started = phase_timers.lap("build_statement", command, started)
     
     # Execute the query with tracing enabled
     res = session.execute(query, trace=True)
+    started = phase_timers.lap("execute", command, started)
+
+    # In deferred mode only remember the trace id, the trace itself is harvested after the run
+    if deferred_traces:
+        for trace_id in res.response_future.get_query_trace_ids():
+            pending_commands.append([command, trace_id, datetime.datetime.now().isoformat(), seq])
+        phase_timers.lap("record", command, started)
+        return res
 
     try:
         # Retrieve query trace
         trace = res.get_query_trace(max_wait_sec=1)
+        started = phase_timers.lap("trace_fetch", command, started)
         
-        # Initialize variables to capture timestamps
-        coordinator_timestamp = None
-        memtable_timestamp = None
-        events_list = []
-
-        # Process each event in the trace
-        for event in trace.events:
-            # Save event details
-            events = {
-                "description": event.description,
-                "source": event.source,
-                "source_elapsed": event.source_elapsed,
-                "thread_name": event.thread_name,
-                "datetime": event.datetime.isoformat(),
-            }
-            events_list.append(events)
-
-            # Capture timestamps for coordinator and memtable events
-            if event.description in ("Enqueuing response to /", "Adding to memtable", "Adding to person memtable"):
-                memtable_timestamp = event.datetime.isoformat()
-            if event.description in ("Determining replicas for mutation", "Parsing", "Preparing statement"):
-                coordinator_timestamp = event.datetime.isoformat()
-
-        # Create a dictionary to store the trace details
-        data = {
-            "trace_id": trace.trace_id,
-            "request_type": trace.request_type,
-            "client": trace.client,
-            "coordinator": trace.coordinator,
-            "started_at": trace.started_at.isoformat(),
-            "parameters": trace.parameters,
-            "duration": str(trace.duration),
-            "query": trace.parameters['query'],
-            "events": events_list,
-            "coordinator_timestamp": coordinator_timestamp,
-            "memtable_timestamp": memtable_timestamp
-        }
-
-        # Print the captured timestamps
+        # Build the trace record (events plus coordinator / memtable timestamps)
+        data = process_trace(trace)
+        data["query"] = command
+        data["seq"] = seq
+        memtable_timestamp = data["memtable_timestamp"]
+        coordinator_timestamp = data["coordinator_timestamp"]
+        started = phase_timers.lap("process_trace", command, started)
+
+        # Print the captured timestamps (only with --log-level debug)
         if memtable_timestamp:
-            print(f"Command '{command}' reached memtable at {memtable_timestamp}")
+            logger.debug("Command '%s' reached memtable at %s", command, memtable_timestamp)
         if coordinator_timestamp:
-            print(f"Command '{command}' reached coordinator at {coordinator_timestamp}")
-
-        # Append the trace data to the results list
-        traces_res.append(data)
-
-        # Add the command and its execution timestamp to the queries_and_times list
-        queries_and_times.append([command, datetime.datetime.now().isoformat()])
+            logger.debug("Command '%s' reached coordinator at %s", command, coordinator_timestamp)
+        started = phase_timers.lap("log", command, started)
+
+        # Stream the op to disk, or append the trace data and the command's execution timestamp to the lists
+        completed_at = datetime.datetime.now().isoformat()
+        if result_sink is not None:
+            result_sink.write(command, data, completed_at)
+        else:
+            traces_res.append(data)
+            queries_and_times.append([command, completed_at])
+        phase_timers.lap("record", command, started)
 
     except Exception as e:
         print("Error retrieving query trace:", e)
     return res
 
-def run_workload_from_file(filename, session):
-    # Read commands from the file
-    with open(filename, 'r') as file:
-        commands = file.readlines()
+def run_workload_from_file(filename, session, deferred_traces=False, prepared=False):
+    # Read commands from the file (prepared mode: templates + parameters, prepared once per session)
+    if prepared:
+        commands, statements = load_bound_statements(filename, session)
+    else:
+        with open(filename, 'r') as file:
+            commands = [command.strip() for command in file.readlines()]
+        statements = [None] * len(commands)
     
     # Execute each command
-    for command in commands:
-        execute_command(command.strip(), session)
+    start = time.perf_counter()
+    for seq, (command, statement) in enumerate(zip(commands, statements), start=1):
+        execute_command(command, session, deferred_traces, statement, seq)
+    print(f"Executed {len(commands)} commands in {time.perf_counter() - start:.2f}s")
+
+    # Read all recorded traces in bulk, outside the timed loop above
+    if deferred_traces:
+        harvested_traces, harvested_times = harvest_into_results(session, pending_commands, result_sink)
+        traces_res.extend(harvested_traces)
+        queries_and_times.extend(harvested_times)
 
 if __name__ == "__main__":
-    # Authentication details for the Cassandra cluster
-    auth_provider = PlainTextAuthProvider(username='omrino', password='sfgs44Df')
-    
-    # Connect to the Cassandra cluster
-    cluster = Cluster(contact_points=['62.90.89.27', '62.90.89.28', '62.90.89.29', '62.90.89.39'], auth_provider=auth_provider)
-
-    session = cluster.connect('simpletry')
-    session.default_consistency_level = ConsistencyLevel.ONE
-
-    # Run workload commands from the file
-    run_workload_from_file('workload_commands.txt', session)
-
-    # Create the final data structure with organized sections
-    final_data = {
-        "queries_and_times": queries_and_times,
-        "traces": []
-    }
-
-    # Process each trace result and organize the data
-    for trace in traces_res:
-        organized_trace = {
-            "query": trace["query"],
-            "launched_at": trace["started_at"],
-            "coordinator_timestamp": trace.get("coordinator_timestamp"),
-            "memtable_timestamp": trace.get("memtable_timestamp"),
-            "details": trace["events"]
-        }
-        final_data["traces"].append(organized_trace)
-
-    # Save the results to a JSON file
-    with open('result.json', 'w') as file:
-        json.dump(final_data, file, ensure_ascii=False, sort_keys=True, default=str, indent=4)
+    parser = argparse.ArgumentParser(description="Run workload_commands.txt one command at a time with tracing")
+    parser.add_argument("--deferred-traces", action="store_true", help="only record trace ids during the run and harvest the traces in bulk afterwards")
+    parser.add_argument("--prepared", action="store_true", help="run workload_prepared.jsonl as prepared statements instead of workload_commands.txt")
+    parser.add_argument("--stream", action="store_true", help="stream every op to result.jsonl while running instead of writing result.json at the end")
+    parser.add_argument("--columnar", action="store_true", help="also write the results as columnar result.npz (needs numpy)")
+    add_profiling_arguments(parser)
+    parser.add_argument("--fake", action="store_true", help="run against an in-process fake cluster (fakeCassandra.py) instead of the real one")
+    add_connection_arguments(parser)
+    args = parser.parse_args()
+    phase_timers = setup_from_args(args)
+
+    # Connect to the Cassandra cluster from the cluster config file (or to the fake cluster)
+    config = config_from_args(args)
+    cluster, session = connect(config, args.fake)
+
+    # Streaming mode: a writer thread appends every finished op to result.jsonl
+    if args.stream:
+        result_sink = ResultSink('result.jsonl')
+
+    # Open the connections and warm up before the timed phase (one op at a time, like the run)
+    if not args.no_warmup:
+        warm_up(session, config, max_in_flight=1)
+
+    # Run workload commands from the file (profiled with --profile)
+    profiler = start_profiler(args.profile)
+    workload_file = 'workload_prepared.jsonl' if args.prepared else 'workload_commands.txt'
+    run_workload_from_file(workload_file, session, args.deferred_traces, args.prepared)
+
+    if profiler is not None:
+        profiler.stop()
+    if phase_timers.report() is not None:
+        print_phase_report(phase_timers.report())
+        save_phase_report(phase_timers.report())
+
+    if result_sink is not None:
+        result_sink.close()
+        print(f"Streamed {result_sink.records_written} results to result.jsonl")
+    else:
+        # Create the final data structure with organized sections
+        final_data = build_final_data(queries_and_times, traces_res)
+
+        # Save the results to a JSON file
+        with open('result.json', 'w') as file:
+            json.dump(final_data, file, ensure_ascii=False, sort_keys=True, default=str, indent=4)
+
+    # Optional compact columnar copy of the results for the analysis scripts
+    if args.columnar:
+        from columnarResults import convert_results
+        convert_results('result.jsonl' if args.stream else 'result.json', 'workload_commands.txt', 'result.npz')
 
     # Shutdown the session and cluster connection
     session.shutdown()
@@ -1,10 +1,25 @@
+import argparse
 import threading
-from cassandra.cluster import Cluster
-from cassandra.query import SimpleStatement
-from cassandra import ConsistencyLevel
-from cassandra.auth import PlainTextAuthProvider
+try:
+    from cassandra import ConsistencyLevel
+except ImportError:
+    # Offline runs against fakeCassandra.py work without cassandra-driver
+    from fakeCassandra import ConsistencyLevel
 import json
-import datetime
+
+from traceProcessing import build_final_data
+from asyncExecutor import AsyncWorkloadExecutor
+from openLoopExecutor import OpenLoopExecutor
+from workloadGenerator import STATEMENT_TEMPLATES, add_generator_arguments, operations_from_args, tee_commands, tee_operations
+from traceHarvester import harvest_into_results
+from preparedWorkload import BoundOperations, load_bound_statements
+from resultSink import ResultSink, iter_result_records
+from finalStateVerifier import add_verifier_arguments, verify_final_state, print_verification, save_verification
+from batchedWorkload import BATCH_TYPES, BatchedWorkload, expand_batch_results, reorder_summary, print_batching_comparison
+from clusterConnection import config_from_args, connect, warm_up, add_connection_arguments
+from liveMonitor import LiveMonitor, start_metrics_server
+from traceSampling import NoTracing, add_sampling_arguments, sampler_from_args
+from clientProfiling import NO_TIMERS, add_profiling_arguments, setup_from_args, start_profiler, print_phase_report, save_phase_report
 
 # Lists to store the results
 traces_res = []
@@ -13,126 +28,332 @@ queries_and_times = []
 # Lock for appending results to shared lists
 lock = threading.Lock()
 
-def execute_command(command, session):
-    # Set consistency level for the query
-    consistency_level = ConsistencyLevel.ONE
-    query = SimpleStatement(command, consistency_level=consistency_level)
-    
-    # Execute the query with tracing enabled
-    res = session.execute(query, trace=True)
-
-    try:
-        # Retrieve query trace
-        trace = res.get_query_trace(max_wait_sec=10)
-        
-        # Initialize variables to capture timestamps
-        coordinator_timestamp = None
-        memtable_timestamp = None
-        events_list = []
-
-        # Process each event in the trace
-        for event in trace.events:
-            # Save event details
-            events = {
-                "description": event.description,
-                "source": event.source,
-                "source_elapsed": event.source_elapsed,
-                "thread_name": event.thread_name,
-                "datetime": event.datetime.isoformat(),
-            }
-            events_list.append(events)
-
-            # Capture timestamps for coordinator and memtable events
-            if event.description in ("Enqueuing response to /", "Adding to memtable", "Adding to person memtable"):
-                memtable_timestamp = event.datetime.isoformat()
-            if event.description in ("Determining replicas for mutation", "Parsing", "Preparing statement"):
-                coordinator_timestamp = event.datetime.isoformat()
-
-        # Create a dictionary to store the trace details
-        data = {
-            "trace_id": trace.trace_id,
-            "request_type": trace.request_type,
-            "client": trace.client,
-            "coordinator": trace.coordinator,
-            "started_at": trace.started_at.isoformat(),
-            "parameters": trace.parameters,
-            "duration": str(trace.duration),
-            "query": trace.parameters['query'],
-            "events": events_list,
-            "coordinator_timestamp": coordinator_timestamp,
-            "memtable_timestamp": memtable_timestamp
-        }
-
-        # Print the captured timestamps
-        if memtable_timestamp:
-            print(f"Command '{command}' reached memtable at {memtable_timestamp}")
-        if coordinator_timestamp:
-            print(f"Command '{command}' reached coordinator at {coordinator_timestamp}")
-
-        # Append the trace data to the results list
-        with lock:
-            traces_res.append(data)
-
-        # Add the command and its execution timestamp to the queries_and_times list
-        with lock:
-            queries_and_times.append([command, datetime.datetime.now().isoformat()])
-
-    except Exception as e:
-        print("Error retrieving query trace:", e)
-    return res
-
-def run_command(command, session):
-    execute_command(command, session)
-
-def run_workload_from_file(filename, session):
-    # Read commands from the file
+# Client-side phase timers (clientProfiling.PhaseTimers with --phase-timers)
+phase_timers = NO_TIMERS
+
+def load_workload(filename, session, prepared=False):
+    # Returns (commands, statements); statements is None in plain mode
+    if prepared:
+        return load_bound_statements(filename, session)
     with open(filename, 'r') as file:
-        commands = file.readlines()
-    
-    # Create and start threads for each command
-    threads = []
-    for command in commands:
-        t = threading.Thread(target=run_command, args=(command.strip(), session))
-        t.start()
-        threads.append(t)
-
-    # Wait for all threads to complete
-    for t in threads:
-        t.join()
+        commands = [command.strip() for command in file]
+    return commands, None
+
+def run_executor(commands, statements, session, max_in_flight=128, trace_workers=4, deferred_traces=False, sink=None,
+                 rate=None, arrivals="constant", seed=None, monitor=None, sampler=None, retention="full", sequence_numbers=None):
+    # Execute the commands with at most max_in_flight async writes outstanding,
+    # fetching traces on a separate pool of trace_workers threads (streamed to sink if given).
+    # With a rate, ops are sent open-loop at rate ops/sec instead (see openLoopExecutor.py).
+    # A monitor (liveMonitor.py) sees every op and trace as they finish and may stop the run early.
+    # A sampler (traceSampling.py) picks the traced ops; retention sets the events kept per trace.
+    if rate:
+        executor = OpenLoopExecutor(session, rate, arrivals=arrivals, seed=seed, max_in_flight=max_in_flight,
+                                    trace_workers=trace_workers, deferred_traces=deferred_traces, sink=sink, monitor=monitor,
+                                    sampler=sampler, retention=retention, timers=phase_timers)
+    else:
+        executor = AsyncWorkloadExecutor(session, max_in_flight=max_in_flight, trace_workers=trace_workers,
+                                         deferred_traces=deferred_traces, sink=sink, monitor=monitor,
+                                         sampler=sampler, retention=retention, timers=phase_timers)
+    report = executor.run(commands, statements, sequence_numbers)
+    report["errors"] = executor.errors
+
+    # In deferred mode the traces are read in bulk only now, outside the timed phase
+    if deferred_traces:
+        executor.traces_res, executor.queries_and_times = harvest_into_results(session, executor.pending_commands, sink, retention)
+    return executor, report
+
+def print_report(report):
+    # Print the achieved throughput and latency percentiles
+    latency = report["latency_ms"]
+    print(f"Executed {report['ops']} commands ({report['errors']} errors) in {report['elapsed_sec']:.2f}s")
+    if report["ops"]:
+        print(f"Throughput: {report['ops_per_sec']:.1f} ops/sec")
+        print(f"Latency ms: p50={latency['p50']:.2f} p90={latency['p90']:.2f} p99={latency['p99']:.2f} p999={latency['p999']:.2f} max={latency['max']:.2f}")
+
+    # Open-loop runs: latency from the intended start per op type, next to the service time
+    if "by_op" in report:
+        print(f"Offered {report['offered_ops_per_sec']:.1f} ops/sec ({report['arrivals']} arrivals), max schedule lag {report['max_schedule_lag_ms']:.2f} ms")
+        for operation, histograms in report["by_op"].items():
+            latency, service = histograms["latency"], histograms["service"]
+            if latency["count"]:
+                print(f"{operation:>8} n={latency['count']} latency us: p50={latency['p50_us']} p99={latency['p99_us']} p999={latency['p999_us']}"
+                      f" | service us: p50={service['p50_us']} p99={service['p99_us']} p999={service['p999_us']}")
+
+    # Sampled runs: are the traced ops slower than the untraced ones?
+    if "tracing" in report:
+        tracing = report["tracing"]
+        print(f"Traced {tracing['traced_ops']} ops, untraced {tracing['untraced_ops']}")
+        for label in ("traced", "untraced"):
+            latency = tracing[f"{label}_latency_ms"]
+            if latency["p50"] is not None:
+                print(f"{label:>8} latency ms: p50={latency['p50']:.2f} p99={latency['p99']:.2f} p999={latency['p999']:.2f}")
+
+def run_workload_from_file(filename, session, max_in_flight=128, trace_workers=4, deferred_traces=False, prepared=False, sink=None,
+                           rate=None, arrivals="constant", seed=None, monitor=None, sampler=None, retention="full"):
+    # Read commands from the file (prepared mode: templates + parameters, prepared once per session)
+    commands, statements = load_workload(filename, session, prepared)
+    executor, report = run_executor(commands, statements, session, max_in_flight, trace_workers, deferred_traces, sink,
+                                    rate, arrivals, seed, monitor, sampler, retention)
+
+    # Collect the results into the shared lists
+    with lock:
+        traces_res.extend(executor.traces_res)
+        queries_and_times.extend(executor.queries_and_times)
+
+    print_report(report)
+    return report
+
+def run_generated_workload(num_ops, args, session, max_in_flight=128, trace_workers=4, deferred_traces=False, prepared=False,
+                           sink=None, rate=None, arrivals="constant", seed=None, monitor=None, sampler=None, retention="full"):
+    # Stream generated ops straight into the executor; the workload files are written as the ops are sent
+    # (prepared mode: the generated parameters are bound to the prepared templates)
+    if prepared:
+        statements = BoundOperations(session, STATEMENT_TEMPLATES, tee_operations(operations_from_args(num_ops, args)))
+        commands = statements.commands()
+    else:
+        statements = None
+        commands = tee_commands(operations_from_args(num_ops, args))
+    executor, report = run_executor(commands, statements, session, max_in_flight, trace_workers, deferred_traces, sink,
+                                    rate, arrivals, seed, monitor, sampler, retention)
+    with lock:
+        traces_res.extend(executor.traces_res)
+        queries_and_times.extend(executor.queries_and_times)
+
+    print_report(report)
+    return report
+
+def run_batched_workload(filename, session, batch_size, batch_type="UNLOGGED", batch_timestamps=False, max_in_flight=128,
+                         trace_workers=4, deferred_traces=False, monitor=None, sampler=None, retention="full"):
+    # Consecutive ops on the same partition sent as one batch (see batchedWorkload.py), one trace per batch;
+    # the results get one record per statement again
+    commands, _ = load_workload(filename, session)
+    workload = BatchedWorkload(commands, batch_size, batch_type, batch_timestamps)
+    executor, report = run_executor(workload.commands(), None, session, max_in_flight, trace_workers, deferred_traces,
+                                    monitor=monitor, sampler=sampler, retention=retention,
+                                    sequence_numbers=workload.sequence_numbers())
+    traces, queries = expand_batch_results(workload, executor.traces_res, executor.queries_and_times)
+    with lock:
+        traces_res.extend(traces)
+        queries_and_times.extend(queries)
+
+    print_report(report)
+    summary = reorder_summary(report, traces, workload.statements)
+    print(f"{summary['statements']} statements in {summary['round_trips']} {batch_type} batches of at most {batch_size}:"
+          f" {summary['statements_per_sec']:.1f} statements/sec")
+    return summary
+
+def compare_batching(filename, session, batch_size, batch_type="UNLOGGED", batch_timestamps=False, max_in_flight=128,
+                     trace_workers=4, deferred_traces=False, sampler=None, retention="full"):
+    # Run the workload one statement per round trip (results discarded) and then batched (results kept),
+    # and report throughput and reorder rate side by side
+    commands, _ = load_workload(filename, session)
+    executor, single_report = run_executor(commands, None, session, max_in_flight, trace_workers, deferred_traces,
+                                           sampler=sampler, retention=retention)
+    single = reorder_summary(single_report, executor.traces_res)
+    batched = run_batched_workload(filename, session, batch_size, batch_type, batch_timestamps, max_in_flight, trace_workers,
+                                   deferred_traces, sampler=sampler, retention=retention)
+    print_batching_comparison(single, batched)
+    return single, batched
+
+def run_stress_profile(profile_file, args, session, max_in_flight=128, trace_workers=4, deferred_traces=False, sink=None,
+                       rate=None, arrivals="constant", seed=None, monitor=None, sampler=None, retention="full"):
+    # Ops with the schema, value distributions and op mix of a cassandra-stress profile (see stressProfile.py),
+    # generated in NumPy chunks while they are sent
+    from stressProfile import read_profile, create_schema, StressGenerator, StressWorkload, parse_mix
+    profile = read_profile(profile_file)
+    create_schema(session, profile)
+    generator = StressGenerator(profile, args.workload_seed, args.stress_pop)
+    workload = StressWorkload(session, generator, parse_mix(args.stress_ops), args.stress_n)
+    executor, report = run_executor(workload.commands(), workload, session, max_in_flight, trace_workers, deferred_traces, sink,
+                                    rate, arrivals, seed, monitor, sampler, retention)
+    with lock:
+        traces_res.extend(executor.traces_res)
+        queries_and_times.extend(executor.queries_and_times)
+
+    print_report(report)
+    return report
+
+def compare_prepared(commands_file, prepared_file, session, max_in_flight=128, trace_workers=4, deferred_traces=False, sink=None):
+    # Run the workload as plain statements (parsed by the coordinator on every op, results discarded)
+    # and then as prepared statements (results kept), and report both latencies side by side
+    commands, _ = load_workload(commands_file, session)
+    _, plain_report = run_executor(commands, None, session, max_in_flight, trace_workers, deferred_traces)
+    prepared_report = run_workload_from_file(prepared_file, session, max_in_flight, trace_workers, deferred_traces, prepared=True, sink=sink)
+    print_comparison("plain", plain_report, "prepared", prepared_report)
+    return plain_report, prepared_report
+
+def compare_tracing(filename, session, max_in_flight=128, trace_workers=4, deferred_traces=False, prepared=False, sink=None,
+                    sampler=None, retention="full"):
+    # Run the workload with tracing off (results discarded) and then traced as configured (results kept),
+    # and report the throughput and latency cost of tracing
+    commands, statements = load_workload(filename, session, prepared)
+    _, untraced_report = run_executor(commands, statements, session, max_in_flight, trace_workers, sampler=NoTracing())
+    traced_report = run_workload_from_file(filename, session, max_in_flight, trace_workers, deferred_traces, prepared, sink,
+                                           sampler=sampler, retention=retention)
+    print_comparison("untraced", untraced_report, "traced", traced_report)
+    if untraced_report["ops_per_sec"] and traced_report["ops_per_sec"]:
+        overhead = 1 - traced_report["ops_per_sec"] / untraced_report["ops_per_sec"]
+        print(f"Tracing overhead: {overhead * 100:.1f}% of the untraced throughput")
+    return untraced_report, traced_report
+
+def print_comparison(left_name, left_report, right_name, right_report):
+    # Throughput and latency percentiles of two runs side by side
+    print(f"{'':>10} {left_name:>10} {right_name:>10} {'diff':>10}")
+    rows = [("ops/sec", left_report["ops_per_sec"], right_report["ops_per_sec"])]
+    for name in ("p50", "p90", "p99", "p999", "max"):
+        rows.append((f"{name} ms", left_report["latency_ms"][name], right_report["latency_ms"][name]))
+    for name, left, right in rows:
+        if left is None or right is None:
+            continue
+        print(f"{name:>10} {left:>10.2f} {right:>10.2f} {right - left:>+10.2f}")
 
 if __name__ == "__main__":
-    # Authentication details for the Cassandra cluster
-    auth_provider = PlainTextAuthProvider(username='omrino', password='sfgs44Df')
-    
-    # Connect to the Cassandra cluster
-    cluster = Cluster(contact_points=['62.90.89.27', '62.90.89.28', '62.90.89.29', '62.90.89.39'], auth_provider=auth_provider)
-
-    session = cluster.connect('simpletry')
-    session.default_consistency_level = ConsistencyLevel.ONE
-
-    # Run workload commands from the file using threads
-    run_workload_from_file('workload_commands.txt', session)
-
-    # Create the final data structure with organized sections
-    final_data = {
-        "queries_and_times": queries_and_times,
-        "traces": []
-    }
-
-    # Process each trace result and organize the data
-    for trace in traces_res:
-        organized_trace = {
-            "query": trace["query"],
-            "launched_at": trace["started_at"],
-            "coordinator_timestamp": trace.get("coordinator_timestamp"),
-            "memtable_timestamp": trace.get("memtable_timestamp"),
-            "details": trace["events"]
-        }
-        final_data["traces"].append(organized_trace)
-
-    # Save the results to a JSON file
-    with open('result.json', 'w') as file:
-        json.dump(final_data, file, ensure_ascii=False, sort_keys=True, default=str, indent=4)
+    parser = argparse.ArgumentParser(description="Run workload_commands.txt with bounded concurrency and tracing")
+    parser.add_argument("--max-in-flight", type=int, default=None, help="maximum number of outstanding writes (default 128, 4096 with --rate)")
+    parser.add_argument("--trace-workers", type=int, default=4, help="threads used to fetch query traces")
+    parser.add_argument("--deferred-traces", action="store_true", help="only record trace ids during the run and harvest the traces in bulk afterwards")
+    parser.add_argument("--prepared", action="store_true", help="run workload_prepared.jsonl (or the --generate ops) as prepared statements instead of plain CQL")
+    parser.add_argument("--compare-prepared", action="store_true", help="run the workload plain and then prepared, and report both latencies")
+    parser.add_argument("--compare-tracing", action="store_true", help="run the workload untraced and then traced, and report the tracing overhead")
+    parser.add_argument("--batch-size", type=int, default=None, help="send consecutive ops on the same partition as batches of up to this many statements")
+    parser.add_argument("--batch-type", choices=BATCH_TYPES, default="UNLOGGED")
+    parser.add_argument("--batch-timestamps", action="store_true", help="give every statement of a batch its own USING TIMESTAMP, so the statement order is kept")
+    parser.add_argument("--compare-batching", action="store_true", help="run the workload one statement at a time and then batched, and report both")
+    parser.add_argument("--stream", action="store_true", help="stream every op to result.jsonl while running instead of writing result.json at the end")
+    parser.add_argument("--columnar", action="store_true", help="also write the results as columnar result.npz (needs numpy)")
+    parser.add_argument("--rate", type=float, default=None, help="open-loop mode: send ops at this many ops/sec whether or not earlier ops finished")
+    parser.add_argument("--arrivals", choices=["constant", "poisson"], default="constant", help="open-loop arrival process")
+    parser.add_argument("--seed", type=int, default=None, help="seed of the Poisson arrival process")
+    parser.add_argument("--generate", type=int, default=None, help="run this many generated ops (see workloadGenerator.py) instead of reading workload_commands.txt")
+    add_generator_arguments(parser)
+    parser.add_argument("--stress-profile", default=None, help="run ops generated from this cassandra-stress profile (e.g. ../Gil/stress-profile.yaml)")
+    parser.add_argument("--stress-ops", default="insert=1", help="op mix of the profile run, like ops(...) of cassandra-stress")
+    parser.add_argument("--stress-n", type=int, default=10000, help="number of ops of the profile run")
+    parser.add_argument("--stress-pop", default=None, help="partition key population instead of the profile's, e.g. seq=1..100000")
+    parser.add_argument("--metrics-port", type=int, default=None, help="serve live counters and conflicts in the Prometheus format on this port")
+    parser.add_argument("--conflict-window", type=int, default=10000, help="live conflict detection compares every op with this many previous ops")
+    parser.add_argument("--max-conflicts", type=int, default=None, help="stop sending ops once the live conflict count exceeds this")
+    parser.add_argument("--verify", action="store_true", help="after the run, read back every partition in workload_metadata.jsonl and compare it with the client and trace order")
+    add_verifier_arguments(parser)
+    add_sampling_arguments(parser)
+    add_profiling_arguments(parser)
+    parser.add_argument("--fake", action="store_true", help="run against an in-process fake cluster (fakeCassandra.py) instead of the real one")
+    add_connection_arguments(parser)
+    args = parser.parse_args()
+    phase_timers = setup_from_args(args)
+
+    # Connect to the Cassandra cluster from the cluster config file (or to the fake cluster)
+    config = config_from_args(args)
+    cluster, session = connect(config, args.fake)
+
+    # Streaming mode: a writer thread appends every finished op to result.jsonl
+    # (batched runs split their batch traces into statements after the run, so they always write result.json)
+    if args.stream and (args.batch_size or args.compare_batching):
+        print("Warning: --stream is ignored with --batch-size, the results are written to result.json")
+        args.stream = False
+    sink = ResultSink('result.jsonl') if args.stream else None
+
+    # The comparison and batched runs are closed-loop only
+    if args.rate and (args.batch_size or args.compare_batching or args.compare_prepared or args.compare_tracing):
+        print("Warning: --rate is ignored with --batch-size and the --compare-* runs, they send ops closed-loop")
+        args.rate = None
+
+    # Open-loop runs keep a bigger in-flight window, so the schedule is not throttled by it
+    max_in_flight = args.max_in_flight or (4096 if args.rate else 128)
+
+    # Live monitoring: counters and online conflict detection while the run is going
+    # (deferred traces are only read after the run, so they give no live conflicts)
+    monitor = None
+    metrics_server = None
+    if args.metrics_port is not None or args.max_conflicts is not None:
+        if args.deferred_traces:
+            print("Warning: live conflict detection needs the traces during the run, not with --deferred-traces")
+        monitor = LiveMonitor(window=args.conflict_window, max_conflicts=args.max_conflicts)
+        if args.metrics_port is not None:
+            metrics_server = start_metrics_server(monitor, args.metrics_port)
+
+    # Trace sampling and the trace events kept per op
+    sampler = sampler_from_args(args)
+    retention = args.retention
+
+    # Open the connections and warm up before the timed phase
+    if not args.no_warmup:
+        warm_up(session, config, max_in_flight)
+
+    # Run workload commands from the file using the async executor (profiled with --profile)
+    profiler = start_profiler(args.profile)
+    report = None
+    batch_size = args.batch_size or 10
+    if args.compare_batching:
+        compare_batching('workload_commands.txt', session, batch_size, args.batch_type, args.batch_timestamps, max_in_flight,
+                         args.trace_workers, args.deferred_traces, sampler, retention)
+    elif args.batch_size:
+        run_batched_workload('workload_commands.txt', session, batch_size, args.batch_type, args.batch_timestamps, max_in_flight,
+                             args.trace_workers, args.deferred_traces, monitor, sampler, retention)
+    elif args.compare_prepared:
+        compare_prepared('workload_commands.txt', 'workload_prepared.jsonl', session, max_in_flight, args.trace_workers, args.deferred_traces, sink)
+    elif args.compare_tracing:
+        compare_tracing('workload_prepared.jsonl' if args.prepared else 'workload_commands.txt', session, max_in_flight, args.trace_workers,
+                        args.deferred_traces, args.prepared, sink, sampler, retention)
+    elif args.stress_profile:
+        report = run_stress_profile(args.stress_profile, args, session, max_in_flight, args.trace_workers, args.deferred_traces, sink,
+                                    rate=args.rate, arrivals=args.arrivals, seed=args.seed, monitor=monitor,
+                                    sampler=sampler, retention=retention)
+    elif args.generate:
+        report = run_generated_workload(args.generate, args, session, max_in_flight, args.trace_workers, args.deferred_traces,
+                                        args.prepared, sink, rate=args.rate, arrivals=args.arrivals, seed=args.seed, monitor=monitor,
+                                        sampler=sampler, retention=retention)
+    elif args.prepared:
+        report = run_workload_from_file('workload_prepared.jsonl', session, max_in_flight, args.trace_workers, args.deferred_traces, prepared=True, sink=sink,
+                                        rate=args.rate, arrivals=args.arrivals, seed=args.seed, monitor=monitor,
+                                        sampler=sampler, retention=retention)
+    else:
+        report = run_workload_from_file('workload_commands.txt', session, max_in_flight, args.trace_workers, args.deferred_traces, sink=sink,
+                                        rate=args.rate, arrivals=args.arrivals, seed=args.seed, monitor=monitor,
+                                        sampler=sampler, retention=retention)
+
+    if profiler is not None:
+        profiler.stop()
+    if phase_timers.report() is not None:
+        print_phase_report(phase_timers.report())
+        save_phase_report(phase_timers.report())
+
+    if monitor is not None:
+        snapshot = monitor.snapshot()
+        print(f"Live conflicts: {snapshot['conflicts_total']} within a window of {args.conflict_window} ops"
+              f" ({snapshot['skipped_sequence_numbers_total']} ops without a trace skipped)")
+    if metrics_server is not None:
+        metrics_server.shutdown()
+
+    # Keep the open-loop latency report next to the results, to compare runs at different rates
+    if report is not None and args.rate:
+        with open('latencyReport.json', 'w') as file:
+            json.dump(report, file, indent=2)
+        print("Latency report saved to latencyReport.json")
+
+    if sink is not None:
+        sink.close()
+        print(f"Streamed {sink.records_written} results to result.jsonl")
+    else:
+        # Create the final data structure with organized sections
+        final_data = build_final_data(queries_and_times, traces_res)
+
+        # Save the results to a JSON file
+        with open('result.json', 'w') as file:
+            json.dump(final_data, file, ensure_ascii=False, sort_keys=True, default=str, indent=4)
+
+    # Optional compact columnar copy of the results for the analysis scripts
+    if args.columnar:
+        from columnarResults import convert_results
+        convert_results('result.jsonl' if args.stream else 'result.json', 'workload_commands.txt', 'result.npz')
+
+    # Final state check: what landed in simpletry.person against the client and trace order
+    if args.verify:
+        traces = (lambda: iter_result_records('result.jsonl')) if args.stream else (lambda: traces_res)
+        totals = verify_final_state(session, 'workload_metadata.jsonl', traces, args.read_concurrency, args.fetch_size, args.buckets,
+                                    ConsistencyLevel.name_to_value[args.read_consistency])
+        print_verification(totals)
+        save_verification(totals)
 
     # Shutdown the session and cluster connection
     session.shutdown()
@@ -0,0 +1,92 @@
+import json
+import queue
+import threading
+import time
+
+from traceProcessing import organize_trace
+
+# Streaming result storage (JSON Lines).
+#
+# Instead of keeping every trace in traces_res / queries_and_times and dumping result.json at the
+# end, the runners can hand each finished op to a ResultSink. A dedicated writer thread appends one
+# JSON record per op to result.jsonl in batches and flushes periodically, so memory stays flat and
+# a crash only loses the last unflushed batch.
+#
+# Every line is the result.json trace section of one op plus the client completion time:
+# {"query": ..., "completed_at": ..., "launched_at": ..., "coordinator": ..., "coordinator_timestamp": ...,
+#  "memtable_timestamp": ..., "details": [...]}
+
+_CLOSE = object()
+
+
+class ResultSink:
+    def __init__(self, filename, batch_size=256, flush_interval_sec=1.0, max_queued=100000, append=False):
+        self.filename = filename
+        self.batch_size = batch_size
+        self.flush_interval_sec = flush_interval_sec
+        self.records_written = 0
+
+        # Bounded queue: if the disk falls behind, producers wait instead of growing memory
+        self._queue = queue.Queue(maxsize=max_queued)
+        self._file = open(filename, 'a' if append else 'w', encoding='utf-8')
+        self._thread = threading.Thread(target=self._write_loop, name="result-sink", daemon=True)
+        self._thread.start()
+
+    def write(self, command, trace, completed_at, **fields):
+        # trace: a record built by traceProcessing.process_trace; fields: extra values to store with it
+        record = organize_trace(trace)
+        record["query"] = command
+        record["completed_at"] = completed_at
+        record.update(fields)
+        self._queue.put(record)
+
+    def close(self):
+        self._queue.put(_CLOSE)
+        self._thread.join()
+        self._file.close()
+
+    def _write_loop(self):
+        last_flush = time.monotonic()
+        closing = False
+        while not closing:
+            # Wait for the first record of a batch, then take whatever else is already queued
+            batch = []
+            try:
+                item = self._queue.get(timeout=self.flush_interval_sec)
+                while True:
+                    if item is _CLOSE:
+                        closing = True
+                        break
+                    batch.append(json.dumps(item, ensure_ascii=False, sort_keys=True, default=str))
+                    if len(batch) >= self.batch_size:
+                        break
+                    item = self._queue.get_nowait()
+            except queue.Empty:
+                pass
+
+            if batch:
+                self._file.write('\n'.join(batch) + '\n')
+                self.records_written += len(batch)
+            if closing or time.monotonic() - last_flush >= self.flush_interval_sec:
+                self._file.flush()
+                last_flush = time.monotonic()
+
+
+def iter_result_records(filename):
+    # Read result.jsonl one record at a time. A torn last line (the run crashed mid-write) is skipped.
+    with open(filename, 'r', encoding='utf-8') as file:
+        for line in file:
+            if not line.strip():
+                continue
+            try:
+                yield json.loads(line)
+            except json.JSONDecodeError:
+                print(f"Warning: Skipping incomplete record in {filename}")
+
+
+
+def iter_trace_timestamps(filename):
+    # The records without their event details, for analysis steps that only need the timestamps
+    for record in iter_result_records(filename):
+        record.pop("details", None)
+        yield record
@@ -0,0 +1,178 @@
+import argparse
+import datetime
+import json
+import os
+import sqlite3
+import sys
+
+from traceProcessing import op_type
+from traceSampling import partition_key
+
+# The inversion counting lives with the analysis scripts
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'Aviv'))
+from inversions import count_inversions, compute_displacements
+
+# Local SQLite store of experiment runs (experiments.db), written by experimentMatrix.py.
+#
+# runs  one row per run: the swept parameters as columns (indexed), throughput / latency and the
+#       conflict metrics, plus every parameter as JSON in "params"
+# ops   one row per traced op of every run: sequence number, op type, partition, coordinator,
+#       coordinator / memtable timestamps (microseconds since the epoch) and whether an earlier op
+#       (by sequence number) got a later coordinator timestamp
+#
+# Conflicts are the inversions of the coordinator timestamps in sequence order, the same count as
+# Aviv/conflicts.py. The summary columns are computed once when a run is stored, so comparisons
+# across runs only read the runs table:
+#   python resultsStore.py --query conflicts-vs-concurrency --last 50
+#   python resultsStore.py --sql "SELECT consistency, AVG(p99_ms) FROM runs GROUP BY consistency"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    run_id INTEGER PRIMARY KEY,
+    started_at TEXT NOT NULL,
+    label TEXT,
+    max_in_flight INTEGER,
+    consistency TEXT,
+    client_timestamps INTEGER,
+    mix TEXT,
+    stress_rate REAL,
+    ops INTEGER,
+    errors INTEGER,
+    elapsed_sec REAL,
+    ops_per_sec REAL,
+    p50_ms REAL,
+    p99_ms REAL,
+    p999_ms REAL,
+    traced_ops INTEGER,
+    conflicts INTEGER,
+    reordered_ops INTEGER,
+    conflict_rate REAL,
+    max_displacement INTEGER,
+    params TEXT
+);
+CREATE INDEX IF NOT EXISTS runs_by_concurrency ON runs (max_in_flight, run_id);
+CREATE INDEX IF NOT EXISTS runs_by_label ON runs (label, run_id);
+CREATE TABLE IF NOT EXISTS ops (
+    run_id INTEGER NOT NULL REFERENCES runs (run_id),
+    seq INTEGER NOT NULL,
+    op TEXT,
+    partition_key TEXT,
+    coordinator TEXT,
+    coordinator_us INTEGER,
+    memtable_us INTEGER,
+    reordered INTEGER,
+    PRIMARY KEY (run_id, seq)
+) WITHOUT ROWID;
+"""
+
+# Stored queries; {last} is the number of most recent runs to look at
+QUERIES = {
+    "runs": """
+        SELECT run_id, started_at, label, max_in_flight, consistency, client_timestamps, mix, stress_rate,
+               ops, ops_per_sec, p99_ms, conflicts, conflict_rate
+        FROM runs ORDER BY run_id DESC LIMIT {last}""",
+    "conflicts-vs-concurrency": """
+        SELECT max_in_flight, COUNT(*) AS runs, AVG(conflict_rate) AS conflict_rate, AVG(conflicts) AS conflicts,
+               AVG(ops_per_sec) AS ops_per_sec
+        FROM (SELECT * FROM runs ORDER BY run_id DESC LIMIT {last})
+        GROUP BY max_in_flight ORDER BY max_in_flight""",
+    "conflicts-vs-consistency": """
+        SELECT consistency, client_timestamps, COUNT(*) AS runs, AVG(conflict_rate) AS conflict_rate, AVG(p99_ms) AS p99_ms
+        FROM (SELECT * FROM runs ORDER BY run_id DESC LIMIT {last})
+        GROUP BY consistency, client_timestamps""",
+    "conflicts-vs-stress": """
+        SELECT stress_rate, COUNT(*) AS runs, AVG(conflict_rate) AS conflict_rate, AVG(p99_ms) AS p99_ms
+        FROM (SELECT * FROM runs ORDER BY run_id DESC LIMIT {last})
+        GROUP BY stress_rate ORDER BY stress_rate""",
+    "hot-partitions": """
+        SELECT partition_key, COUNT(*) AS ops, SUM(reordered) AS reordered
+        FROM ops WHERE run_id IN (SELECT run_id FROM runs ORDER BY run_id DESC LIMIT {last})
+        GROUP BY partition_key ORDER BY reordered DESC LIMIT 20"""
+}
+
+EPOCH = datetime.datetime(1970, 1, 1)
+
+
+def to_epoch_us(value):
+    # ISO timestamp of a trace -> microseconds since the epoch (None stays None)
+    if value is None:
+        return None
+    return (datetime.datetime.fromisoformat(value).replace(tzinfo=None) - EPOCH) // datetime.timedelta(microseconds=1)
+
+
+def open_store(filename='experiments.db'):
+    connection = sqlite3.connect(filename)
+    connection.execute("PRAGMA journal_mode=WAL")
+    connection.execute("PRAGMA synchronous=NORMAL")
+    connection.executescript(SCHEMA)
+    return connection
+
+
+def op_rows(traces):
+    # (seq, op, partition, coordinator, coordinator_us, memtable_us, reordered) in sequence order
+    rows = []
+    latest = None
+    for trace in sorted(traces, key=lambda trace: trace["seq"]):
+        coordinator_us = to_epoch_us(trace.get("coordinator_timestamp"))
+        reordered = coordinator_us is not None and latest is not None and latest > coordinator_us
+        if coordinator_us is not None and (latest is None or coordinator_us > latest):
+            latest = coordinator_us
+        rows.append((trace["seq"], op_type(trace["query"]), partition_key(trace["query"]), trace.get("coordinator"),
+                     coordinator_us, to_epoch_us(trace.get("memtable_timestamp")), int(reordered)))
+    return rows
+
+
+def add_run(connection, params, report, traces, label=None):
+    # Stores one run (params: the swept parameters, report: the executor's latency report,
+    # traces: the executor's traces_res records); returns the run id
+    rows = op_rows(traces)
+    timestamps = [row[4] for row in rows if row[4] is not None]
+    displacements = compute_displacements(timestamps)
+    reordered = sum(row[6] for row in rows)
+    latency = report["latency_ms"]
+    with connection:
+        cursor = connection.execute(
+            "INSERT INTO runs (started_at, label, max_in_flight, consistency, client_timestamps, mix, stress_rate,"
+            " ops, errors, elapsed_sec, ops_per_sec, p50_ms, p99_ms, p999_ms, traced_ops, conflicts, reordered_ops,"
+            " conflict_rate, max_displacement, params) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (params.get("started_at", datetime.datetime.now().isoformat()), label, params.get("max_in_flight"),
+             params.get("consistency"), int(bool(params.get("client_timestamps"))), params.get("mix"),
+             params.get("stress_rate"), report["ops"], report.get("errors", 0), report["elapsed_sec"],
+             report["ops_per_sec"], latency["p50"], latency["p99"], latency["p999"], len(timestamps),
+             count_inversions(timestamps), reordered, reordered / len(timestamps) if timestamps else None,
+             max((abs(d) for d in displacements), default=0), json.dumps(params)))
+        run_id = cursor.lastrowid
+        connection.executemany("INSERT INTO ops VALUES (?, ?, ?, ?, ?, ?, ?, ?)", ((run_id,) + row for row in rows))
+    return run_id
+
+
+def run_query(connection, sql):
+    cursor = connection.execute(sql)
+    return [column[0] for column in cursor.description], cursor.fetchall()
+
+
+def print_rows(columns, rows):
+    widths = [max([len(column)] + [len(_format(row[i])) for row in rows]) for i, column in enumerate(columns)]
+    print("  ".join(column.rjust(width) for column, width in zip(columns, widths)))
+    for row in rows:
+        print("  ".join(_format(value).rjust(width) for value, width in zip(row, widths)))
+
+
+def _format(value):
+    if isinstance(value, float):
+        return f"{value:.4g}"
+    return str(value)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Query the experiment runs stored by experimentMatrix.py")
+    parser.add_argument("--db", default="experiments.db")
+    parser.add_argument("--query", choices=sorted(QUERIES), default="runs", help="stored query to run")
+    parser.add_argument("--last", type=int, default=50, help="only look at the most recent runs")
+    parser.add_argument("--sql", default=None, help="run this SQL instead of a stored query")
+    args = parser.parse_args()
+
+    connection = open_store(args.db)
+    columns, rows = run_query(connection, args.sql or QUERIES[args.query].format(last=int(args.last)))
+    print_rows(columns, rows)
+    connection.close()
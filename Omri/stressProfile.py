@@ -0,0 +1,385 @@
+import re
+import uuid
+import zlib
+
+import numpy as np
+
+# Data generator for the schema and ops of a cassandra-stress user profile (Gil/stress-profile.yaml).
+#
+# The profile's columnspec gives, per column, the value size distribution ("size"), the number of
+# distinct partition key values ("population") and the rows per partition ("cluster"); "insert"
+# sets the partitions per batch, the share of a partition's rows written per batch ("select") and
+# the batch type; "queries" are the named ops with their CQL. Distributions use the stress syntax:
+#   fixed(n)  uniform(min..max)  gaussian(min..max[,stdvrng])  exp(min..max)  seq(min..max)
+# with K / M / B suffixes (10M = 10,000,000) and an optional "/divisor" for ratios (fixed(1)/1000).
+#
+# Every value is a function of (partition seed, row index, column): a splitmix64 hash of the three
+# gives the uniforms for the value's size and its characters. So the same row always has the same
+# values, and a "samerow" query binds exactly what an insert of that row wrote. Only the choice of
+# partitions, rows and op types draws random numbers, and all of it is done per chunk of ops as
+# NumPy array operations; the only per-value Python work is slicing the generated text and
+# building UUIDs.
+#
+# StressWorkload turns the generated ops into prepared statements (BatchStatement for inserts of
+# more than one row) for the runners' executors.
+
+ALPHABET = np.frombuffer(b"abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789-_", dtype=np.uint8)
+SUFFIXES = {"K": 1000, "M": 1000 ** 2, "B": 1000 ** 3}
+DISTRIBUTION = re.compile(r"^\s*(\w+)\(([^)]*)\)\s*(?:/\s*([\d.]+))?\s*$")
+PLACEHOLDER = re.compile(r"(\w+)\s*(?:=|<=|>=|<|>|IN)\s*\?", re.IGNORECASE)
+TEXT_TYPES = ("text", "varchar", "ascii")
+INTEGER_TYPES = ("int", "bigint", "smallint", "tinyint", "varint", "counter")
+
+# cassandra-stress defaults for columns the columnspec does not mention
+DEFAULT_SIZE = "uniform(4..8)"
+DEFAULT_POPULATION = "uniform(1..100B)"
+DEFAULT_CLUSTER = "fixed(1)"
+
+# 2**-53, to turn the top 53 bits of a hash into a uniform float in [0, 1)
+UNIT = 1.0 / (1 << 53)
+
+
+def parse_number(text):
+    text = text.strip()
+    if text[-1:].upper() in SUFFIXES:
+        return int(float(text[:-1]) * SUFFIXES[text[-1:].upper()])
+    return int(float(text))
+
+
+def splitmix64(values):
+    # Vectorized splitmix64 finalizer over a uint64 array
+    with np.errstate(over='ignore'):
+        z = values.astype(np.uint64) + np.uint64(0x9E3779B97F4A7C15)
+        z = (z ^ (z >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+        z = (z ^ (z >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+        return z ^ (z >> np.uint64(31))
+
+
+def hash_uniform(hashes):
+    return (hashes >> np.uint64(11)).astype(np.float64) * UNIT
+
+
+def column_salt(name):
+    return np.uint64(zlib.crc32(name.encode()))
+
+
+class Distribution:
+    def __init__(self, spec):
+        # The -pop option writes seq=1..100000 instead of seq(1..100000)
+        spec = re.sub(r"^\s*(\w+)=(.*)$", r"\1(\2)", spec)
+        match = DISTRIBUTION.match(spec)
+        if match is None:
+            raise ValueError(f"Unknown distribution: {spec}")
+        self.spec = spec
+        self.kind = match.group(1).lower()
+        arguments = match.group(2).split(",")
+        bounds = arguments[0].split("..")
+        self.low = parse_number(bounds[0])
+        self.high = parse_number(bounds[1]) if len(bounds) > 1 else self.low
+        self.stdvrng = float(arguments[1]) if len(arguments) > 1 else 3.0
+        self.divisor = float(match.group(3)) if match.group(3) else None
+        self._next = self.low
+        if self.kind not in ("fixed", "uniform", "gaussian", "gauss", "normal", "norm", "exp", "exponential", "seq"):
+            raise ValueError(f"Unknown distribution: {spec}")
+
+    def values(self, first, second):
+        # Integer values in [low, high] from two arrays of uniforms
+        if self.kind == "fixed":
+            return np.full(len(first), self.low, dtype=np.int64)
+        if self.kind == "uniform":
+            return self.low + np.floor(first * (self.high - self.low + 1)).astype(np.int64)
+        if self.kind in ("gaussian", "gauss", "normal", "norm"):
+            # Mean in the middle of the range, stdvrng standard deviations from it to either bound
+            mean = (self.low + self.high) / 2
+            deviation = (self.high - mean) / self.stdvrng
+            normal = np.sqrt(-2 * np.log1p(-first)) * np.cos(2 * np.pi * second)
+            return np.clip(np.rint(mean + normal * deviation), self.low, self.high).astype(np.int64)
+        if self.kind in ("exp", "exponential"):
+            # Mean chosen so that 99.9% of the values fall into the range
+            mean = (self.high - self.low) / np.log(1000)
+            return np.clip(np.rint(self.low - np.log1p(-first) * mean), self.low, self.high).astype(np.int64)
+        raise ValueError(f"{self.spec} can only be sampled in sequence")
+
+    def sample(self, rng, size):
+        if self.kind == "seq":
+            # low, low + 1, ..., high, low, ...
+            span = self.high - self.low + 1
+            result = self.low + (self._next - self.low + np.arange(size, dtype=np.int64)) % span
+            self._next = int(result[-1]) + 1 if size else self._next
+            return result
+        return self.values(rng.random(size), rng.random(size))
+
+    def ratio(self, rng, size):
+        # Ratio distributions ("fixed(1)/1000"): the values divided by the divisor
+        return self.sample(rng, size) / (self.divisor or 1.0)
+
+
+def split_top_level(text):
+    # Splits on commas outside of parentheses and angle brackets
+    parts, depth, current = [], 0, ""
+    for char in text:
+        if char in "(<":
+            depth += 1
+        elif char in ")>":
+            depth -= 1
+        if char == "," and depth == 0:
+            parts.append(current.strip())
+            current = ""
+        else:
+            current += char
+    if current.strip():
+        parts.append(current.strip())
+    return parts
+
+
+def parse_table(definition):
+    # (columns as [(name, type)], partition key columns, clustering columns) of a CREATE TABLE
+    body = definition[definition.index("(") + 1:]
+    depth = 1
+    for end, char in enumerate(body):
+        depth += char == "("
+        depth -= char == ")"
+        if depth == 0:
+            break
+    columns, partition_keys, clustering_keys = [], [], []
+    for item in split_top_level(body[:end]):
+        if item.upper().startswith("PRIMARY KEY"):
+            key = item[item.index("(") + 1:item.rindex(")")].strip()
+            if key.startswith("("):
+                partition_keys = [name.strip() for name in key[1:key.index(")")].split(",")]
+                clustering_keys = [name.strip() for name in key[key.index(")") + 1:].split(",") if name.strip()]
+            else:
+                names = [name.strip() for name in key.split(",")]
+                partition_keys, clustering_keys = names[:1], names[1:]
+            continue
+        name, column_type = item.split(None, 1)
+        if column_type.upper().endswith("PRIMARY KEY"):
+            column_type = column_type[:-len("PRIMARY KEY")].strip()
+            partition_keys = [name]
+        columns.append((name, column_type.strip().lower()))
+    return columns, partition_keys, clustering_keys
+
+
+def read_profile(filename):
+    import yaml
+    with open(filename, 'r') as file:
+        return StressProfile(yaml.safe_load(file))
+
+
+class StressProfile:
+    def __init__(self, profile):
+        self.keyspace = profile["keyspace"]
+        self.table = profile["table"]
+        self.keyspace_definition = profile.get("keyspace_definition")
+        self.table_definition = profile["table_definition"]
+        self.columns, self.partition_keys, self.clustering_keys = parse_table(profile["table_definition"])
+        self.types = dict(self.columns)
+        spec = {column["name"]: column for column in profile.get("columnspec") or []}
+        self.size = {name: Distribution(str(spec.get(name, {}).get("size", DEFAULT_SIZE))) for name, _ in self.columns}
+        self.cluster = {name: Distribution(str(spec.get(name, {}).get("cluster", DEFAULT_CLUSTER))) for name in self.clustering_keys}
+        self.population = Distribution(str(spec.get(self.partition_keys[0], {}).get("population", DEFAULT_POPULATION)))
+
+        insert = profile.get("insert") or {}
+        self.partitions_per_batch = Distribution(str(insert.get("partitions", "fixed(1)")))
+        self.select = Distribution(str(insert.get("select", "fixed(1)/1")))
+        self.batch_type = str(insert.get("batchtype", "UNLOGGED")).upper()
+
+        qualified = f"{self.keyspace}.{self.table}"
+        self.queries = {}
+        for name, query in (profile.get("queries") or {}).items():
+            # Qualify the table, the runners' sessions use another keyspace
+            cql = re.sub(rf"\b(from|into|update)\s+{self.table}\b", rf"\1 {qualified}", query["cql"], flags=re.IGNORECASE)
+            fields = PLACEHOLDER.findall(cql)
+            if len(fields) != cql.count("?"):
+                raise ValueError(f"Query {name}: cannot tell which column every ? binds")
+            self.queries[name] = {"cql": cql, "fields": fields, "samerow": query.get("fields", "samerow") == "samerow"}
+        # Insert rows hold the values in this order
+        self.column_names = [name for name, _ in self.columns]
+        self.insert_cql = f"INSERT INTO {qualified} ({', '.join(self.column_names)}) VALUES ({', '.join('?' for _ in self.column_names)})"
+
+
+def create_schema(session, profile):
+    # The profile's keyspace and table, unless they already exist (cassandra-stress creates them too)
+    if profile.keyspace_definition:
+        session.execute(re.sub(r"CREATE KEYSPACE\s+(?!IF NOT EXISTS)", "CREATE KEYSPACE IF NOT EXISTS ", profile.keyspace_definition.strip(), flags=re.IGNORECASE))
+    session.execute(re.sub(rf"CREATE TABLE\s+(?:IF NOT EXISTS\s+)?(?:{profile.keyspace}\.)?{profile.table}\b",
+                           f"CREATE TABLE IF NOT EXISTS {profile.keyspace}.{profile.table}", profile.table_definition.strip(), flags=re.IGNORECASE))
+
+
+class StressGenerator:
+    # Ops of the profile in chunks; population overrides the partition key population (like -pop)
+    def __init__(self, profile, seed=None, population=None):
+        self.profile = profile
+        self.rng = np.random.default_rng(seed)
+        self.population = Distribution(population) if population else profile.population
+
+    def rows_in_partition(self, partitions):
+        # Rows per partition: the product of the clustering columns' cluster distributions
+        rows = np.ones(len(partitions), dtype=np.int64)
+        for name in self.profile.clustering_keys:
+            hashes = splitmix64(partitions.astype(np.uint64) ^ column_salt(name + "/cluster"))
+            rows *= self.profile.cluster[name].values(hash_uniform(hashes), hash_uniform(splitmix64(hashes)))
+        return np.maximum(rows, 1)
+
+    def column_values(self, name, partitions, rows):
+        # Python values of one column for the rows (partition seed, row index)
+        column_type = self.profile.types[name]
+        salt = column_salt(name)
+        if name in self.profile.partition_keys:
+            hashes = splitmix64(partitions.astype(np.uint64) ^ salt)
+        else:
+            hashes = splitmix64(splitmix64(partitions.astype(np.uint64) ^ salt) + rows.astype(np.uint64))
+        if column_type in TEXT_TYPES or column_type == "blob":
+            sizes = self.profile.size[name].values(hash_uniform(hashes), hash_uniform(splitmix64(hashes)))
+            values = text_values(hashes, np.maximum(sizes, 0))
+            return [value.encode() for value in values] if column_type == "blob" else values
+        if column_type == "timeuuid":
+            return time_uuids(hashes, rows)
+        if column_type == "uuid":
+            return [uuid.UUID(int=int(value) << 64 | int(value), version=4) for value in hashes]
+        if column_type in INTEGER_TYPES:
+            return [int(value) for value in (hashes >> np.uint64(33)).astype(np.int64)]
+        if column_type in ("double", "float", "decimal"):
+            return hash_uniform(hashes).tolist()
+        if column_type == "boolean":
+            return (hashes & np.uint64(1)).astype(bool).tolist()
+        raise ValueError(f"Unsupported column type for {name}: {column_type}")
+
+    def rows(self, names, partitions, rows):
+        # One tuple of values per row, in the order of names
+        return list(zip(*(self.column_values(name, partitions, rows) for name in names)))
+
+    def inserts(self, count):
+        # [[row values, ...] per op]; every op writes select x rows of `partitions` partitions
+        per_op = np.maximum(self.profile.partitions_per_batch.sample(self.rng, count), 1)
+        partitions = self.population.sample(self.rng, int(per_op.sum()))
+        available = self.rows_in_partition(partitions)
+        selected = np.clip(np.rint(self.profile.select.ratio(self.rng, len(partitions)) * available), 1, available).astype(np.int64)
+        # Consecutive rows (wrapping around) from a random first row of every partition
+        first = self.rng.integers(0, available)
+        offsets = np.arange(int(selected.sum())) - np.repeat(np.cumsum(selected) - selected, selected)
+        row_partitions = np.repeat(partitions, selected)
+        row_indexes = (np.repeat(first, selected) + offsets) % np.repeat(available, selected)
+        values = self.rows(self.profile.column_names, row_partitions, row_indexes)
+
+        ops, position = [], 0
+        rows_per_op = np.add.reduceat(selected, np.cumsum(per_op) - per_op) if count else []
+        for size in rows_per_op:
+            ops.append(values[position:position + size])
+            position += size
+        return ops
+
+    def queries(self, name, count):
+        # [bound values per op] of a named query; samerow binds every field from one existing row
+        query = self.profile.queries[name]
+        partitions = self.population.sample(self.rng, count)
+        available = self.rows_in_partition(partitions)
+        if query["samerow"]:
+            return self.rows(query["fields"], partitions, self.rng.integers(0, available))
+        columns = [self.column_values(field, partitions, self.rng.integers(0, available)) for field in query["fields"]]
+        return list(zip(*columns))
+
+    def ops(self, mix, count):
+        # [(op name, values)] in a random order with the mix weights ({"insert": 1, "singlepost": 2, ...})
+        names = list(mix)
+        weights = np.array([mix[name] for name in names], dtype=np.float64)
+        chosen = self.rng.choice(len(names), size=count, p=weights / weights.sum())
+        generated = {}
+        for index, name in enumerate(names):
+            number = int((chosen == index).sum())
+            generated[name] = iter(self.inserts(number) if name == "insert" else self.queries(name, number))
+        return [(names[index], next(generated[names[index]])) for index in chosen]
+
+
+def text_values(hashes, sizes):
+    # One string of sizes[i] characters per hash; character j is a hash of (hashes[i] + j)
+    ends = np.cumsum(sizes)
+    starts = ends - sizes
+    owners = np.repeat(hashes, sizes)
+    positions = np.arange(int(ends[-1]) if len(ends) else 0, dtype=np.uint64) - np.repeat(starts, sizes).astype(np.uint64)
+    characters = ALPHABET[(splitmix64(owners + positions) >> np.uint64(58)).astype(np.intp)]
+    text = characters.tobytes().decode('ascii')
+    return [text[start:end] for start, end in zip(starts.tolist(), ends.tolist())]
+
+
+def time_uuids(hashes, rows):
+    # Version 1 UUIDs whose time is the row index (so rows sort by index) and whose node and clock
+    # sequence come from the hash
+    result = []
+    for value, row in zip(hashes.tolist(), rows.tolist()):
+        timestamp = 0x1E0000000000000 + row
+        result.append(uuid.UUID(fields=(timestamp & 0xffffffff, timestamp >> 32 & 0xffff, timestamp >> 48 & 0x0fff | 0x1000,
+                                        0x80 | value >> 58 & 0x3f, value >> 48 & 0xff, value & 0xffffffffffff)))
+    return result
+
+
+def parse_mix(ops):
+    # "insert=1,singlepost=2" (the ops(...) of cassandra-stress) -> {"insert": 1.0, "singlepost": 2.0}
+    mix = {}
+    for item in ops.split(","):
+        name, _, weight = item.partition("=")
+        mix[name.strip()] = float(weight or 1)
+    return mix
+
+
+class StressWorkload:
+    # The commands and statements of count generated ops, made one chunk at a time. The executors
+    # read statements[i] right after taking command i, so only the current chunk is kept.
+    def __init__(self, session, generator, mix, count, chunk_size=1000, consistency_level=None):
+        profile = generator.profile
+        unknown = [name for name in mix if name != "insert" and name not in profile.queries]
+        if unknown:
+            raise ValueError(f"Unknown ops for this profile: {', '.join(unknown)}")
+        self.session = session
+        self.generator = generator
+        self.mix = mix
+        self.count = count
+        self.chunk_size = chunk_size
+        self.consistency_level = consistency_level
+        self.prepared = {name: session.prepare(query["cql"]) for name, query in profile.queries.items() if name in mix}
+        if "insert" in mix:
+            self.prepared["insert"] = session.prepare(profile.insert_cql)
+        for statement in self.prepared.values():
+            statement.consistency_level = consistency_level
+        self._chunk_start = 0
+        self._statements = []
+
+    def commands(self):
+        partition_key = self.generator.profile.partition_keys[0]
+        key_column = self.generator.profile.column_names.index(partition_key)
+        for start in range(0, self.count, self.chunk_size):
+            ops = self.generator.ops(self.mix, min(self.chunk_size, self.count - start))
+            commands = []
+            statements = []
+            for name, values in ops:
+                if name == "insert":
+                    statements.append(self._insert_statement(values))
+                    key = values[0][key_column]
+                    cql = self.generator.profile.insert_cql
+                else:
+                    statements.append(self.prepared[name].bind(values))
+                    fields = self.generator.profile.queries[name]["fields"]
+                    key = values[fields.index(partition_key)] if partition_key in fields else None
+                    cql = self.generator.profile.queries[name]["cql"]
+                # The CQL plus the op name and partition, to tell the ops apart in the results
+                commands.append(f"{cql} /* {name} {partition_key}='{key}' */")
+            self._chunk_start = start
+            self._statements = statements
+            yield from commands
+
+    def _insert_statement(self, rows):
+        prepared = self.prepared["insert"]
+        if len(rows) == 1:
+            return prepared.bind(rows[0])
+        try:
+            from cassandra.query import BatchStatement, BatchType
+        except ImportError:
+            from fakeCassandra import BatchStatement, BatchType
+        batch = BatchStatement(batch_type=getattr(BatchType, self.generator.profile.batch_type),
+                               consistency_level=self.consistency_level)
+        for row in rows:
+            batch.add(prepared.bind(row))
+        return batch
+
+    def __getitem__(self, index):
+        return self._statements[index - self._chunk_start]
@@ -0,0 +1,111 @@
+import datetime
+import time
+
+try:
+    from cassandra.query import TraceEvent
+except ImportError:
+    # Offline runs against fakeCassandra.py work without cassandra-driver
+    from fakeCassandra import TraceEvent
+
+from traceProcessing import process_trace
+
+# Deferred bulk trace harvesting.
+#
+# In deferred mode the runners only remember the trace session id of every command while the
+# workload runs (no get_query_trace round trips to system_traces in the timed phase). After the
+# run, the harvester reads system_traces.sessions and system_traces.events for all ids in a
+# handful of paged "session_id IN ?" queries, rebuilds trace objects that look like the driver's
+# QueryTrace and joins them back to the commands by trace id.
+
+SESSIONS_QUERY = "SELECT session_id, client, command, coordinator, duration, parameters, request, started_at FROM system_traces.sessions WHERE session_id IN ?"
+EVENTS_QUERY = "SELECT session_id, event_id, activity, source, source_elapsed, thread FROM system_traces.events WHERE session_id IN ?"
+
+
+class HarvestedTrace:
+    # Same attributes as cassandra.query.QueryTrace, so process_trace() can consume it
+    def __init__(self, row):
+        self.trace_id = row.session_id
+        self.request_type = row.request
+        self.client = row.client
+        self.coordinator = row.coordinator
+        self.started_at = row.started_at
+        self.parameters = row.parameters
+        self.duration = datetime.timedelta(microseconds=row.duration) if row.duration is not None else None
+        self.events = []
+
+
+def _chunks(items, size):
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+
+def _read_all(session, statement, ids, chunk_size, fetch_size):
+    # Run one "IN ?" query per chunk concurrently and page through every result
+    futures = []
+    for chunk in _chunks(ids, chunk_size):
+        bound = statement.bind([chunk])
+        bound.fetch_size = fetch_size
+        futures.append(session.execute_async(bound))
+    for future in futures:
+        for row in future.result():
+            yield row
+
+
+def harvest_traces(session, trace_ids, chunk_size=100, fetch_size=5000, max_wait_sec=30, poll_interval_sec=1):
+    # Returns {trace_id: HarvestedTrace}. Traces are written asynchronously by the nodes, so ids whose
+    # session is missing or not finished yet (duration still null) are retried until max_wait_sec.
+    sessions_statement = session.prepare(SESSIONS_QUERY)
+    events_statement = session.prepare(EVENTS_QUERY)
+
+    pending = list(dict.fromkeys(trace_ids))
+    traces = {}
+    deadline = time.time() + max_wait_sec
+    while pending:
+        for row in _read_all(session, sessions_statement, pending, chunk_size, fetch_size):
+            if row.duration is not None:
+                traces[row.session_id] = HarvestedTrace(row)
+        pending = [trace_id for trace_id in pending if trace_id not in traces]
+        if not pending or time.time() >= deadline:
+            break
+        time.sleep(poll_interval_sec)
+
+    if pending:
+        print(f"Warning: {len(pending)} trace sessions were not complete after {max_wait_sec}s")
+
+    # Events are clustered by event_id (a time uuid), so every session's events arrive in order
+    for row in _read_all(session, events_statement, list(traces), chunk_size, fetch_size):
+        trace = traces[row.session_id]
+        trace.events.append(TraceEvent(row.activity, row.event_id, row.source, row.source_elapsed, row.thread))
+
+    return traces
+
+
+def join_traces(pending_commands, traces, sink=None, retention="full"):
+    # pending_commands: [command, trace_id, completed_at, seq] recorded during the run.
+    # Returns the runners' (traces_res, queries_and_times) lists for the commands that have a trace,
+    # or streams them into the given ResultSink (the lists then stay empty).
+    traces_res = []
+    queries_and_times = []
+    for command, trace_id, completed_at, seq in pending_commands:
+        trace = traces.get(trace_id)
+        if trace is None:
+            print(f"Warning: No trace harvested for command: {command}")
+            continue
+        data = process_trace(trace, retention)
+        # Prepared statements trace the template, keep the executed command instead
+        data["query"] = command
+        data["seq"] = seq
+        if sink is not None:
+            sink.write(command, data, completed_at)
+            continue
+        traces_res.append(data)
+        queries_and_times.append([command, completed_at])
+    return traces_res, queries_and_times
+
+
+def harvest_into_results(session, pending_commands, sink=None, retention="full", **kwargs):
+    # Harvest every recorded trace id in bulk and join the traces back to their commands
+    start = time.perf_counter()
+    traces = harvest_traces(session, [trace_id for _, trace_id, _, _ in pending_commands], **kwargs)
+    print(f"Harvested {len(traces)} traces in {time.perf_counter() - start:.2f}s")
+    return join_traces(pending_commands, traces, sink, retention)
@@ -0,0 +1,20 @@
+# Single-pass index over the "traces" section of result.json.
+#
+# Looking a trace up by scanning data["traces"] for every command is quadratic in the
+# number of traced operations. The index below is built once (linear time) and then
+# shared by every step that needs to join a command back to its trace record.
+#
+# Keys can be any field of a trace record, usually "query" (the CQL text of the command)
+# or "trace_id". When several traces share the same key, the first one wins, which matches
+# the previous "take the first matching trace" behaviour.
+
+
+def build_trace_index(traces, key="query"):
+    # Map each key value to the first trace record that carries it
+    index = {}
+    for trace in traces:
+        value = trace.get(key)
+        if value is not None and value not in index:
+            index[value] = trace
+    return index
+
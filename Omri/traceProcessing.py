@@ -0,0 +1,112 @@
+from datetime import timedelta
+
+# Shared helpers for turning a driver QueryTrace into the records stored in result.json.
+# Used by pyTraceSimple.py, pyTraceSimpleThreads.py and the async executor so every runner
+# produces exactly the same result format.
+
+# Event descriptions that mark a command reaching the memtable / the coordinator
+MEMTABLE_EVENTS = ("Enqueuing response to /", "Adding to memtable", "Adding to person memtable")
+COORDINATOR_EVENTS = ("Determining replicas for mutation", "Parsing", "Preparing statement")
+
+# How much of every trace's event list is kept in the results:
+#   full     every event
+#   key      the events the analysis scripts read (coordinator, messaging and memtable steps)
+#   summary  no events, only the coordinator / memtable timestamps and the trace metadata
+RETENTION_LEVELS = ("full", "key", "summary")
+KEY_EVENT_PREFIXES = COORDINATOR_EVENTS + MEMTABLE_EVENTS + (
+    "Adding to", "Sending MUTATION", "MUTATION", "REQUEST_RESPONSE message received", "Enqueuing response")
+
+
+def retain_event(description, retention):
+    if retention == "full":
+        return True
+    if retention == "key":
+        return description.startswith(KEY_EVENT_PREFIXES)
+    return False
+
+
+def op_type(command):
+    # "INSERT INTO ..." -> "insert"
+    return command.split(None, 1)[0].lower() if command.strip() else "unknown"
+
+
+def process_trace(trace, retention="full"):
+    # Initialize variables to capture timestamps
+    coordinator_timestamp = None
+    memtable_timestamp = None
+    events_list = []
+
+    # Process each event in the trace
+    for event in trace.events:
+        # Save event details (only the ones the retention level keeps)
+        if retain_event(event.description, retention):
+            events = {
+                "description": event.description,
+                "source": event.source,
+                "source_elapsed": event.source_elapsed,
+                "thread_name": event.thread_name,
+                "datetime": event.datetime.isoformat(),
+            }
+            events_list.append(events)
+
+        # Capture timestamps for coordinator and memtable events
+        if event.description in MEMTABLE_EVENTS:
+            memtable_timestamp = event.datetime.isoformat()
+        if event.description in COORDINATOR_EVENTS:
+            coordinator_timestamp = event.datetime.isoformat()
+
+    # Create a dictionary to store the trace details
+    return {
+        "trace_id": trace.trace_id,
+        "request_type": trace.request_type,
+        "client": trace.client,
+        "coordinator": trace.coordinator,
+        "started_at": trace.started_at.isoformat(),
+        "parameters": trace.parameters,
+        "duration": str(trace.duration),
+        "query": trace.parameters['query'],
+        "events": events_list,
+        "coordinator_timestamp": coordinator_timestamp,
+        "memtable_timestamp": memtable_timestamp
+    }
+
+
+def organize_trace(trace):
+    # The per-trace section written to result.json
+    organized = {
+        "query": trace["query"],
+        "launched_at": trace["started_at"],
+        "coordinator": trace.get("coordinator"),
+        "coordinator_timestamp": trace.get("coordinator_timestamp"),
+        "memtable_timestamp": trace.get("memtable_timestamp"),
+        "details": trace["events"]
+    }
+    # Sequence number of the command (line of workload_commands.txt), when the runner knows it
+    if trace.get("seq") is not None:
+        organized["seq"] = trace["seq"]
+    return organized
+
+
+def elapsed_to_us(value):
+    # source_elapsed is a timedelta in memory and its str() ("0:00:00.000043") in result.json
+    if value is None:
+        return 0
+    if isinstance(value, timedelta):
+        return value // timedelta(microseconds=1)
+    if isinstance(value, (int, float)):
+        return int(value)
+    days = 0
+    if "day" in value:
+        day_part, value = value.split(", ")
+        days = int(day_part.split()[0])
+    hours, minutes, seconds = value.split(":")
+    return ((days * 24 + int(hours)) * 3600 + int(minutes) * 60) * 1000000 + round(float(seconds) * 1000000)
+
+
+def build_final_data(queries_and_times, traces_res):
+    # Create the final data structure with organized sections
+    return {
+        "queries_and_times": queries_and_times,
+        "traces": [organize_trace(trace) for trace in traces_res]
+    }
+
@@ -0,0 +1,101 @@
+import random
+import re
+
+from traceProcessing import RETENTION_LEVELS
+
+# Which ops are sent with tracing on.
+#
+# Every traced op writes a session row and an event row per trace step into system_traces, which
+# roughly doubles the writes the cluster handles. TraceSampler traces only part of the workload:
+#   every=N         every Nth op (by sequence number, starting with the first)
+#   probability=p   each op with probability p (seeded, so the same ops are traced every run)
+#   keys=[...]      only ops on these person ids
+#   hot_keys=K      only ops on the K most written person ids seen so far in the run
+# The key filters combine with every / probability: an op is traced when it passes all of them.
+# How many events of every traced op are kept is set separately (traceProcessing.RETENTION_LEVELS).
+
+PARTITION_KEY = re.compile(r"(?:id = |VALUES \()'([^']*)'")
+
+
+def partition_key(command):
+    # The person id a workload command writes to
+    match = PARTITION_KEY.search(command)
+    return match.group(1) if match else None
+
+
+class HotKeys:
+    # Write counts per key and the `size` keys with the highest counts so far
+    def __init__(self, size):
+        self.size = size
+        self.counts = {}
+        self.hot = set()
+
+    def add(self, key):
+        count = self.counts.get(key, 0) + 1
+        self.counts[key] = count
+        if key in self.hot:
+            return
+        if len(self.hot) < self.size:
+            self.hot.add(key)
+            return
+        coldest = min(self.hot, key=self.counts.get)
+        if count > self.counts[coldest]:
+            self.hot.remove(coldest)
+            self.hot.add(key)
+
+
+class TraceSampler:
+    def __init__(self, every=1, probability=None, keys=None, hot_keys=None, seed=None):
+        self.every = every
+        self.probability = probability
+        self.keys = set(keys) if keys else None
+        self.hot_keys = HotKeys(hot_keys) if hot_keys else None
+        self.rng = random.Random(seed)
+        self.traced = 0
+        self.untraced = 0
+
+    def should_trace(self, seq, command):
+        # Called once per op, in the order the ops are sent
+        traced = self._sample(seq, command)
+        if traced:
+            self.traced += 1
+        else:
+            self.untraced += 1
+        return traced
+
+    def _sample(self, seq, command):
+        if self.keys is not None or self.hot_keys is not None:
+            key = partition_key(command)
+            if self.keys is not None and key not in self.keys:
+                return False
+            if self.hot_keys is not None:
+                self.hot_keys.add(key)
+                if key not in self.hot_keys.hot:
+                    return False
+        if self.probability is not None and self.rng.random() >= self.probability:
+            return False
+        return (seq - 1) % self.every == 0
+
+
+class NoTracing(TraceSampler):
+    # Baseline for the tracing overhead: nothing is traced
+    def _sample(self, seq, command):
+        return False
+
+
+def add_sampling_arguments(parser):
+    parser.add_argument("--trace-every", type=int, default=1, help="trace every Nth op only")
+    parser.add_argument("--trace-probability", type=float, default=None, help="trace each op with this probability")
+    parser.add_argument("--trace-keys", default=None, help="trace only ops on these comma separated person ids")
+    parser.add_argument("--trace-hot-keys", type=int, default=None, help="trace only ops on the K most written person ids")
+    parser.add_argument("--trace-seed", type=int, default=None, help="seed of --trace-probability")
+    parser.add_argument("--retention", choices=RETENTION_LEVELS, default="full",
+                        help="trace events kept per op: all of them, the key events only, or none (timestamps only)")
+
+
+def sampler_from_args(args):
+    # None when every op is traced, so the executor skips the sampling entirely
+    if args.trace_every == 1 and args.trace_probability is None and args.trace_keys is None and args.trace_hot_keys is None:
+        return None
+    keys = args.trace_keys.split(",") if args.trace_keys else None
+    return TraceSampler(args.trace_every, args.trace_probability, keys, args.trace_hot_keys, args.trace_seed)
@@ -0,0 +1,149 @@
+import bisect
+import itertools
+import json
+import random
+import re
+
+from workloadMetadata import format_metadata
+
+# Lazy, seedable workload generator.
+#
+# generateWorkload.generate_workload builds the whole workload in memory on a single partition.
+# iter_operations produces the ops one at a time instead, spread over num_partitions person ids
+# with a uniform or zipfian (hot key) choice of partition and a configurable insert/update/delete
+# mix, so the amount of contention can be tuned and millions of ops can be streamed to the files or
+# straight into a runner. The same seed always gives the same workload.
+#
+# Every op is (template index, parameters, [op, key, toTS, name]) in the formats of
+# workload_prepared.jsonl and workload_metadata.jsonl; toTS is the op's sequence number, except
+# for deletes, which remove the last toTS entry written to their partition.
+
+# Statement templates: "cql" is prepared by the runners, "literal" renders the equivalent plain command
+STATEMENT_TEMPLATES = [
+    {
+        "op": "insert",
+        "cql": "INSERT INTO simpletry.person (id, name, toTS) VALUES (?, ?, {?:toTimestamp(now())});",
+        "literal": "INSERT INTO simpletry.person (id, name, toTS) VALUES ('{0}', '{1}', {{'{2}':toTimestamp(now())}});"
+    },
+    {
+        "op": "update",
+        "cql": "UPDATE simpletry.person SET name = ?, toTS[?] = toTimestamp(now()) WHERE id = ?;",
+        "literal": "UPDATE simpletry.person SET name = '{0}', toTS['{1}'] = toTimestamp(now()) WHERE id = '{2}';"
+    },
+    {
+        "op": "delete",
+        "cql": "DELETE toTS[?] FROM simpletry.person WHERE id = ?;",
+        "literal": "DELETE toTS['{0}'] FROM simpletry.person WHERE id = '{1}';"
+    }
+]
+INSERT_TEMPLATE, UPDATE_TEMPLATE, DELETE_TEMPLATE = range(len(STATEMENT_TEMPLATES))
+
+FIRST_PERSON_ID = 208306068
+
+
+def render_operation(template_index, params):
+    return STATEMENT_TEMPLATES[template_index]["literal"].format(*params)
+
+
+def using_timestamp(command, timestamp_us):
+    # The command with a client-side write timestamp (USING TIMESTAMP), so the write order no longer
+    # depends on the coordinators' clocks
+    clause = f"USING TIMESTAMP {timestamp_us}"
+    if command.startswith("INSERT"):
+        return re.sub(r";?\s*$", f" {clause};", command, count=1)
+    if command.startswith("UPDATE"):
+        return re.sub(r"^(UPDATE \S+) ", rf"\1 {clause} ", command, count=1)
+    return re.sub(r" FROM (\S+) ", rf" FROM \1 {clause} ", command, count=1)
+
+
+def parse_mix(mix):
+    # "insert:update:delete" weights, e.g. "60:30:10"
+    weights = [float(weight) for weight in mix.split(":")]
+    if len(weights) != len(STATEMENT_TEMPLATES) or sum(weights) <= 0:
+        raise ValueError(f"Op mix must be three insert:update:delete weights, got '{mix}'")
+    return weights
+
+
+def partition_chooser(num_partitions, distribution, zipf_exponent, rng):
+    # Returns a function that draws a partition index in [0, num_partitions)
+    if distribution == "uniform":
+        return lambda: rng.randrange(num_partitions)
+    if distribution == "zipfian":
+        # Partition k is chosen with probability proportional to 1 / (k + 1)^s: partition 0 is the hottest
+        cumulative = list(itertools.accumulate(1 / (k + 1) ** zipf_exponent for k in range(num_partitions)))
+        total = cumulative[-1]
+        return lambda: min(bisect.bisect_right(cumulative, rng.random() * total), num_partitions - 1)
+    raise ValueError(f"Unknown key distribution: {distribution}")
+
+
+def iter_operations(num_ops, num_partitions=1, distribution="uniform", zipf_exponent=1.0, mix="60:30:10", seed=None):
+    rng = random.Random(seed)
+    choose_partition = partition_chooser(num_partitions, distribution, zipf_exponent, rng)
+    weights = parse_mix(mix)
+    templates = range(len(STATEMENT_TEMPLATES))
+
+    # Last toTS entry written to every partition and not deleted yet
+    last_written = {}
+    for seq in range(1, num_ops + 1):
+        partition = choose_partition()
+        key = f'{FIRST_PERSON_ID + partition}'
+        template_index = rng.choices(templates, weights)[0]
+        if template_index == DELETE_TEMPLATE and partition not in last_written:
+            # Nothing to delete on this partition yet
+            template_index = INSERT_TEMPLATE
+
+        if template_index == INSERT_TEMPLATE:
+            name = f'omri{seq}'
+            params = [key, name, f'{seq}']
+            toTS = seq
+        elif template_index == UPDATE_TEMPLATE:
+            name = f'Aviv/Gil{seq}'
+            params = [name, f'{seq}', key]
+            toTS = seq
+        else:
+            name = None
+            toTS = last_written.pop(partition)
+            params = [f'{toTS}', key]
+        if template_index != DELETE_TEMPLATE:
+            last_written[partition] = seq
+
+        yield template_index, params, [STATEMENT_TEMPLATES[template_index]["op"], key, toTS, name]
+
+
+def tee_operations(operations, commands_file='workload_commands.txt', prepared_file='workload_prepared.jsonl',
+                   metadata_file='workload_metadata.jsonl'):
+    # Yields (template index, parameters) of every op while appending it to the three workload files,
+    # so a runner can consume a generated workload that is never held in memory
+    with open(commands_file, 'w') as commands, open(prepared_file, 'w') as prepared, open(metadata_file, 'w') as metadata:
+        prepared.write(json.dumps({"templates": STATEMENT_TEMPLATES}) + '\n')
+        for seq, (template_index, params, row) in enumerate(operations, start=1):
+            commands.write(render_operation(template_index, params) + '\n')
+            prepared.write(json.dumps([template_index, params], separators=(',', ':')) + '\n')
+            metadata.write(format_metadata(seq, row))
+            yield template_index, params
+
+
+def tee_commands(operations, **files):
+    # Yields the rendered command of every op while appending it to the workload files
+    for template_index, params in tee_operations(operations, **files):
+        yield render_operation(template_index, params)
+
+
+def write_workload(operations, **files):
+    # Stream the ops to the workload files; returns the number of ops written
+    count = 0
+    for _ in tee_operations(operations, **files):
+        count += 1
+    return count
+
+
+def add_generator_arguments(parser):
+    parser.add_argument("--partitions", type=int, default=1, help="number of person ids (partitions) the ops are spread over")
+    parser.add_argument("--distribution", choices=["uniform", "zipfian"], default="uniform", help="how the partition of every op is chosen")
+    parser.add_argument("--zipf-exponent", type=float, default=1.0, help="skew of the zipfian distribution (higher is hotter)")
+    parser.add_argument("--mix", default="60:30:10", help="insert:update:delete weights")
+    parser.add_argument("--workload-seed", type=int, default=None, help="seed of the generator, for a reproducible workload")
+
+
+def operations_from_args(num_ops, args):
+    return iter_operations(num_ops, args.partitions, args.distribution, args.zipf_exponent, args.mix, args.workload_seed)
@@ -0,0 +1,39 @@
+import json
+
+# Sidecar metadata index of a generated workload (workload_metadata.jsonl).
+#
+# One line per op, in the same order as workload_commands.txt: [seq, op, key, toTS, name]
+#   seq   sequence number (line number in workload_commands.txt, starting at 1)
+#   op    "insert", "update" or "delete"
+#   key   partition key (person id)
+#   toTS  the toTS map entry the op writes or deletes
+#   name  the name the op writes (None for deletes)
+#
+# The runners carry seq through to every trace record, so the analysis scripts join results to
+# this index with a list lookup instead of running regexes over the CQL text.
+
+
+def format_metadata(seq, row):
+    # One line of workload_metadata.jsonl for row [op, key, toTS, name]
+    return json.dumps([seq] + list(row), separators=(',', ':')) + '\n'
+
+
+def save_metadata(filename, rows):
+    # rows: [op, key, toTS, name] in sequence order
+    with open(filename, 'w') as file:
+        for seq, row in enumerate(rows, start=1):
+            file.write(format_metadata(seq, row))
+
+
+def load_metadata(filename):
+    # Returns a list where metadata[seq] = (op, key, toTS, name); metadata[0] is unused
+    metadata = [None]
+    with open(filename, 'r') as file:
+        for line in file:
+            if not line.strip():
+                continue
+            seq, op, key, toTS, name = json.loads(line)
+            if seq != len(metadata):
+                raise ValueError(f"{filename}: expected sequence number {len(metadata)}, found {seq}")
+            metadata.append((op, key, toTS, name))
+    return metadata